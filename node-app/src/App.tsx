@@ -250,7 +250,10 @@ export default function App() {
         min_rest_days_per_7: Math.max(0, Math.min(7, Number(minRestDaysPer7) || 0)),
         max_consecutive_work_days: Math.max(0, Number(maxConsecutiveWorkDays) || 0),
       });
-      setWarnings(res.warnings || []);
+      const shown = res.warnings || [];
+      setWarnings(
+        res.warnings_total > shown.length ? [...shown, `…共 ${res.warnings_total} 筆提醒，僅顯示前 ${shown.length} 筆`] : shown,
+      );
       await reloadAll(month);
     } catch (e) {
       setError(String(e));
@@ -8,6 +8,10 @@ export type Employee = {
   can_work_night: boolean;
   night_only: boolean;
   special_requirements: string | null;
+  preferred_shift_codes: string | null;
+  site_id: number | null;
+  rotation_template_id: number | null;
+  rotation_offset: number;
 };
 
 export type ShiftType = {
@@ -17,6 +21,7 @@ export type ShiftType = {
   start_time: string | null;
   end_time: string | null;
   is_work: boolean;
+  site_id: number | null;
 };
 
 export type Assignment = {
@@ -91,7 +96,7 @@ export const api = {
 
   listAssignments: (month: string) => http<Assignment[]>(`/assignments?month=${encodeURIComponent(month)}`),
   upsertAssignment: (employee_id: number, day: string, shift_type_id: number | null) =>
-    http<{ ok: boolean }>(`/assignments`, {
+    http<{ ok: boolean; version?: number }>(`/assignments`, {
       method: "PUT",
       headers: { "content-type": "application/json" },
       body: JSON.stringify({ employee_id, day, shift_type_id }),
@@ -119,8 +124,15 @@ export const api = {
       max_consecutive_work_days: number;
     },
   ) =>
-    http<{ ok: boolean; created: number; deleted: number; warnings: string[] }>(
-      `/schedule/generate?month=${encodeURIComponent(month)}`,
+    http<{
+      ok: boolean;
+      created: number;
+      deleted: number;
+      warnings: string[]; // 只含第一頁（這裡帶 warnings_limit=50）
+      warnings_total: number;
+      warning_summary: { total: number; by_code: Record<string, { count: number; shifts: string[]; date_ranges: string[][] }> };
+    }>(
+      `/schedule/generate?month=${encodeURIComponent(month)}&warnings_limit=50`,
       {
         method: "POST",
         headers: { "content-type": "application/json" },
@@ -0,0 +1,12 @@
+import os
+import secrets
+
+# 管理者功能（例如排班剖析）用的權杖：請求標頭 X-Admin-Token 要與 ADMIN_TOKEN 相同；未設定則一律拒絕
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+ADMIN_HEADER = "X-Admin-Token"
+
+
+def is_admin(token: str | None) -> bool:
+    if not ADMIN_TOKEN or not token:
+        return False
+    return secrets.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
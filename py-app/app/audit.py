@@ -0,0 +1,327 @@
+from __future__ import annotations
+
+import calendar
+import json
+import secrets
+from dataclasses import dataclass
+from datetime import date, datetime, timezone
+from typing import Any, Callable, Iterable
+
+from sqlalchemy import Select, and_, func, insert, literal, update
+from sqlmodel import Session, select
+
+from app.models import Assignment, AssignmentChange, AssignmentSnapshot, Employee, MonthVersion
+
+# 同一個月份累積多少筆異動後，自動再存一份快照（讓 as_of 重建時要重播的異動數有上限）
+SNAPSHOT_EVERY = 2000
+
+
+@dataclass
+class CellChange:
+    employee_id: int
+    day: date
+    old_shift_type_id: int | None
+    new_shift_type_id: int | None
+    site_id: int | None = None
+
+
+class VersionConflict(Exception):
+    """樂觀鎖失敗：月份班表在讀取後已被其他人修改。"""
+
+    def __init__(self, key: str):
+        super().__init__(key)
+        self.key = key
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def to_utc(dt: datetime) -> datetime:
+    # 沒帶時區的時間視為 UTC
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc)
+
+
+def _month_key(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _month_bounds(month: str) -> tuple[date, date]:
+    y, m = (int(x) for x in month.split("-"))
+    return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+
+
+# (employee_id, day) -> (shift_type_id, 寫入時的 site_id)
+Cells = dict[tuple[int, date], tuple[int, int | None]]
+
+
+def _read_month_cells(session: Session, month: str) -> Cells:
+    start, end = _month_bounds(month)
+    rows = session.exec(
+        select(Assignment.employee_id, Assignment.day, Assignment.shift_type_id, Assignment.site_id).where(
+            Assignment.day >= start, Assignment.day <= end
+        )
+    ).all()
+    return {(emp_id, d): (shift_id, site_id) for emp_id, d, shift_id, site_id in rows}
+
+
+def _save_snapshot(session: Session, month: str, cells: Cells, taken_at: datetime, last_change_id: int) -> None:
+    packed = sorted(
+        ([emp_id, d.day, shift_id, site_id] for (emp_id, d), (shift_id, site_id) in cells.items()),
+        key=lambda row: (row[0], row[1]),
+    )
+    session.add(
+        AssignmentSnapshot(
+            month=month,
+            taken_at=taken_at,
+            last_change_id=last_change_id,
+            cells=json.dumps(packed, separators=(",", ":")),
+        )
+    )
+
+
+def _max_change_id(session: Session) -> int:
+    return session.exec(select(func.max(AssignmentChange.id))).one() or 0
+
+
+def version_key(month: str, site_id: int | None = None) -> str:
+    return month if site_id is None else f"{month}#site{site_id}"
+
+
+def month_version(session: Session, month: str, site_id: int | None = None) -> int:
+    # site_id 為 None：整月版本（任何格子變動都會 +1）；指定據點：只有該據點的格子變動才 +1
+    row = session.get(MonthVersion, version_key(month, site_id))
+    return row.version if row else 0
+
+
+def _bump_version(session: Session, key: str, expected: int | None) -> None:
+    q = update(MonthVersion).where(MonthVersion.key == key)
+    if expected is not None:
+        # 條件式更新：比對與 +1 在同一個 UPDATE 完成，並行寫入只會有一個成功
+        q = q.where(MonthVersion.version == expected)
+    res = session.execute(q.values(version=MonthVersion.version + 1))
+    if res.rowcount:
+        return
+    if expected not in (None, 0):
+        raise VersionConflict(key)
+    if session.get(MonthVersion, key) is not None:
+        raise VersionConflict(key)
+    session.add(MonthVersion(key=key, version=1))
+    session.flush()
+
+
+def check_versions(session: Session, expected_versions: dict[str, int]) -> None:
+    # 沒有任何異動時仍要檢查版本（避免呼叫端以為自己拿到的是最新資料）
+    for key, expected in expected_versions.items():
+        row = session.get(MonthVersion, key)
+        if (row.version if row else 0) != expected:
+            raise VersionConflict(key)
+
+
+def record_changes(
+    session: Session, changes: list[CellChange], source: str, expected_versions: dict[str, int] | None = None
+) -> int:
+    """
+    把一批排班異動寫進異動紀錄（與排班本身同一個 transaction；呼叫端負責 commit）。
+    - old == new 的異動會略過
+    - 涉及的月份（與據點）版本各 +1；expected_versions（version_key -> 版本）不符時丟 VersionConflict
+    - 某月份第一次出現異動時，先存一份「異動前」的基準快照
+    - 同月份累積 SNAPSHOT_EVERY 筆異動後再存一份快照
+    回傳實際寫入的筆數。
+    """
+    expected_versions = expected_versions or {}
+    changes = [c for c in changes if c.old_shift_type_id != c.new_shift_type_id]
+    if not changes:
+        check_versions(session, expected_versions)
+        return 0
+
+    keys: set[str] = set()
+    for c in changes:
+        keys.add(version_key(_month_key(c.day)))
+        if c.site_id is not None:
+            keys.add(version_key(_month_key(c.day), c.site_id))
+    for key in sorted(keys):
+        _bump_version(session, key, expected_versions.get(key))
+    check_versions(session, {k: v for k, v in expected_versions.items() if k not in keys})
+    now = utcnow()
+    by_month: dict[str, list[CellChange]] = {}
+    for c in changes:
+        by_month.setdefault(_month_key(c.day), []).append(c)
+
+    base_change_id = _max_change_id(session)
+    for month, items in by_month.items():
+        has_snapshot = session.exec(select(AssignmentSnapshot.id).where(AssignmentSnapshot.month == month)).first()
+        if has_snapshot is not None:
+            continue
+        # 目前（已含本批異動）的狀態倒推回異動前，當作基準快照
+        cells = _read_month_cells(session, month)
+        for c in reversed(items):
+            key = (c.employee_id, c.day)
+            if c.old_shift_type_id is None:
+                cells.pop(key, None)
+            else:
+                cells[key] = (c.old_shift_type_id, c.site_id)
+        _save_snapshot(session, month, cells, now, base_change_id)
+
+    session.execute(
+        insert(AssignmentChange),
+        [
+            {
+                "employee_id": c.employee_id,
+                "day": c.day,
+                "old_shift_type_id": c.old_shift_type_id,
+                "new_shift_type_id": c.new_shift_type_id,
+                "site_id": c.site_id,
+                "source": source,
+                "created_at": now,
+            }
+            for c in changes
+        ],
+    )
+
+    _snapshot_if_due(session, by_month, now)
+    return len(changes)
+
+
+def _snapshot_if_due(session: Session, months: Iterable[str], now: datetime) -> None:
+    for month in months:
+        last = session.exec(
+            select(AssignmentSnapshot)
+            .where(AssignmentSnapshot.month == month)
+            .order_by(AssignmentSnapshot.last_change_id.desc())  # type: ignore[attr-defined]
+        ).first()
+        start, end = _month_bounds(month)
+        pending = session.exec(
+            select(func.count(AssignmentChange.id)).where(
+                AssignmentChange.id > (last.last_change_id if last else 0),
+                AssignmentChange.day >= start,
+                AssignmentChange.day <= end,
+            )
+        ).one()
+        if pending >= SNAPSHOT_EVERY:
+            _save_snapshot(session, month, _read_month_cells(session, month), now, _max_change_id(session))
+
+
+def record_changes_from_select(
+    session: Session,
+    rows: Select,
+    source: str,
+    apply: Callable[[Any], None],
+    expected_versions: dict[str, int] | None = None,
+) -> int:
+    """
+    set-based 版的 record_changes：異動由 DB 直接 INSERT ... SELECT 寫入，不經 Python 逐格處理。
+    - rows：回傳 (employee_id, day, old_shift_type_id, new_shift_type_id, site_id) 的 SELECT（應排除 old == new）
+    - apply(mine)：mine 是篩出「這次寫入的異動」的 AssignmentChange 條件，由呼叫端據此套用到 assignment
+      （同樣用 INSERT ... SELECT）。與 record_changes 相反，這裡是「先記錄、後套用」，基準快照因此直接讀目前狀態即可
+    版本、快照規則與 record_changes 相同；回傳寫入筆數。
+    """
+    expected_versions = expected_versions or {}
+    now = utcnow()
+    after_id = _max_change_id(session)
+    # 每次呼叫一個批次標記：之後只看 id > after_id 且同批次的異動，並行寫入的其他異動不會被重複套用或計入
+    batch = secrets.token_hex(8)
+    mine = and_(AssignmentChange.id > after_id, AssignmentChange.batch == batch)  # type: ignore[arg-type]
+    cols = ["employee_id", "day", "old_shift_type_id", "new_shift_type_id", "site_id", "source", "created_at", "batch"]
+    src = rows.subquery()
+    session.execute(
+        insert(AssignmentChange).from_select(
+            cols, select(*src.c, literal(source), literal(now, AssignmentChange.created_at.type), literal(batch))
+        )
+    )
+    # 只彙總到「日 x 據點」，用來決定要 +1 的版本與要補基準快照的月份
+    groups = session.exec(
+        select(AssignmentChange.day, AssignmentChange.site_id, func.count())
+        .where(mine)
+        .group_by(AssignmentChange.day, AssignmentChange.site_id)
+    ).all()
+    if not groups:
+        check_versions(session, expected_versions)
+        return 0
+
+    months: set[str] = set()
+    keys: set[str] = set()
+    for d, site_id, _ in groups:
+        months.add(_month_key(d))
+        keys.add(version_key(_month_key(d)))
+        if site_id is not None:
+            keys.add(version_key(_month_key(d), site_id))
+    for key in sorted(keys):
+        _bump_version(session, key, expected_versions.get(key))
+    check_versions(session, {k: v for k, v in expected_versions.items() if k not in keys})
+
+    for month in sorted(months):
+        has_snapshot = session.exec(select(AssignmentSnapshot.id).where(AssignmentSnapshot.month == month)).first()
+        if has_snapshot is None:
+            _save_snapshot(session, month, _read_month_cells(session, month), now, after_id)
+
+    apply(mine)
+    _snapshot_if_due(session, sorted(months), now)
+    return sum(n for _, _, n in groups)
+
+
+def month_cells_as_of(
+    session: Session, month: str, as_of: datetime, site_id: int | None = None
+) -> dict[tuple[int, date], int]:
+    """
+    以「最近一份快照 + 之後的異動」重建某月份在 as_of 當下的排班：(employee_id, day) -> shift_type_id。
+    - 月份從未有異動紀錄：排班自開始記錄後沒變過，直接回傳目前狀態
+    - as_of 早於該月份最早的快照：最早的快照就是第一筆異動前的基準狀態，直接回傳它
+    - 指定 site_id：只回傳當時記錄在該據點的格子（員工之後換據點不影響歷史）
+    """
+    cells = _month_rows_as_of(session, month, as_of)
+    return {key: shift_id for key, (shift_id, cell_site) in cells.items() if site_id is None or cell_site == site_id}
+
+
+def _month_rows_as_of(session: Session, month: str, as_of: datetime) -> Cells:
+    as_of = to_utc(as_of)
+    start, end = _month_bounds(month)
+    snap = session.exec(
+        select(AssignmentSnapshot)
+        .where(AssignmentSnapshot.month == month, AssignmentSnapshot.taken_at <= as_of)
+        .order_by(AssignmentSnapshot.last_change_id.desc())  # type: ignore[attr-defined]
+    ).first()
+    if snap is None:
+        snap = session.exec(
+            select(AssignmentSnapshot)
+            .where(AssignmentSnapshot.month == month)
+            .order_by(AssignmentSnapshot.last_change_id)
+        ).first()
+        if snap is None:
+            return _read_month_cells(session, month)
+        # 基準快照之後的異動都晚於 as_of，下面的重播不會套用任何一筆
+
+    cells: Cells = {}
+    legacy_sites: dict[int | None, int | None] | None = None
+    for emp_id, d, shift_id, *rest in json.loads(snap.cells):
+        if rest:
+            cell_site = rest[0]
+        else:
+            # 舊格式快照沒有記錄據點：退回員工目前的據點
+            if legacy_sites is None:
+                legacy_sites = dict(session.exec(select(Employee.id, Employee.site_id)).all())
+            cell_site = legacy_sites.get(emp_id)
+        cells[(emp_id, date(start.year, start.month, d))] = (shift_id, cell_site)
+    deltas = session.exec(
+        select(
+            AssignmentChange.employee_id,
+            AssignmentChange.day,
+            AssignmentChange.new_shift_type_id,
+            AssignmentChange.site_id,
+        )
+        .where(
+            AssignmentChange.id > snap.last_change_id,
+            AssignmentChange.created_at <= as_of,
+            AssignmentChange.day >= start,
+            AssignmentChange.day <= end,
+        )
+        .order_by(AssignmentChange.id)
+    ).all()
+    for emp_id, d, new_shift_id, cell_site in deltas:
+        if new_shift_id is None:
+            cells.pop((emp_id, d), None)
+        else:
+            cells[(emp_id, d)] = (new_shift_id, cell_site)
+    return cells
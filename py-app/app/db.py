@@ -1,8 +1,12 @@
+import hashlib
 import os
 from pathlib import Path
 
+from sqlalchemy.schema import CreateTable
 from sqlmodel import Session, SQLModel, create_engine
 
+from app.startup import phase
+
 
 def _default_sqlite_url() -> str:
     # 預設把 DB 放在 /app/data/app.db（搭配 docker volume 最好保存）
@@ -20,9 +24,54 @@ if DATABASE_URL.startswith("sqlite:"):
 engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
 
 
+# 修改 _sqlite_light_migrate（但沒有改 model）時請 +1，讓既有 DB 重新跑一次補欄位
+MIGRATION_REVISION = 1
+# APP_FORCE_INIT=1：不看指紋，每次啟動都重跑建表/補欄位/seed
+FORCE_INIT = os.environ.get("APP_FORCE_INIT", "").lower() in ("1", "true", "yes")
+
+
+def schema_fingerprint() -> str:
+    # 由所有資料表的 CREATE TABLE + 索引定義算出；model 有任何變動指紋就會不同
+    h = hashlib.sha1(f"migration:{MIGRATION_REVISION}".encode())
+    for table in sorted(SQLModel.metadata.tables.values(), key=lambda t: t.name):
+        h.update(str(CreateTable(table).compile(engine)).encode("utf-8"))
+        for index in sorted(table.indexes, key=lambda i: i.name or ""):
+            h.update(f"{index.name}:{','.join(c.name for c in index.columns)}:{index.unique}".encode("utf-8"))
+    return h.hexdigest()
+
+
+def read_meta(key: str) -> str | None:
+    # 資料表還不存在（全新 DB）時回傳 None
+    from app.models import AppMeta
+
+    try:
+        with Session(engine) as session:
+            row = session.get(AppMeta, key)
+            return row.value if row else None
+    except Exception:
+        return None
+
+
+def write_meta(key: str, value: str) -> None:
+    from app.models import AppMeta
+
+    with Session(engine) as session:
+        session.merge(AppMeta(key=key, value=value))
+        session.commit()
+
+
 def init_db() -> None:
-    SQLModel.metadata.create_all(engine)
-    _sqlite_light_migrate()
+    # 指紋相同表示這個 DB 已經建好、補好欄位，冷啟動時直接略過
+    with phase("schema fingerprint"):
+        fingerprint = schema_fingerprint()
+        up_to_date = (not FORCE_INIT) and read_meta("schema_fingerprint") == fingerprint
+    if up_to_date:
+        return
+    with phase("create_all"):
+        SQLModel.metadata.create_all(engine)
+    with phase("sqlite migrate"):
+        _sqlite_light_migrate()
+    write_meta("schema_fingerprint", fingerprint)
 
 
 def _sqlite_light_migrate() -> None:
@@ -31,22 +80,45 @@ def _sqlite_light_migrate() -> None:
         return
 
     with engine.connect() as conn:
-        try:
-            rows = conn.exec_driver_sql("PRAGMA table_info(employee)").fetchall()
-        except Exception:
-            return
-        existing_cols = {r[1] for r in rows}  # (cid, name, type, notnull, dflt_value, pk)
-
-        def add_col(sql: str, col_name: str) -> None:
-            if col_name in existing_cols:
-                return
-            conn.exec_driver_sql(sql)
 
-        add_col("ALTER TABLE employee ADD COLUMN max_work_days_per_month INTEGER NOT NULL DEFAULT 0", "max_work_days_per_month")
-        add_col("ALTER TABLE employee ADD COLUMN max_consecutive_work_days INTEGER NOT NULL DEFAULT 6", "max_consecutive_work_days")
-        add_col("ALTER TABLE employee ADD COLUMN can_work_night INTEGER NOT NULL DEFAULT 1", "can_work_night")
-        add_col("ALTER TABLE employee ADD COLUMN night_only INTEGER NOT NULL DEFAULT 0", "night_only")
-        add_col("ALTER TABLE employee ADD COLUMN special_requirements TEXT", "special_requirements")
+        def table_cols(table: str) -> set[str] | None:
+            try:
+                rows = conn.exec_driver_sql(f"PRAGMA table_info({table})").fetchall()
+            except Exception:
+                return None
+            return {r[1] for r in rows}  # (cid, name, type, notnull, dflt_value, pk)
+
+        def add_cols(table: str, cols: list[tuple[str, str]]) -> None:
+            existing_cols = table_cols(table)
+            if existing_cols is None:
+                return
+            for col_name, ddl in cols:
+                if col_name in existing_cols:
+                    continue
+                conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {col_name} {ddl}")
+
+        add_cols(
+            "employee",
+            [
+                ("max_work_days_per_month", "INTEGER NOT NULL DEFAULT 0"),
+                ("max_consecutive_work_days", "INTEGER NOT NULL DEFAULT 6"),
+                ("can_work_night", "INTEGER NOT NULL DEFAULT 1"),
+                ("night_only", "INTEGER NOT NULL DEFAULT 0"),
+                ("special_requirements", "TEXT"),
+                ("preferred_shift_codes", "TEXT"),
+                ("site_id", "INTEGER REFERENCES site (id)"),
+                ("rotation_template_id", "INTEGER REFERENCES rotationtemplate (id)"),
+                ("rotation_offset", "INTEGER NOT NULL DEFAULT 0"),
+            ],
+        )
+        add_cols("shifttype", [("site_id", "INTEGER REFERENCES site (id)")])
+        add_cols("assignment", [("site_id", "INTEGER REFERENCES site (id)")])
+        add_cols("assignmentchange", [("batch", "VARCHAR")])
+
+        # create_all 不會替既有資料表補索引
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_employee_site_id ON employee (site_id)")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_shifttype_site_id ON shifttype (site_id)")
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_assignment_site_day ON assignment (site_id, day)")
 
         conn.commit()
 
@@ -0,0 +1,380 @@
+"""
+排班器的隨機測試與差異比較（在記憶體 SQLite 上執行，不碰正式 DB）。
+
+- 隨機產生員工名單、班別時間與排班參數（同一個 seed 一定產生同一組案例），也涵蓋
+  據點（含據點專屬班別、依據點分開排）、輪班樣板、不覆蓋模式下的既有排班（月初已排好的幾天、請假）、
+  覆蓋模式下要被換掉的舊排班、上個月的排班（先排好並寫入）與暖啟動
+- 每個案例排完後交給 app.rule_check 的參考檢查器逐條檢查硬性規則
+- --diff 另跑一組參數（例如 engine=... 或不同權重）在同一個案例上，比較格子是否相同與品質統計
+
+用法（在 py-app 目錄下）：
+    python -m app.fuzz --cases 200
+    python -m app.fuzz --seed 1234 --verbose            # 重現單一案例
+    python -m app.fuzz --cases 100 --diff min_rest_hours=11
+有違規時結束碼為 1，並印出可重現的 seed。
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+from dataclasses import dataclass, field, replace
+from datetime import date, time, timedelta
+from typing import Any
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.models import Assignment, Employee, RotationTemplate, ShiftType, Site
+from app.rotations import RotationLibrary
+from app.rule_check import Violation, check_schedule, schedule_quality
+from app.schedule_service import (
+    GenerateParams,
+    _get_shift_by_code,
+    apply_month_plan,
+    month_range,
+    params_from_dict,
+    params_to_dict,
+    plan_month_schedule,
+)
+from app.seed import ensure_default_shift_types
+
+_WORK = ("早", "晚", "夜")
+
+
+def random_roster(
+    rng: random.Random, min_size: int = 3, max_size: int = 25, sites: int = 0, rotations: int = 0
+) -> list[dict[str, Any]]:
+    # 全新 DB 裡據點、樣板的 id 依建立順序為 1..n，這裡直接寫 id
+    out = []
+    for i in range(rng.randint(min_size, max_size)):
+        night_only = rng.random() < 0.1
+        data: dict[str, Any] = {
+            "name": f"emp{i}",
+            "night_only": night_only,
+            "can_work_night": night_only or rng.random() < 0.8,
+            "max_work_days_per_month": rng.choice([0, 0, 0, rng.randint(10, 24)]),
+            "max_consecutive_work_days": rng.choice([0, 0, rng.randint(2, 7)]),
+            "preferred_shift_codes": rng.choice([None, None, "早", "晚", "夜", "早,晚"]),
+        }
+        if sites:
+            data["site_id"] = rng.randint(1, sites)
+        if rotations and rng.random() < 0.3:
+            data["rotation_template_id"] = rng.randint(1, rotations)
+            data["rotation_offset"] = rng.randint(0, 13)
+        out.append(data)
+    return out
+
+
+def random_rotations(rng: random.Random) -> list[str]:
+    # 樣板故意不保證合規（例如「夜,早」、連上過長）：排班器要略過不合規的格子
+    out = []
+    for _ in range(rng.choice([0, 0, 1, 2])):
+        length = rng.randint(2, 10)
+        out.append(",".join(rng.choice(["早", "晚", "夜", "O", "", ""]) for _ in range(length)))
+    return out
+
+
+def random_shift_times(rng: random.Random) -> dict[str, tuple[time, time] | None]:
+    # 大多數案例用預設時間；部分案例打散起迄時間或拿掉時間（走退回規則）
+    choice = rng.random()
+    if choice < 0.6:
+        return {}
+    if choice < 0.75:
+        return {"早": None, "晚": None, "夜": None}
+    m = rng.choice([5, 6, 7, 8])
+    e = m + rng.choice([7, 8, 9])
+    n = e + rng.choice([7, 8])
+    return {
+        "早": (time(m, 0), time(m + 8, 0)),
+        "晚": (time(e % 24, 0), time((e + 8) % 24, 0)),
+        "夜": (time(n % 24, 0), time((n + 8) % 24, 0)),
+    }
+
+
+def random_params(rng: random.Random, month: str) -> GenerateParams:
+    start, end = month_range(month)
+    holidays = frozenset(
+        date(start.year, start.month, rng.randint(1, end.day)) for _ in range(rng.choice([0, 0, 1, 3]))
+    )
+    weights: dict[str, float] = {}
+    if rng.random() < 0.3:
+        weights["night_fairness"] = rng.choice([1.0, 1e3, 1e7])
+    if rng.random() < 0.3:
+        weights["weekend_pair"] = rng.choice([1.0, 1e5, 1e9])
+    return GenerateParams(
+        weekday_morning=rng.randint(0, 3),
+        weekday_evening=rng.randint(0, 3),
+        weekday_night=rng.randint(0, 2),
+        holiday_morning=rng.randint(0, 4),
+        holiday_evening=rng.randint(0, 4),
+        holiday_night=rng.randint(0, 2),
+        weekend_as_holiday=rng.random() < 0.8,
+        holiday_dates=holidays,
+        overwrite=rng.random() < 0.6,
+        trim_overstaff_to_off=rng.random() < 0.7,
+        prefer_clustered_work=rng.random() < 0.7,
+        prefer_same_shift_within_block=rng.random() < 0.8,
+        max_consecutive_work_days=rng.randint(3, 7),
+        min_rest_days_per_7=rng.randint(0, 3),
+        min_rest_hours=rng.choice([8, 8, 11, 12]),
+        max_weekly_hours=rng.choice([0, 0, 40, 48]),
+        max_monthly_hours=rng.choice([0, 0, 160, 176]),
+        score_weights=weights,
+        use_rotations=rng.random() < 0.9,
+        warm_start=rng.random() < 0.3,
+    )
+
+
+def random_existing(
+    rng: random.Random, roster: list[dict[str, Any]], params: GenerateParams, days: int
+) -> list[tuple[int, int, str]]:
+    """
+    本月已有的排班：(員工索引, 第幾天（0 起）, 班別代碼)。
+    - 覆蓋模式：任意格子、任意班別（都會被換掉）
+    - 不覆蓋模式：月初已排好的幾天 + 零星的休假/請假。月初那段本身一定合規（同一班別、
+      長度不超過各種上限），之後的格子都由排班器排，違規就一定是排班器的問題
+    """
+    out: list[tuple[int, int, str]] = []
+    window = 7 - max(0, min(7, params.min_rest_days_per_7))
+    for i, emp in enumerate(roster):
+        if params.overwrite:
+            out += [(i, rng.randrange(days), rng.choice([*_WORK, "O", "L"])) for _ in range(rng.randint(0, 3))]
+            continue
+        if rng.random() < 0.4:
+            if emp["night_only"]:
+                code = "夜"
+            else:
+                code = rng.choice(_WORK if emp["can_work_night"] else _WORK[:2])
+            caps = [rng.randint(1, 5), emp["max_consecutive_work_days"] or params.max_consecutive_work_days, window]
+            if emp["max_work_days_per_month"]:
+                caps.append(emp["max_work_days_per_month"])
+            # 隨機班別時間都是 8 小時班
+            for limit in (params.max_weekly_hours, params.max_monthly_hours):
+                if limit:
+                    caps.append(int(limit // 8))
+            out += [(i, d, code) for d in range(min(caps))]
+        for _ in range(rng.choice([0, 0, 1, 2])):
+            out.append((i, rng.randrange(days), rng.choice(["O", "L"])))
+    # 同一格以第一筆為準（月初那段優先）
+    first: dict[tuple[int, int], str] = {}
+    for i, d, code in out:
+        first.setdefault((i, d), code)
+    return [(i, d, code) for (i, d), code in first.items()]
+
+
+@dataclass
+class Case:
+    seed: int
+    month: str
+    roster: list[dict[str, Any]]
+    shift_times: dict[str, tuple[time, time] | None]
+    params: GenerateParams
+    # 據點數（0：不分據點）；per_site=True 時逐一據點分開排，否則全部一起排
+    sites: int = 0
+    per_site: bool = False
+    rotations: list[str] = field(default_factory=list)
+    existing: list[tuple[int, int, str]] = field(default_factory=list)
+    # 先排好並寫入上個月（暖啟動的提示來源）
+    prior_month: bool = False
+
+
+def random_case(seed: int) -> Case:
+    rng = random.Random(seed)
+    month = f"{rng.randint(2025, 2027)}-{rng.randint(1, 12):02d}"
+    shift_times = random_shift_times(rng)
+    params = random_params(rng, month)
+    sites = rng.choice([0, 0, 1, 2])
+    rotations = random_rotations(rng)
+    roster = random_roster(rng, sites=sites, rotations=len(rotations))
+    start, end = month_range(month)
+    return Case(
+        seed,
+        month,
+        roster,
+        shift_times,
+        params,
+        sites=sites,
+        per_site=sites > 0 and rng.random() < 0.7,
+        rotations=rotations,
+        existing=random_existing(rng, roster, params, (end - start).days + 1),
+        prior_month=rng.random() < 0.3,
+    )
+
+
+@dataclass
+class CaseResult:
+    cells: dict[tuple[int, date], str]
+    violations: list[Violation]
+    quality: dict[str, float]
+    warnings: int = 0
+    extra: dict[str, Any] = field(default_factory=dict)
+
+
+def _previous_month(month: str) -> str:
+    start, _ = month_range(month)
+    prev = start - timedelta(days=1)
+    return f"{prev.year:04d}-{prev.month:02d}"
+
+
+def _setup(session: Session, case: Case) -> None:
+    for i in range(case.sites):
+        session.add(Site(name=f"site{i + 1}"))
+    session.flush()
+    ensure_default_shift_types(session)
+    for st in session.exec(select(ShiftType)).all():
+        if st.code in case.shift_times:
+            times = case.shift_times[st.code]
+            st.start_time, st.end_time = times if times else (None, None)
+            session.add(st)
+    if case.sites >= 2:
+        # 第 2 個據點有自己的早班（同代碼覆蓋共用班別）
+        session.add(
+            ShiftType(code="早", name="早班", is_work=True, start_time=time(6, 0), end_time=time(14, 0), site_id=2)
+        )
+    for i, pattern in enumerate(case.rotations):
+        session.add(RotationTemplate(name=f"rot{i + 1}", pattern=pattern))
+    for data in case.roster:
+        session.add(Employee(**data))
+    session.commit()
+
+
+def run_case(case: Case, params: GenerateParams | None = None) -> CaseResult:
+    """
+    建一個全新的記憶體 DB、放入案例資料、排班（本月只在記憶體，不寫回）並檢查。
+    依據點分開排時每個據點各排各檢查（需求人數以據點為單位）；quality 取各據點平均。
+    """
+    params = params or case.params
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    start, end = month_range(case.month)
+    scopes: list[int | None] = list(range(1, case.sites + 1)) if case.per_site else [None]
+    cells: dict[tuple[int, date], str] = {}
+    violations: list[Violation] = []
+    qualities: list[dict[str, float]] = []
+    warnings = 0
+    with Session(engine) as session:
+        _setup(session, case)
+        employees = list(session.exec(select(Employee).order_by(Employee.id)).all())
+
+        if case.prior_month:
+            prior = replace(params, overwrite=True, warm_start=False)
+            for scope in scopes:
+                apply_month_plan(session, plan_month_schedule(session, _previous_month(case.month), prior, scope))
+        for i, d, code in case.existing:
+            emp = employees[i]
+            st = _get_shift_by_code(session, emp.site_id)[code]
+            day = start + timedelta(days=d)
+            session.add(Assignment(employee_id=emp.id, day=day, shift_type_id=st.id, site_id=emp.site_id))
+        session.commit()
+        existing = {(a.employee_id, a.day): a.shift_type_id for a in session.exec(select(Assignment)).all()}
+
+        library = RotationLibrary.load(session, start, (end - start).days + 1)
+        for scope in scopes:
+            plan = plan_month_schedule(session, case.month, params, scope)
+            warnings += len(plan.warnings)
+            shifts_by_code = _get_shift_by_code(session, scope)
+            code_of = {s.id: s.code for s in session.exec(select(ShiftType)).all()}
+            in_scope = [e for e in employees if scope is None or e.site_id == scope]
+            ids = {e.id for e in in_scope}
+            scope_cells = {
+                key: code_of[shift_id]
+                for key, shift_id in existing.items()
+                if key[0] in ids and start <= key[1] <= end
+            }
+            for key, (_, new, _) in plan.cells.items():
+                if new is None:
+                    scope_cells.pop(key, None)
+                else:
+                    scope_cells[key] = code_of[new]
+
+            # 排班器本來就不會動的格子（不覆蓋時的既有排班、輪班樣板）可能超過需求，不算排班器超排
+            fixed: dict[tuple[int, date], str] = {}
+            if not params.overwrite:
+                for key, code in scope_cells.items():
+                    if key in existing and code_of.get(existing[key]) == code:
+                        fixed[key] = code
+            if params.use_rotations:
+                for e in in_scope:
+                    for offset, code in enumerate(library.codes_for(e) or []):
+                        key = (e.id, start + timedelta(days=offset))
+                        if code is not None and scope_cells.get(key) == code:  # type: ignore[arg-type]
+                            fixed[key] = code  # type: ignore[index]
+
+            violations += check_schedule(in_scope, shifts_by_code, params, scope_cells, start, end, fixed)
+            qualities.append(schedule_quality(in_scope, params, scope_cells, start, end))
+            cells.update(scope_cells)
+    engine.dispose()
+    quality = {k: sum(q[k] for q in qualities) / len(qualities) for k in qualities[0]}
+    return CaseResult(cells=cells, violations=violations, quality=quality, warnings=warnings)
+
+
+def _parse_overrides(items: list[str]) -> dict[str, Any]:
+    known = set(params_to_dict(GenerateParams()))
+    out: dict[str, Any] = {}
+    for item in items:
+        key, _, raw = item.partition("=")
+        if key not in known:
+            raise SystemExit(f"未知的參數：{key}（可用：{', '.join(sorted(known))}）")
+        try:
+            out[key] = json.loads(raw)
+        except ValueError:
+            out[key] = raw
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.fuzz", description="排班器隨機測試 / 差異比較")
+    ap.add_argument("--cases", type=int, default=50)
+    ap.add_argument("--seed", type=int, default=None, help="只跑這個 seed")
+    ap.add_argument("--start-seed", type=int, default=0)
+    ap.add_argument("--diff", nargs="*", default=None, metavar="KEY=VALUE", help="B 組參數覆寫（與案例參數比較）")
+    ap.add_argument("--verbose", action="store_true")
+    args = ap.parse_args(argv)
+
+    seeds = [args.seed] if args.seed is not None else range(args.start_seed, args.start_seed + args.cases)
+    overrides = _parse_overrides(args.diff) if args.diff is not None else None
+    failed: list[int] = []
+    same = 0
+    deltas: dict[str, float] = {}
+
+    for seed in seeds:
+        case = random_case(seed)
+        a = run_case(case)
+        if a.violations:
+            failed.append(seed)
+            print(f"seed={seed} month={case.month}: {len(a.violations)} 筆違規")
+            for v in a.violations[: 10 if not args.verbose else None]:
+                print(f"  {v.rule} emp={v.employee_id} day={v.day} {v.detail}")
+        elif args.verbose:
+            print(f"seed={seed} month={case.month} ok quality={a.quality}")
+
+        if overrides is not None:
+            params_b = params_from_dict({**params_to_dict(case.params), **overrides})
+            b = run_case(case, params_b)
+            if b.violations:
+                failed.append(seed)
+                print(f"seed={seed} [B]: {len(b.violations)} 筆違規")
+                for v in b.violations[:10]:
+                    print(f"  {v.rule} emp={v.employee_id} day={v.day} {v.detail}")
+            if a.cells == b.cells:
+                same += 1
+            for k, v in b.quality.items():
+                deltas[k] = deltas.get(k, 0.0) + (v - a.quality[k])
+
+    total = len(seeds)
+    print(f"{total} 個案例，{len(set(failed))} 個有違規")
+    if overrides is not None and total:
+        print(f"差異比較：{same}/{total} 個案例格子完全相同")
+        for k, v in sorted(deltas.items()):
+            print(f"  {k}: B-A 平均 {v / total:+.4f}")
+    if failed:
+        print("重現：" + " ".join(f"--seed {s}" for s in sorted(set(failed))[:10]))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import secrets
+import time
+from datetime import timedelta
+from typing import Any, Callable
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.audit import to_utc, utcnow
+from app.db import engine
+from app.models import MonthLease
+
+# 租約有效時間：持有者當機時，過了這段時間其他人就能接手
+LEASE_TTL = timedelta(minutes=10)
+POLL_INTERVAL_SECONDS = 0.2
+
+
+class LeaseBusy(Exception):
+    """同一個月份正在用不同參數排班（或前一次排班失敗），這次請求不能併入。"""
+
+
+def generation_lock_key(month: str, site_id: int | None = None) -> str:
+    # "#" 之前是整月範圍、之後是據點範圍：兩者會排到相同的格子，run_exclusive 不讓它們同時執行
+    return f"generate:{month}" if site_id is None else f"generate:{month}#site{site_id}"
+
+
+def params_hash(data: Any) -> str:
+    raw = json.dumps(data, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _acquire(key: str, owner: str, p_hash: str) -> MonthLease | None:
+    """
+    嘗試取得租約：成功回傳 None；已被他人持有則回傳目前的租約列。
+    租約操作用獨立連線、立即 commit，不影響呼叫端 session 的 transaction。
+    """
+    now = utcnow()
+    values = {"owner": owner, "params_hash": p_hash, "expires_at": now + LEASE_TTL}
+    with engine.begin() as conn:
+        try:
+            with conn.begin_nested():
+                conn.execute(insert(MonthLease).values(key=key, **values))
+            return None
+        except IntegrityError:
+            pass
+        # 已有租約列：過期（已釋放或持有者逾時）就接手；result 保留前一位持有者的結果，
+        # 還在等它的並行請求仍拿得到（result 內記有是誰的結果）
+        res = conn.execute(
+            update(MonthLease).where(MonthLease.key == key, MonthLease.expires_at < now).values(**values)
+        )
+        if res.rowcount:
+            return None
+        row = conn.execute(select(MonthLease).where(MonthLease.key == key)).first()
+    if row is None:
+        return _acquire(key, owner, p_hash)
+    return MonthLease(**row._mapping)
+
+
+def _overlapping_busy(key: str) -> str | None:
+    """與 key 範圍重疊（整月 vs. 該月的據點）且仍有效的租約；沒有則回傳 None。"""
+    parent, sep, _ = key.partition("#")
+    overlap = MonthLease.key == parent if sep else MonthLease.key.like(f"{key}#%")  # type: ignore[attr-defined]
+    with engine.connect() as conn:
+        return conn.execute(
+            select(MonthLease.key).where(overlap, MonthLease.expires_at >= utcnow())
+        ).scalar()
+
+
+def _release(key: str, owner: str, result: dict | None) -> None:
+    raw = None if result is None else json.dumps({"owner": owner, "result": result}, ensure_ascii=False, default=str)
+    with engine.begin() as conn:
+        conn.execute(
+            update(MonthLease)
+            .where(MonthLease.key == key, MonthLease.owner == owner)
+            .values(expires_at=utcnow(), result=raw)
+        )
+
+
+def _result_of(raw: str | None, owner: str) -> dict | None:
+    data = json.loads(raw) if raw else None
+    if isinstance(data, dict) and data.get("owner") == owner:
+        return data["result"]
+    return None
+
+
+def _wait_for(key: str, owner: str, p_hash: str) -> dict:
+    deadline = time.monotonic() + LEASE_TTL.total_seconds()
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL_SECONDS)
+        with engine.connect() as conn:
+            row = conn.execute(select(MonthLease).where(MonthLease.key == key)).first()
+        if row is None:
+            break
+        result = _result_of(row.result, owner)
+        if result is not None:
+            return result
+        if row.owner != owner:
+            # 等的那次沒有留下結果（失敗）就已被接手：新的那次參數相同就改等它，否則不能併入
+            if row.params_hash != p_hash:
+                break
+            owner = row.owner
+            continue
+        if to_utc(row.expires_at) < utcnow():
+            break
+    raise LeaseBusy("前一次相同參數的排班失敗或逾時，請重新送出")
+
+
+def run_exclusive(key: str, p_hash: str, fn: Callable[[], dict]) -> dict:
+    """
+    以月份租約包住一次排班：
+    - 沒有人在跑：取得租約後執行 fn，結果存進租約列
+    - 有人用相同參數在跑：不重跑，等它完成後回傳同一份結果
+    - 有人用不同參數在跑，或範圍重疊的租約（整月 vs. 據點）正在跑：丟 LeaseBusy
+    fn 的回傳值需可 JSON 序列化。
+    """
+    owner = secrets.token_hex(8)
+    held = _acquire(key, owner, p_hash)
+    if held is not None:
+        if held.params_hash != p_hash:
+            raise LeaseBusy("此月份正在排班中，請稍後再試")
+        return _wait_for(key, held.owner, p_hash)
+    # 先取得自己的租約再檢查重疊範圍：兩邊同時進來時至少有一邊看得到另一邊（最多兩邊都退出）
+    overlapping = _overlapping_busy(key)
+    if overlapping is not None:
+        _release(key, owner, None)
+        raise LeaseBusy(f"範圍重疊的排班（{overlapping}）正在進行中，請稍後再試")
+    try:
+        result = fn()
+    except BaseException:
+        _release(key, owner, None)
+        raise
+    _release(key, owner, result)
+    return result
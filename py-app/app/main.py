@@ -1,3 +1,6 @@
+# 最先載入：APP_STARTUP_PROFILE 從這裡開始計算 import 耗時
+from app import startup  # isort: skip
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
@@ -5,10 +8,14 @@ from pydantic import BaseModel
 from app.db import init_db
 from app.routes.assignments import router as assignments_router
 from app.routes.employees import router as employees_router
+from app.routes.profiles import router as profiles_router
+from app.routes.rotations import router as rotations_router
 from app.routes.schedule import router as schedule_router
 from app.routes.shift_types import router as shift_types_router
-from app.seed import ensure_default_shift_types
-from app.tasks import echo
+from app.routes.sites import router as sites_router
+from app.seed import ensure_seeded
+
+startup.record("import app.main", startup.elapsed_since_import())
 
 app = FastAPI(title="py-app", version="0.2.0")
 
@@ -30,8 +37,9 @@ def on_startup():
 
     from app.db import engine
 
-    with Session(engine) as session:
-        ensure_default_shift_types(session)
+    with startup.phase("seed"), Session(engine) as session:
+        ensure_seeded(session)
+    startup.report()
 
 
 @app.get("/health")
@@ -50,11 +58,17 @@ class EchoRequest(BaseModel):
 
 @app.post("/tasks/echo")
 def enqueue_echo(req: EchoRequest):
+    # 第一次用到才載入 Celery（建立 broker/backend 設定），API 冷啟動不必付這個成本
+    from app.tasks import echo
+
     result = echo.delay(req.message)
     return {"task_id": result.id}
 
 
+app.include_router(sites_router)
 app.include_router(employees_router)
+app.include_router(profiles_router)
+app.include_router(rotations_router)
 app.include_router(shift_types_router)
 app.include_router(assignments_router)
 app.include_router(schedule_router)
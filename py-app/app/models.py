@@ -1,15 +1,22 @@
 from __future__ import annotations
 
-from datetime import date, time
+from datetime import date, datetime, time
 from typing import Optional
 
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import Index, UniqueConstraint
 from sqlmodel import Field, SQLModel
 
 
+class Site(SQLModel, table=True):
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True, description="據點/部門名稱（例如 某飯店 櫃台）")
+    active: bool = Field(default=True, index=True)
+
+
 class Employee(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
     name: str = Field(index=True)
+    site_id: Optional[int] = Field(default=None, index=True, foreign_key="site.id", description="所屬據點（None 表示未分據點）")
     active: bool = Field(default=True, index=True)
     color: Optional[str] = Field(default=None, description="前端顯示用色碼（例如 #3b82f6）")
     # 排班限制（MVP：先用「天數」處理，工時/加班等可再加強）
@@ -18,6 +25,21 @@ class Employee(SQLModel, table=True):
     can_work_night: bool = Field(default=True, description="是否可排夜班（夜）")
     night_only: bool = Field(default=False, description="是否只排夜班（只允許 夜；不排早/晚）")
     special_requirements: Optional[str] = Field(default=None, description="特殊需求（文字備註）")
+    preferred_shift_codes: Optional[str] = Field(default=None, description="偏好班別代碼（逗號分隔，例如 早,晚；空白表示無偏好）")
+    rotation_template_id: Optional[int] = Field(
+        default=None, foreign_key="rotationtemplate.id", description="固定輪班樣板（None 表示完全交給自動排班）"
+    )
+    rotation_offset: int = Field(default=0, description="在輪班循環中的位移天數（同一樣板的員工錯開用）")
+
+
+class RotationTemplate(SQLModel, table=True):
+    # 輪班樣板：循環的班別代碼，從 anchor_date 起算第 0 天；套在任何月份都是同一個循環，月與月之間自然接續
+    id: Optional[int] = Field(default=None, primary_key=True)
+    name: str = Field(index=True, description="例如 早班做五休二、夜班四天一循環")
+    pattern: str = Field(description="逗號分隔的班別代碼，例如 早,早,早,早,早,O,O；空白代碼表示那天交給自動排班")
+    anchor_date: date = Field(default=date(2024, 1, 1), description="循環第 0 天")
+    site_id: Optional[int] = Field(default=None, foreign_key="site.id")
+    active: bool = True
 
 
 class ShiftType(SQLModel, table=True):
@@ -27,15 +49,74 @@ class ShiftType(SQLModel, table=True):
     start_time: Optional[time] = None
     end_time: Optional[time] = None
     is_work: bool = Field(default=True, description="是否算工作班（O/L 不算）")
+    site_id: Optional[int] = Field(default=None, index=True, foreign_key="site.id", description="專屬據點（None 表示所有據點共用）")
 
 
 class Assignment(SQLModel, table=True):
-    __table_args__ = (UniqueConstraint("employee_id", "day", name="uq_assignment_employee_day"),)
+    __table_args__ = (
+        UniqueConstraint("employee_id", "day", name="uq_assignment_employee_day"),
+        # 依據點切分的查詢（某據點某月）走這個複合索引
+        Index("ix_assignment_site_day", "site_id", "day"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     employee_id: int = Field(index=True, foreign_key="employee.id")
     day: date = Field(index=True)
     shift_type_id: int = Field(foreign_key="shifttype.id")
+    # 冗餘存放員工所屬據點，方便依據點切分查詢（員工換據點時一併更新）
+    site_id: Optional[int] = Field(default=None, foreign_key="site.id")
     note: Optional[str] = None
 
 
+class AssignmentChange(SQLModel, table=True):
+    # 排班異動紀錄（只新增不修改）：old/new 為 None 分別代表「新增」/「刪除」
+    id: Optional[int] = Field(default=None, primary_key=True)
+    employee_id: int = Field(index=True)
+    day: date = Field(index=True)
+    old_shift_type_id: Optional[int] = None
+    new_shift_type_id: Optional[int] = None
+    site_id: Optional[int] = None
+    source: str = Field(description="異動來源：put/bulk/generate/fill-off/restore ...")
+    created_at: datetime = Field(index=True)
+    # set-based 寫入的批次標記：只套用/計算同一次呼叫寫入的異動，不會撈到並行寫入的其他異動
+    batch: Optional[str] = None
+
+
+class AssignmentSnapshot(SQLModel, table=True):
+    # 某月份在某個時間點的完整排班（搭配之後的 AssignmentChange 重建任意時間點）
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: str = Field(index=True, description="YYYY-MM")
+    taken_at: datetime = Field(index=True)
+    last_change_id: int = Field(default=0, description="快照已包含到哪一筆 AssignmentChange")
+    cells: str = Field(description="JSON：[[employee_id, 日（1-31）, shift_type_id, site_id], ...]（舊快照沒有 site_id）")
+
+
+class SchedulePreview(SQLModel, table=True):
+    # 自動排班預覽（dry run）：只存有變動的格子，套用時確認月份版本沒變才寫入
+    token: str = Field(primary_key=True)
+    month: str = Field(description="YYYY-MM")
+    site_id: Optional[int] = None
+    base_version: int = Field(description="預覽當下的月份版本（見 app.audit.month_version）")
+    created_at: datetime = Field(index=True)
+    cells: str = Field(description="JSON：[[employee_id, 日（1-31）, 舊 shift_type_id, 新 shift_type_id, site_id], ...]")
+
+
+class MonthVersion(SQLModel, table=True):
+    # 月份班表版本（樂觀鎖）：key 為 YYYY-MM（整月）或 YYYY-MM#site<id>（某據點），每次寫入都 +1
+    key: str = Field(primary_key=True)
+    version: int = 0
+
+
+class MonthLease(SQLModel, table=True):
+    # 月份排班租約：同一個 key 同時間只允許一次排班；result 保存給同參數的並行請求共用
+    key: str = Field(primary_key=True)
+    owner: str
+    params_hash: str
+    expires_at: datetime
+    result: Optional[str] = None
+
+
+class AppMeta(SQLModel, table=True):
+    # 應用程式自身的設定值（例如已套用的 schema/seed 指紋，用來略過重複的啟動工作）
+    key: str = Field(primary_key=True)
+    value: str
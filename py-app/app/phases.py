@@ -0,0 +1,35 @@
+"""
+排班各階段的計時標記（mark）。
+
+排班程式在每個階段結束時呼叫 mark()；只有目前執行緒正在剖析（app.profiling）時才有作用。
+這個模組不依賴其他套件，排班器載入時不會連帶載入 cProfile/pstats 與取樣器。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from app.profiling import ProfileRun
+
+_active = threading.local()
+
+
+def activate(run: ProfileRun | None) -> None:
+    """設定（或清除）目前執行緒正在記錄的剖析。"""
+    _active.run = run
+
+
+def mark(name: str) -> None:
+    """
+    標記「到這裡為止」的一個階段（記錄距離上一個標記的時間）。
+    只有目前執行緒正在剖析時才有作用，平常只多一次屬性查詢。
+    """
+    run: ProfileRun | None = getattr(_active, "run", None)
+    if run is None:
+        return
+    now = time.perf_counter()
+    run.phases.append((name, now - run.last_mark))
+    run.last_mark = now
@@ -0,0 +1,459 @@
+"""
+單次自動排班的效能剖析（POST /schedule/generate?profile=true，限管理者）。
+
+一次剖析會在 APP_DATA_DIR/profiles/<id>/ 留下：
+- report.json：各階段耗時、SQL 統計（語句、次數、耗時、筆數）、cProfile 前幾名函式
+- profile.pstats：cProfile 原始結果（python -m pstats、snakeviz 可開）
+- stacks.collapsed：取樣器的折疊堆疊（flamegraph.pl / speedscope 可直接讀）
+- snapshot.json：排班當下的完整輸入（參數、員工、班別、樣板、既有排班），可離線重播
+  （含員工姓名等個資：目錄只保留最近 PROFILE_KEEP 份、最多 PROFILE_MAX_AGE_DAYS 天，也可 DELETE /profiles/<id>）
+
+離線重播（在 py-app 目錄下；在記憶體 SQLite 上排班，不碰正式 DB）：
+    python -m app.profiling replay data/profiles/<id> --repeat 5
+    python -m app.profiling replay data/profiles/<id> --profile --set engine=matching
+重播會用 app.rule_check 檢查結果，並印出耗時。
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import secrets
+import shutil
+import sys
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from sqlalchemy import and_, event, or_
+from sqlalchemy.engine import Engine
+from sqlmodel import Session, select
+
+from app.models import Assignment, Employee, RotationTemplate, ShiftType
+from app.phases import activate, mark
+
+PROFILE_DIR = Path(os.environ.get("APP_DATA_DIR", "/app/data")) / "profiles"
+PROFILE_FILES = ("report.json", "profile.pstats", "stacks.collapsed", "snapshot.json")
+# 保留份數與天數（每次寫入新的剖析後清掉更舊的）
+PROFILE_KEEP = int(os.environ.get("APP_PROFILE_KEEP", "20"))
+PROFILE_MAX_AGE_DAYS = int(os.environ.get("APP_PROFILE_MAX_AGE_DAYS", "7"))
+SAMPLE_INTERVAL_SECONDS = 0.005
+SNAPSHOT_VERSION = 1
+# report.json 只列前幾名（完整內容在 pstats）
+TOP_FUNCTIONS = 40
+TOP_STATEMENTS = 50
+
+# 同一個行程同時只跑一個剖析：cProfile 在 3.12 以前不會擋第二個，兩次剖析的統計會互相混在一起
+_profile_lock = threading.Lock()
+
+
+class ProfilerBusy(RuntimeError):
+    """同一個行程已有其他剖析器在執行（cProfile 同時只能有一個）。"""
+
+
+class _Sampler(threading.Thread):
+    """每隔固定時間取樣目標執行緒的呼叫堆疊，累計成折疊堆疊（flamegraph 格式）。"""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL_SECONDS):
+        super().__init__(daemon=True, name="profile-sampler")
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names: list[str] = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                frame = frame.f_back
+            if names:
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._halt.set()
+        self.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+@dataclass
+class ProfileRun:
+    id: str
+    phases: list[tuple[str, float]] = field(default_factory=list)
+    statements: list[dict[str, Any]] = field(default_factory=list)
+    wall_seconds: float = 0.0
+    last_mark: float = 0.0
+    meta: dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def directory(self) -> Path:
+        return PROFILE_DIR / self.id
+
+    def sql_summary(self) -> dict[str, Any]:
+        by_sql: dict[str, dict[str, Any]] = {}
+        for s in self.statements:
+            agg = by_sql.setdefault(s["sql"], {"sql": s["sql"], "count": 0, "ms": 0.0, "rows": 0})
+            agg["count"] += 1
+            agg["ms"] += s["ms"]
+            agg["rows"] += max(0, s["rows"])
+        top = sorted(by_sql.values(), key=lambda a: a["ms"], reverse=True)[:TOP_STATEMENTS]
+        return {
+            "count": len(self.statements),
+            "ms": sum(s["ms"] for s in self.statements),
+            "rows": sum(max(0, s["rows"]) for s in self.statements),
+            "statements": [{**a, "ms": round(a["ms"], 3)} for a in top],
+        }
+
+    def summary(self) -> dict[str, Any]:
+        sql = self.sql_summary()
+        return {
+            "id": self.id,
+            **self.meta,
+            "wall_ms": round(self.wall_seconds * 1000, 3),
+            "phases": [{"name": n, "ms": round(s * 1000, 3)} for n, s in self.phases],
+            "sql": {"count": sql["count"], "ms": round(sql["ms"], 3), "rows": sql["rows"]},
+            "files": list(PROFILE_FILES),
+        }
+
+
+def _watch_sql(engine: Engine, session: Session | None, run: ProfileRun, thread_id: int) -> Callable[[], None]:
+    """
+    記錄剖析執行緒發出的每個 SQL（其他請求共用同一個 engine，依執行緒過濾）。
+    SELECT 的筆數在 cursor 層拿不到（SQLite rowcount 為 -1），另外從 ORM 查詢結果補上。
+    """
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread_id:
+            conn.info.setdefault("profile_t0", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() != thread_id:
+            return
+        t0 = conn.info["profile_t0"].pop()
+        run.statements.append(
+            {"sql": " ".join(statement.split()), "ms": (time.perf_counter() - t0) * 1000, "rows": cursor.rowcount}
+        )
+
+    def orm_execute(state):
+        if threading.get_ident() != thread_id or not state.is_select:
+            return None
+        before_count = len(run.statements)
+        frozen = state.invoke_statement().freeze()
+        if len(run.statements) > before_count:
+            run.statements[-1]["rows"] = len(frozen.data)
+        return frozen()
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    if session is not None:
+        event.listen(session, "do_orm_execute", orm_execute)
+
+    def remove() -> None:
+        event.remove(engine, "before_cursor_execute", before)
+        event.remove(engine, "after_cursor_execute", after)
+        if session is not None:
+            event.remove(session, "do_orm_execute", orm_execute)
+
+    return remove
+
+
+def new_profile_id() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S") + "-" + secrets.token_hex(4)
+
+
+def profile_call(
+    fn: Callable[[], Any],
+    engine: Engine,
+    session: Session | None = None,
+    snapshot: dict | None = None,
+    meta: dict[str, Any] | None = None,
+) -> tuple[Any, ProfileRun]:
+    """
+    在 cProfile + 取樣器 + SQL 記錄下執行 fn()，把報告寫到 PROFILE_DIR/<id>/。
+    fn 內用 mark() 標記階段；fn 丟出例外時報告照樣寫出（例外會再往外丟）。
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusy("已有其他剖析正在執行")
+    try:
+        return _profile_locked(fn, engine, session, snapshot, meta)
+    finally:
+        _profile_lock.release()
+
+
+def _profile_locked(
+    fn: Callable[[], Any],
+    engine: Engine,
+    session: Session | None,
+    snapshot: dict | None,
+    meta: dict[str, Any] | None,
+) -> tuple[Any, ProfileRun]:
+    run = ProfileRun(id=new_profile_id(), meta=dict(meta or {}))
+    thread_id = threading.get_ident()
+    profiler = cProfile.Profile()
+    try:
+        # 3.12 起同時只能有一個剖析器（例如本行程外層另有 cProfile）
+        profiler.enable()
+    except ValueError as e:
+        raise ProfilerBusy(str(e)) from e
+    profiler.disable()
+    sampler = _Sampler(thread_id)
+    remove_sql = _watch_sql(engine, session, run, thread_id)
+    activate(run)
+    sampler.start()
+    t0 = run.last_mark = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            result = fn()
+        finally:
+            profiler.disable()
+    finally:
+        run.wall_seconds = time.perf_counter() - t0
+        mark("other")
+        sampler.stop()
+        remove_sql()
+        activate(None)
+        _write_report(run, profiler, sampler, snapshot)
+        prune_profiles(keep_id=run.id)
+    return result, run
+
+
+def _write_report(run: ProfileRun, profiler: cProfile.Profile, sampler: _Sampler, snapshot: dict | None) -> None:
+    out = run.directory
+    out.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(str(out / "profile.pstats"))
+    (out / "stacks.collapsed").write_text(sampler.collapsed(), encoding="utf-8")
+    (out / "snapshot.json").write_text(
+        json.dumps(snapshot or {}, ensure_ascii=False, default=str, separators=(",", ":")), encoding="utf-8"
+    )
+
+    buf = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buf)
+    functions = []
+    for (filename, line, name), (_, calls, tottime, cumtime, _) in sorted(
+        stats.stats.items(), key=lambda kv: kv[1][3], reverse=True  # type: ignore[attr-defined]
+    )[:TOP_FUNCTIONS]:
+        functions.append(
+            {
+                "function": f"{Path(filename).name}:{line}({name})",
+                "calls": calls,
+                "tottime_ms": round(tottime * 1000, 3),
+                "cumtime_ms": round(cumtime * 1000, 3),
+            }
+        )
+    report = {
+        **run.summary(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "samples": sum(sampler.stacks.values()),
+        "sample_interval_ms": SAMPLE_INTERVAL_SECONDS * 1000,
+        "sql": run.sql_summary(),
+        "functions": functions,
+    }
+    (out / "report.json").write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def profile_path(profile_id: str, name: str) -> Path | None:
+    """下載用：只允許 PROFILE_FILES 內的檔名與 new_profile_id 產生的格式，避免路徑穿越。"""
+    if name not in PROFILE_FILES or not profile_id.replace("-", "").isalnum():
+        return None
+    path = PROFILE_DIR / profile_id / name
+    return path if path.is_file() else None
+
+
+def prune_profiles(keep_id: str | None = None) -> int:
+    """只留最近 PROFILE_KEEP 份、且不超過 PROFILE_MAX_AGE_DAYS 天的剖析（keep_id 一定保留）；回傳刪掉幾份。"""
+    if not PROFILE_DIR.is_dir():
+        return 0
+    cutoff = time.time() - timedelta(days=PROFILE_MAX_AGE_DAYS).total_seconds()
+    dirs = sorted(
+        ((d.stat().st_mtime, d) for d in PROFILE_DIR.iterdir() if d.is_dir() and d.name != keep_id), reverse=True
+    )
+    kept = 1 if keep_id else 0
+    removed = 0
+    for mtime, d in dirs:
+        if kept < PROFILE_KEEP and mtime >= cutoff:
+            kept += 1
+            continue
+        shutil.rmtree(d, ignore_errors=True)
+        removed += 1
+    return removed
+
+
+def delete_profile(profile_id: str) -> bool:
+    path = profile_path(profile_id, "report.json")
+    if path is None:
+        return False
+    shutil.rmtree(path.parent, ignore_errors=True)
+    return True
+
+
+def list_profiles() -> list[dict[str, Any]]:
+    if not PROFILE_DIR.is_dir():
+        return []
+    out = []
+    for d in sorted(PROFILE_DIR.iterdir(), reverse=True):
+        report = d / "report.json"
+        if report.is_file():
+            data = json.loads(report.read_text(encoding="utf-8"))
+            out.append({k: data.get(k) for k in ("id", "created_at", "wall_ms", "month", "site_id")})
+    return out
+
+
+# ---- 輸入快照與離線重播 ----
+
+
+def _dump(obj: Any) -> dict[str, Any]:
+    return obj.model_dump(mode="json")
+
+
+def take_snapshot(session: Session, month: str, params_dict: dict[str, Any], site_id: int | None) -> dict[str, Any]:
+    """
+    排班會讀到的所有資料（停用員工與其他據點的資料不影響結果，所以不存）。
+    員工與班別跟排班一樣經由 app.refcache 讀取，重播時看到的就是這次排班實際用的版本。
+    暖啟動時連同月初前 WARM_START_PERIOD 天的排班（暖啟動的提示來源，與排班一樣依員工篩選）一起存。
+    """
+    from app import refcache
+    from app.schedule_service import WARM_START_PERIOD, month_range
+
+    start, end = month_range(month)
+    employees = refcache.active_employees(session, site_id)
+    in_month = and_(Assignment.day >= start, Assignment.day <= end)
+    if site_id is not None:
+        in_month = and_(in_month, Assignment.site_id == site_id)
+    aq = select(Assignment).where(in_month)
+    if params_dict.get("warm_start"):
+        warm = and_(
+            Assignment.day >= start - WARM_START_PERIOD,
+            Assignment.day < start,
+            Assignment.employee_id.in_([e.id for e in employees]),  # type: ignore[attr-defined]
+        )
+        aq = select(Assignment).where(or_(in_month, warm))
+    return {
+        "version": SNAPSHOT_VERSION,
+        "month": month,
+        "site_id": site_id,
+        "params": params_dict,
+        "employees": [_dump(e) for e in employees],
+        "shift_types": [_dump(s) for s in refcache.shift_types(session)],
+        "rotation_templates": [_dump(t) for t in session.exec(select(RotationTemplate)).all()],
+        "assignments": [_dump(a) for a in session.exec(aq).all()],
+    }
+
+
+def load_snapshot(path: str | Path) -> dict[str, Any]:
+    p = Path(path)
+    if p.is_dir():
+        p = p / "snapshot.json"
+    data = json.loads(p.read_text(encoding="utf-8"))
+    if data.get("version") != SNAPSHOT_VERSION:
+        raise SystemExit(f"不支援的快照版本：{data.get('version')}")
+    return data
+
+
+def snapshot_engine(snapshot: dict[str, Any]) -> Engine:
+    """把快照放進一個全新的記憶體 SQLite（保留原本的 id）。"""
+    from sqlalchemy.pool import StaticPool
+    from sqlmodel import SQLModel, create_engine
+
+    from app.models import Site
+
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    site_ids = {row.get("site_id") for key in ("employees", "shift_types", "rotation_templates") for row in snapshot[key]}
+    with Session(engine) as session:
+        for sid in sorted(s for s in site_ids if s is not None):
+            session.add(Site(id=sid, name=f"site{sid}"))
+        for key, model in (
+            ("shift_types", ShiftType),
+            ("rotation_templates", RotationTemplate),
+            ("employees", Employee),
+            ("assignments", Assignment),
+        ):
+            for row in snapshot[key]:
+                session.add(model.model_validate(row))
+            session.flush()
+        session.commit()
+    return engine
+
+
+def replay(snapshot: dict[str, Any], overrides: dict[str, Any] | None = None) -> dict[str, Any]:
+    """在記憶體 DB 上重跑一次排班（只排不寫），回傳耗時、統計與規則檢查結果。"""
+    from app.rule_check import check_schedule
+    from app.schedule_service import _get_shift_by_code, month_range, params_from_dict, plan_month_schedule
+
+    params = params_from_dict({**snapshot["params"], **(overrides or {})})
+    engine = snapshot_engine(snapshot)
+    with Session(engine) as session:
+        t0 = time.perf_counter()
+        plan = plan_month_schedule(session, snapshot["month"], params, snapshot["site_id"])
+        seconds = time.perf_counter() - t0
+        shifts_by_code = _get_shift_by_code(session, snapshot["site_id"])
+        code_of = {s.id: s.code for s in session.exec(select(ShiftType)).all()}
+        cells: dict[tuple[int, date], str] = {}
+        for a in session.exec(select(Assignment)).all():
+            cells[(a.employee_id, a.day)] = code_of.get(a.shift_type_id, "")
+        for key, (_, new, _) in plan.cells.items():
+            if new is None:
+                cells.pop(key, None)
+            else:
+                cells[key] = code_of[new]
+        employees = [Employee.model_validate(e) for e in snapshot["employees"]]
+        start, end = month_range(snapshot["month"])
+        violations = check_schedule(employees, shifts_by_code, params, cells, start, end)
+    engine.dispose()
+    return {
+        "seconds": seconds,
+        "diff": plan.diff_counts(),
+        "warnings": len(plan.warnings),
+        "metrics": plan.metrics,
+        "violations": violations,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m app.profiling", description="排班剖析快照的離線重播")
+    sub = ap.add_subparsers(dest="command", required=True)
+    rp = sub.add_parser("replay", help="重播 snapshot.json（或剖析目錄）")
+    rp.add_argument("path")
+    rp.add_argument("--repeat", type=int, default=1, help="重跑幾次（取最短與中位數）")
+    rp.add_argument("--profile", action="store_true", help="在 cProfile 下跑一次並印出前 30 名")
+    rp.add_argument("--set", nargs="*", default=[], metavar="KEY=VALUE", help="覆寫排班參數（例如 engine=matching）")
+    args = ap.parse_args(argv)
+
+    from app.fuzz import _parse_overrides
+
+    snapshot = load_snapshot(args.path)
+    overrides = _parse_overrides(args.set)
+    print(f"month={snapshot['month']} site_id={snapshot['site_id']} employees={len(snapshot['employees'])}")
+
+    results = [replay(snapshot, overrides) for _ in range(max(1, args.repeat))]
+    times = sorted(r["seconds"] for r in results)
+    last = results[-1]
+    print(f"排班耗時：最短 {times[0] * 1000:.1f} ms，中位數 {times[len(times) // 2] * 1000:.1f} ms（{len(times)} 次）")
+    print(f"差異：{last['diff']}，警告 {last['warnings']} 筆，metrics={json.dumps(last['metrics'], ensure_ascii=False)}")
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(replay, snapshot, overrides)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(30)
+    if last["violations"]:
+        print(f"{len(last['violations'])} 筆違規")
+        for v in last["violations"][:10]:
+            print(f"  {v.rule} emp={v.employee_id} day={v.day} {v.detail}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,195 @@
+"""
+參考資料（班別、啟用中員工）的行程內快取。
+
+班別幾乎不會改、員工也很少改，但每次寫入/排班/列表都要查一次；這裡整批載入後放在記憶體，
+以「版本號」失效：
+- /shift-types、/employees 的異動在 commit 後呼叫 bump()：本行程立即清掉快取，
+  並把 Redis 上的版本號 +1
+- 其他行程（其他 API worker、Celery worker）最多每 CHECK_INTERVAL_SECONDS 秒讀一次 Redis 版本號，
+  與自己載入時的版本不同就重新載入
+- 連不到 Redis 時退回以時間失效：快取最多保留 FALLBACK_TTL_SECONDS 秒
+
+快取的物件是與 session 脫鉤的複本，只能讀，不可 session.add() 或修改。
+只快取主要 DB（app.db.engine）；其他 engine（例如 app.fuzz 的記憶體 DB）一律直接查詢。
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlmodel import Session, select
+
+from app.db import engine
+from app.models import Employee, ShiftType
+
+REDIS_VERSION_KEY = "refcache:version"
+CHECK_INTERVAL_SECONDS = 1.0
+FALLBACK_TTL_SECONDS = 5.0
+# 連不到 Redis 後，隔這麼久才再試一次（避免每次檢查都卡在連線逾時）
+REDIS_RETRY_SECONDS = 30.0
+# APP_REFCACHE=0 可整個關掉（每次都直接查 DB）
+ENABLED = os.environ.get("APP_REFCACHE", "1").lower() not in ("0", "false", "no")
+
+
+@dataclass
+class _Entry:
+    version: str | None
+    loaded_at: float
+    shift_types: list[ShiftType]
+    employees: list[Employee]
+    by_code: dict[int | None, dict[str, ShiftType]] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        self.shift_by_id = {s.id: s for s in self.shift_types if s.id is not None}
+
+
+_lock = threading.Lock()
+_entry: _Entry | None = None
+_checked_at = 0.0
+_redis_client: Any = None
+_redis_down_until = 0.0
+
+
+def _redis() -> Any:
+    global _redis_client
+    if _redis_client is None:
+        import redis  # 延遲載入：API 冷啟動不需要
+
+        _redis_client = redis.Redis.from_url(
+            os.environ.get("REDIS_URL", "redis://localhost:6379/0"),
+            socket_connect_timeout=0.2,
+            socket_timeout=0.2,
+        )
+    return _redis_client
+
+
+def _remote_version() -> str | None:
+    """Redis 上的版本號；連不到 Redis 時回傳 None（改用時間失效）。"""
+    global _redis_down_until
+    now = time.monotonic()
+    if now < _redis_down_until:
+        return None
+    try:
+        raw = _redis().get(REDIS_VERSION_KEY)
+    except Exception:
+        _redis_down_until = now + REDIS_RETRY_SECONDS
+        return None
+    return raw.decode() if raw is not None else "0"
+
+
+def _detach(obj: Any) -> Any:
+    return type(obj).model_validate(obj.model_dump())
+
+
+def _load(session: Session, version: str | None) -> _Entry:
+    shifts = session.exec(select(ShiftType).order_by(ShiftType.id)).all()
+    employees = session.exec(
+        select(Employee).where(Employee.active == True).order_by(Employee.id)  # noqa: E712
+    ).all()
+    return _Entry(
+        version=version,
+        loaded_at=time.monotonic(),
+        shift_types=[_detach(s) for s in shifts],
+        employees=[_detach(e) for e in employees],
+    )
+
+
+def _current(session: Session) -> _Entry | None:
+    """目前有效的快取；不適用快取（停用或非主要 DB）時回傳 None。"""
+    global _entry, _checked_at
+    if not ENABLED or session.get_bind() is not engine:
+        return None
+    now = time.monotonic()
+    entry = _entry
+    if entry is not None and now - _checked_at < CHECK_INTERVAL_SECONDS:
+        return entry
+    with _lock:
+        entry = _entry
+        if entry is not None and now - _checked_at < CHECK_INTERVAL_SECONDS:
+            return entry
+        version = _remote_version()
+        stale = (
+            entry is None
+            or version != entry.version
+            or (version is None and now - entry.loaded_at > FALLBACK_TTL_SECONDS)
+        )
+        if stale:
+            entry = _entry = _load(session, version)
+        _checked_at = now
+        return entry
+
+
+def bump() -> None:
+    """參考資料有異動（已 commit）後呼叫：清掉本行程快取，並通知其他行程。"""
+    global _entry, _redis_down_until
+    with _lock:
+        _entry = None
+    if time.monotonic() < _redis_down_until:
+        return
+    try:
+        _redis().incr(REDIS_VERSION_KEY)
+    except Exception:
+        _redis_down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+
+def clear() -> None:
+    """只清本行程的快取（測試或手動排除問題用）。"""
+    global _entry
+    with _lock:
+        _entry = None
+
+
+def shift_types(session: Session) -> list[ShiftType]:
+    entry = _current(session)
+    if entry is None:
+        return list(session.exec(select(ShiftType).order_by(ShiftType.id)).all())
+    return entry.shift_types
+
+
+def shift_map(session: Session) -> dict[int, ShiftType]:
+    entry = _current(session)
+    if entry is None:
+        return {s.id: s for s in session.exec(select(ShiftType)).all() if s.id is not None}
+    return entry.shift_by_id
+
+
+def shift_type(session: Session, shift_type_id: int) -> ShiftType | None:
+    # 快取裡沒有時再查一次 DB：別的行程剛新增、版本號還沒檢查到的班別也能用
+    found = shift_map(session).get(shift_type_id)
+    return found if found is not None else session.get(ShiftType, shift_type_id)
+
+
+def shifts_by_code(session: Session, site_id: int | None = None) -> dict[str, ShiftType]:
+    """班別代碼 -> 班別：共用班別先放，據點專屬班別同代碼時覆蓋共用班別。"""
+    entry = _current(session)
+    if entry is not None:
+        cached = entry.by_code.get(site_id)
+        if cached is not None:
+            return cached
+        shifts = entry.shift_types
+    else:
+        shifts = session.exec(select(ShiftType)).all()
+    out: dict[str, ShiftType] = {}
+    for s in sorted(shifts, key=lambda x: (x.site_id is not None, x.id or 0)):
+        if s.site_id is None or s.site_id == site_id:
+            out[s.code] = s
+    if entry is not None:
+        entry.by_code[site_id] = out
+    return out
+
+
+def active_employees(session: Session, site_id: int | None = None) -> list[Employee]:
+    """啟用中的員工（依 id 排序），可限定據點。"""
+    entry = _current(session)
+    if entry is None:
+        q = select(Employee).where(Employee.active == True)  # noqa: E712
+        if site_id is not None:
+            q = q.where(Employee.site_id == site_id)
+        return list(session.exec(q.order_by(Employee.id)).all())
+    if site_id is None:
+        return entry.employees
+    return [e for e in entry.employees if e.site_id == site_id]
@@ -0,0 +1,224 @@
+"""
+班表匯出/匯入的精簡二進位格式（只用標準函式庫，不需要 numpy/pyarrow）。
+
+檔案結構：
+- 4 bytes 魔術字 b"RSTR" + 1 byte 格式版本 + 4 bytes（big-endian）header 長度
+- header：UTF-8 JSON，含日期範圍、員工清單（列順序）、班別代碼表（索引 0 表示未排班）
+- body：zlib 壓縮的 員工 x 日 uint8 矩陣（逐列存放，每列是一位員工的整段日期）
+
+班別以「代碼」而不是 id 存放，匯入到另一個環境時依代碼對應回當地的班別。
+"""
+
+from __future__ import annotations
+
+import json
+import struct
+import zlib
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+from sqlmodel import Session, select
+
+from app.audit import CellChange
+from app.models import Assignment, Employee, ShiftType
+
+MAGIC = b"RSTR"
+FORMAT_VERSION = 1
+MEDIA_TYPE = "application/x-roster"
+_PREAMBLE = struct.Struct(">4sBI")
+# uint8 矩陣：0 保留給「未排班」
+MAX_CODES = 255
+# 一次匯出/匯入的月份上限（約 10 年）
+EXPORT_MAX_MONTHS = 120
+# 匯入時矩陣（員工數 x 天數）的上限：解壓縮前先用 header 檢查，避免惡意檔案撐爆記憶體
+MAX_IMPORT_CELLS = 20_000_000
+
+
+class RosterFormatError(ValueError):
+    pass
+
+
+@dataclass
+class Roster:
+    start: date
+    end: date
+    employees: list[dict]  # [{"id", "name"}]，順序即矩陣的列
+    codes: list[str]  # 索引 i+1 對應 codes[i]
+    matrix: bytes  # len(employees) * days
+
+    @property
+    def days(self) -> int:
+        return (self.end - self.start).days + 1
+
+
+def export_roster(session: Session, start: date, end: date, site_id: int | None = None) -> bytes:
+    q = select(Employee.id, Employee.name).order_by(Employee.id)
+    if site_id is not None:
+        q = q.where(Employee.site_id == site_id)
+    employees = [{"id": emp_id, "name": name} for emp_id, name in session.exec(q).all()]
+    row_of = {e["id"]: i for i, e in enumerate(employees)}
+    days = (end - start).days + 1
+
+    code_by_shift_id = {s.id: s.code for s in session.exec(select(ShiftType)).all()}
+    codes: list[str] = []
+    code_index: dict[str, int] = {}
+    matrix = bytearray(len(employees) * days)
+
+    aq = select(Assignment.employee_id, Assignment.day, Assignment.shift_type_id).where(
+        Assignment.day >= start, Assignment.day <= end
+    )
+    if site_id is not None:
+        aq = aq.where(Assignment.site_id == site_id)
+    for emp_id, d, shift_id in session.exec(aq).all():
+        row = row_of.get(emp_id)
+        code = code_by_shift_id.get(shift_id)
+        if row is None or code is None:
+            continue
+        idx = code_index.get(code)
+        if idx is None:
+            if len(codes) >= MAX_CODES:
+                raise RosterFormatError(f"班別代碼超過 {MAX_CODES} 種，無法匯出")
+            codes.append(code)
+            idx = code_index[code] = len(codes)
+        matrix[row * days + (d - start).days] = idx
+
+    header = json.dumps(
+        {
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "site_id": site_id,
+            "employees": employees,
+            "codes": codes,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)) + header + zlib.compress(bytes(matrix), 6)
+
+
+def read_roster(data: bytes) -> Roster:
+    if len(data) < _PREAMBLE.size:
+        raise RosterFormatError("檔案太短")
+    magic, version, header_len = _PREAMBLE.unpack_from(data)
+    if magic != MAGIC:
+        raise RosterFormatError("不是班表匯出檔")
+    if version != FORMAT_VERSION:
+        raise RosterFormatError(f"不支援的格式版本：{version}")
+    body_at = _PREAMBLE.size + header_len
+    if body_at > len(data):
+        raise RosterFormatError("檔案太短")
+    try:
+        header = json.loads(data[_PREAMBLE.size : body_at].decode("utf-8"))
+        roster = Roster(
+            start=date.fromisoformat(header["start"]),
+            end=date.fromisoformat(header["end"]),
+            employees=list(header["employees"]),
+            codes=list(header["codes"]),
+            matrix=b"",
+        )
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        raise RosterFormatError(f"檔案內容損毀：{e}") from e
+
+    # 先檢查 header，再依 header 算出的大小解壓縮（上限即預期大小，不會被壓縮炸彈撐爆）
+    months = (roster.end.year - roster.start.year) * 12 + roster.end.month - roster.start.month + 1
+    if roster.days <= 0:
+        raise RosterFormatError("日期範圍不正確")
+    if months > EXPORT_MAX_MONTHS:
+        raise RosterFormatError(f"日期範圍超過 {EXPORT_MAX_MONTHS} 個月")
+    if not all(isinstance(e, dict) for e in roster.employees):
+        raise RosterFormatError("員工清單格式不正確")
+    if len(roster.codes) > MAX_CODES or not all(isinstance(c, str) for c in roster.codes):
+        raise RosterFormatError("班別代碼表格式不正確")
+    expected = len(roster.employees) * roster.days
+    if expected > MAX_IMPORT_CELLS:
+        raise RosterFormatError(f"檔案太大：員工數 x 天數超過 {MAX_IMPORT_CELLS}")
+    try:
+        inflater = zlib.decompressobj()
+        matrix = inflater.decompress(data[body_at:], expected + 1)
+    except zlib.error as e:
+        raise RosterFormatError(f"檔案內容損毀：{e}") from e
+    if len(matrix) != expected or not inflater.eof:
+        raise RosterFormatError("矩陣大小與 header 不符")
+    if max(matrix, default=0) > len(roster.codes):
+        raise RosterFormatError("矩陣含有未定義的班別代碼")
+    roster.matrix = matrix
+    return roster
+
+
+@dataclass
+class ImportPlan:
+    changes: list[CellChange]
+    skipped_employees: list[dict]
+    missing_codes: list[str]
+
+
+def plan_import(session: Session, roster: Roster, match_by: str = "id", overwrite: bool = False) -> ImportPlan:
+    """
+    把匯出檔換算成對目前班表的格子異動（不寫入）。
+    - match_by="id"：以員工 id 對應（同一個環境備份還原）；"name"：以姓名對應（跨環境搬移）
+    - overwrite=True：檔案中空白的格子也會把目前的排班刪掉；否則只寫入有排班的格子
+    """
+    employees = session.exec(select(Employee)).all()
+    if match_by == "name":
+        lookup = {e.name: e for e in employees}
+        key = "name"
+    else:
+        lookup = {e.id: e for e in employees}
+        key = "id"
+
+    # 班別依員工所屬據點對應（據點專屬班別優先於共用班別）
+    shifts = session.exec(select(ShiftType)).all()
+    shift_ids: dict[int | None, dict[str, int]] = {}
+
+    def shift_id_for(site_id: int | None, code: str) -> int | None:
+        table = shift_ids.get(site_id)
+        if table is None:
+            table = {}
+            for s in sorted(shifts, key=lambda x: (x.site_id is not None, x.id or 0)):
+                if s.site_id is None or s.site_id == site_id:
+                    table[s.code] = s.id  # type: ignore[assignment]
+            shift_ids[site_id] = table
+        return table.get(code)
+
+    matched: list[tuple[int, Employee]] = []
+    skipped: list[dict] = []
+    for row, info in enumerate(roster.employees):
+        emp = lookup.get(info.get(key))
+        if emp is None or emp.id is None:
+            skipped.append(info)
+        else:
+            matched.append((row, emp))
+
+    emp_ids = [emp.id for _, emp in matched]
+    current: dict[tuple[int, date], int] = {}
+    if emp_ids:
+        rows = session.exec(
+            select(Assignment.employee_id, Assignment.day, Assignment.shift_type_id).where(
+                Assignment.day >= roster.start,
+                Assignment.day <= roster.end,
+                Assignment.employee_id.in_(emp_ids),  # type: ignore[attr-defined]
+            )
+        ).all()
+        current = {(emp_id, d): shift_id for emp_id, d, shift_id in rows}
+
+    days = roster.days
+    day_list = [roster.start + timedelta(days=i) for i in range(days)]
+    missing: set[str] = set()
+    changes: list[CellChange] = []
+    for row, emp in matched:
+        cells = roster.matrix[row * days : (row + 1) * days]
+        for i, idx in enumerate(cells):
+            d = day_list[i]
+            old = current.get((emp.id, d))  # type: ignore[arg-type]
+            if idx == 0:
+                if overwrite and old is not None:
+                    changes.append(CellChange(emp.id, d, old, None, emp.site_id))  # type: ignore[arg-type]
+                continue
+            code = roster.codes[idx - 1]
+            new = shift_id_for(emp.site_id, code)
+            if new is None:
+                missing.add(code)
+                continue
+            if new != old:
+                changes.append(CellChange(emp.id, d, old, new, emp.site_id))  # type: ignore[arg-type]
+    return ImportPlan(changes=changes, skipped_employees=skipped, missing_codes=sorted(missing))
@@ -0,0 +1,62 @@
+"""
+輪班樣板（RotationTemplate）展開成每日班別。
+
+第 d 天的班別 = pattern[((d - anchor_date).days + rotation_offset) % len(pattern)]，
+與月份無關，所以同一個人每個月排出來的循環都接得上。
+同一樣板、同一個循環起點的員工共用同一段展開結果（每月每種組合只算一次）。
+"""
+
+from __future__ import annotations
+
+from datetime import date
+from functools import lru_cache
+from typing import Iterable
+
+from sqlmodel import Session, select
+
+from app.models import Employee, RotationTemplate
+
+MAX_PATTERN_LENGTH = 366
+
+
+@lru_cache(maxsize=256)
+def parse_pattern(pattern: str) -> tuple[str | None, ...]:
+    # 空白代碼（例如 "早,,O"）表示那天不固定，交給自動排班
+    return tuple((c.strip() or None) for c in pattern.replace("，", ",").split(","))
+
+
+def stamp(pattern: tuple[str | None, ...], phase: int, days: int) -> list[str | None]:
+    # 從循環第 phase 天開始，連續展開 days 天
+    n = len(pattern)
+    if n == 0:
+        return [None] * days
+    repeats = (phase % n + days) // n + 1
+    return list((pattern * repeats)[phase % n : phase % n + days])
+
+
+class RotationLibrary:
+    """一次排班用的樣板庫：快取每種（樣板, 循環起點）的展開結果。load() 只載入啟用中的樣板。"""
+
+    def __init__(self, templates: Iterable[RotationTemplate], start: date, days: int):
+        self.start = start
+        self.days = days
+        self.templates = {t.id: t for t in templates if t.id is not None}
+        self._stamped: dict[tuple[int, int], list[str | None]] = {}
+
+    @classmethod
+    def load(cls, session: Session, start: date, days: int) -> RotationLibrary:
+        return cls(session.exec(select(RotationTemplate).where(RotationTemplate.active == True)).all(), start, days)  # noqa: E712
+
+    def codes_for(self, emp: Employee) -> list[str | None] | None:
+        t = self.templates.get(emp.rotation_template_id) if emp.rotation_template_id else None
+        if t is None:
+            return None
+        pattern = parse_pattern(t.pattern)
+        if not pattern:
+            return None
+        phase = ((self.start - t.anchor_date).days + int(emp.rotation_offset or 0)) % len(pattern)
+        key = (t.id, phase)  # type: ignore[assignment]
+        codes = self._stamped.get(key)
+        if codes is None:
+            codes = self._stamped[key] = stamp(pattern, phase, self.days)
+        return codes
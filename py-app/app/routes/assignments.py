@@ -1,14 +1,33 @@
 from __future__ import annotations
 
-from datetime import date
+from datetime import date, datetime
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
+from app import refcache
+from app.audit import (
+    CellChange,
+    VersionConflict,
+    month_cells_as_of,
+    month_version,
+    record_changes,
+    version_key,
+)
 from app.db import get_session
-from app.models import Assignment, ShiftType
-from app.schedule_service import month_range
+from app.models import Assignment, Employee
+from app.roster_io import (
+    EXPORT_MAX_MONTHS,
+    MEDIA_TYPE,
+    RosterFormatError,
+    export_roster,
+    plan_import,
+    read_roster,
+)
+from app.schedule_service import month_range, write_cell_changes
 
 router = APIRouter(prefix="/assignments", tags=["assignments"])
 
@@ -27,22 +46,28 @@ class AssignmentUpsert(BaseModel):
     day: date
     shift_type_id: int | None = None
     note: str | None = None
+    # 樂觀鎖：讀取時拿到的月份版本（GET /assignments 的 X-Month-Version）；不帶則不檢查
+    expected_version: int | None = None
 
 
 @router.get("")
 def list_assignments(
+    response: Response,
     month: str = Query(..., description="YYYY-MM"),
+    site_id: int | None = Query(None, description="只列出指定據點的排班"),
+    as_of: datetime | None = Query(None, description="回傳該時間點的排班（由快照 + 異動紀錄重建）"),
     session: Session = Depends(get_session),
 ) -> list[AssignmentDTO]:
+    if as_of is not None:
+        return _list_as_of(session, month, as_of, site_id)
+    # 指定據點時回傳該據點的版本（只有該據點的格子變動才會 +1）
+    response.headers["X-Month-Version"] = str(month_version(session, month, site_id))
     start, end = month_range(month)
-    items = session.exec(select(Assignment).where(Assignment.day >= start, Assignment.day <= end)).all()
-    shift_ids = {a.shift_type_id for a in items}
-    if not shift_ids:
-        return []
-    shift_map = {
-        s.id: s
-        for s in session.exec(select(ShiftType).where(ShiftType.id.in_(list(shift_ids)))).all()  # type: ignore[attr-defined]
-    }
+    q = select(Assignment).where(Assignment.day >= start, Assignment.day <= end)
+    if site_id is not None:
+        q = q.where(Assignment.site_id == site_id)
+    items = session.exec(q).all()
+    shift_map = refcache.shift_map(session)
 
     out: list[AssignmentDTO] = []
     for a in items:
@@ -62,48 +87,215 @@ def list_assignments(
     return out
 
 
-@router.put("")
-def upsert_assignment(payload: AssignmentUpsert, session: Session = Depends(get_session)) -> dict:
-    # shift_type_id 為 null -> 刪除當天指派
+def _list_as_of(session: Session, month: str, as_of: datetime, site_id: int | None) -> list[AssignmentDTO]:
+    # 依格子當時記錄的據點篩選（不是員工目前的據點）
+    cells = month_cells_as_of(session, month, as_of, site_id)
+    shift_map = refcache.shift_map(session)
+    out: list[AssignmentDTO] = []
+    for (emp_id, d), shift_id in sorted(cells.items()):
+        s = shift_map.get(shift_id)
+        if not s:
+            continue
+        out.append(
+            AssignmentDTO(employee_id=emp_id, day=d, shift_type_id=shift_id, shift_code=s.code, shift_name=s.name)
+        )
+    return out
+
+
+def _apply_upsert(payload: AssignmentUpsert, session: Session) -> CellChange | None:
+    # 只改 session（不 commit），回傳這一格的異動，讓呼叫端整批寫異動紀錄
     existing = session.exec(
         select(Assignment).where(Assignment.employee_id == payload.employee_id, Assignment.day == payload.day)
     ).first()
 
     if payload.shift_type_id is None:
-        if existing:
-            session.delete(existing)
-            session.commit()
-        return {"ok": True, "deleted": True}
+        if not existing:
+            return None
+        session.delete(existing)
+        return CellChange(existing.employee_id, existing.day, existing.shift_type_id, None, existing.site_id)
 
-    shift = session.get(ShiftType, payload.shift_type_id)
+    shift = refcache.shift_type(session, payload.shift_type_id)
     if not shift:
         raise HTTPException(status_code=400, detail="shift_type_id 不存在")
 
     if existing:
+        old_shift_type_id = existing.shift_type_id
         existing.shift_type_id = payload.shift_type_id
         existing.note = payload.note
         session.add(existing)
+        return CellChange(
+            existing.employee_id, existing.day, old_shift_type_id, payload.shift_type_id, existing.site_id
+        )
     else:
+        emp = session.get(Employee, payload.employee_id)
         session.add(
             Assignment(
                 employee_id=payload.employee_id,
                 day=payload.day,
                 shift_type_id=payload.shift_type_id,
+                site_id=emp.site_id if emp else None,
                 note=payload.note,
             )
         )
-    session.commit()
-    return {"ok": True}
+        return CellChange(payload.employee_id, payload.day, None, payload.shift_type_id, emp.site_id if emp else None)
+
+
+def _month_of(d: date) -> str:
+    return f"{d.year:04d}-{d.month:02d}"
+
+
+def _commit_changes(
+    session: Session, changes: list[CellChange], source: str, expected_versions: dict[str, int]
+) -> None:
+    # 版本不符（VersionConflict）或並行寫入撞到唯一鍵（IntegrityError）都回 409，讓前端重新讀取後再改
+    try:
+        record_changes(session, changes, source=source, expected_versions=expected_versions)
+        session.commit()
+    except VersionConflict as e:
+        session.rollback()
+        raise HTTPException(status_code=409, detail=f"班表已被其他人修改（{e.key}），請重新讀取後再試")
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="同一格同時被其他人修改，請重新讀取後再試")
+
+
+@router.put("")
+def upsert_assignment(payload: AssignmentUpsert, session: Session = Depends(get_session)) -> dict:
+    # shift_type_id 為 null -> 刪除當天指派
+    month = _month_of(payload.day)
+    expected = {} if payload.expected_version is None else {version_key(month): payload.expected_version}
+    change = _apply_upsert(payload, session)
+    _commit_changes(session, [change] if change else [], "put", expected)
+    out: dict = {"ok": True, "version": month_version(session, month)}
+    if payload.shift_type_id is None:
+        out["deleted"] = True
+    return out
 
 
 class BulkUpsertRequest(BaseModel):
     items: list[AssignmentUpsert]
+    # 樂觀鎖：version_key（"YYYY-MM" 或 "YYYY-MM#site<id>"）-> 讀取時的版本
+    expected_versions: dict[str, int] = {}
 
 
 @router.post("/bulk")
 def bulk_upsert(payload: BulkUpsertRequest, session: Session = Depends(get_session)) -> dict:
+    # 共用單格邏輯（同一個 session），整批一個 transaction、異動紀錄一次寫入
+    expected = dict(payload.expected_versions)
+    changes: list[CellChange] = []
     for item in payload.items:
-        upsert_assignment(item, session)  # 共用邏輯（同一個 session）
-    return {"ok": True, "count": len(payload.items)}
+        if item.expected_version is not None:
+            expected.setdefault(version_key(_month_of(item.day)), item.expected_version)
+        change = _apply_upsert(item, session)
+        if change:
+            changes.append(change)
+    _commit_changes(session, changes, "bulk", expected)
+    months = sorted({_month_of(item.day) for item in payload.items})
+    return {
+        "ok": True,
+        "count": len(payload.items),
+        "versions": {m: month_version(session, m) for m in months},
+    }
+
+
+class RestoreRequest(BaseModel):
+    as_of: datetime
 
 
+@router.post("/restore")
+def restore_month(
+    payload: RestoreRequest,
+    month: str = Query(..., description="YYYY-MM"),
+    session: Session = Depends(get_session),
+) -> dict:
+    # 把整個月份還原成 as_of 當下的排班（例如復原一次失敗的自動排班）；還原本身也會記錄成異動
+    target = month_cells_as_of(session, month, payload.as_of)
+    start, end = month_range(month)
+    current = {
+        (a.employee_id, a.day): a
+        for a in session.exec(select(Assignment).where(Assignment.day >= start, Assignment.day <= end)).all()
+    }
+    emp_site = {e.id: e.site_id for e in session.exec(select(Employee)).all()}
+    changes = [
+        CellChange(a.employee_id, a.day, a.shift_type_id, target.get(key), a.site_id) for key, a in current.items()
+    ]
+    changes += [
+        CellChange(emp_id, d, None, shift_id, emp_site.get(emp_id))
+        for (emp_id, d), shift_id in target.items()
+        if (emp_id, d) not in current
+    ]
+    try:
+        count = write_cell_changes(session, changes, source="restore")
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="還原期間此月份班表同時被修改，請重試")
+    return {"ok": True, "changed": count, "version": month_version(session, month)}
+
+
+def _month_span(start_month: str, end_month: str) -> tuple[date, date]:
+    try:
+        start, _ = month_range(start_month)
+        _, end = month_range(end_month)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="月份格式需為 YYYY-MM")
+    months = (end.year - start.year) * 12 + end.month - start.month + 1
+    if months <= 0:
+        raise HTTPException(status_code=400, detail="end_month 不可早於 start_month")
+    if months > EXPORT_MAX_MONTHS:
+        raise HTTPException(status_code=400, detail=f"一次最多 {EXPORT_MAX_MONTHS} 個月")
+    return start, end
+
+
+@router.get("/export")
+def export_assignments(
+    start_month: str = Query(..., description="YYYY-MM"),
+    end_month: str | None = Query(None, description="YYYY-MM（不帶表示只匯出 start_month）"),
+    site_id: int | None = Query(None, description="只匯出指定據點"),
+    session: Session = Depends(get_session),
+) -> Response:
+    # 員工 x 日 的班別代碼矩陣（zlib 壓縮），格式見 app.roster_io
+    start, end = _month_span(start_month, end_month or start_month)
+    data = export_roster(session, start, end, site_id)
+    filename = f"roster-{start_month}-{end_month or start_month}.rstr"
+    return Response(
+        content=data,
+        media_type=MEDIA_TYPE,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _import(session: Session, data: bytes, match_by: str, overwrite: bool) -> dict:
+    try:
+        roster = read_roster(data)
+    except RosterFormatError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    plan = plan_import(session, roster, match_by=match_by, overwrite=overwrite)
+    if plan.missing_codes:
+        raise HTTPException(status_code=400, detail=f"缺少班別代碼：{', '.join(plan.missing_codes)}（請先建立班別）")
+    # 走批次寫入：整份檔案一個 transaction、異動紀錄一次寫入
+    try:
+        count = write_cell_changes(session, plan.changes, source="import")
+        session.commit()
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="匯入期間班表同時被修改，請重試")
+    return {
+        "ok": True,
+        "start": roster.start.isoformat(),
+        "end": roster.end.isoformat(),
+        "changed": count,
+        "skipped_employees": plan.skipped_employees,
+    }
+
+
+@router.post("/import")
+async def import_assignments(
+    request: Request,
+    match_by: str = Query("id", pattern="^(id|name)$", description="員工對應方式：id（同環境還原）或 name（跨環境搬移）"),
+    overwrite: bool = Query(False, description="檔案中空白的格子也刪除目前的排班"),
+    session: Session = Depends(get_session),
+) -> dict:
+    # body 直接放 GET /assignments/export 下載的檔案內容
+    data = await request.body()
+    return await run_in_threadpool(_import, session, data, match_by, overwrite)
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, HTTPException
+import base64
+import hashlib
+import json
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
+from sqlalchemy import and_, or_
 from sqlmodel import Session, select
 
+from app import refcache
+from app.audit import CellChange, record_changes
 from app.db import get_session
-from app.models import Employee
+from app.models import Assignment, Employee, RotationTemplate, Site
 
 router = APIRouter(prefix="/employees", tags=["employees"])
 
@@ -18,6 +26,10 @@ class EmployeeCreate(BaseModel):
     can_work_night: bool = True
     night_only: bool = False
     special_requirements: str | None = None
+    preferred_shift_codes: str | None = None
+    site_id: int | None = None
+    rotation_template_id: int | None = None
+    rotation_offset: int = 0
 
 
 class EmployeeUpdate(BaseModel):
@@ -29,15 +41,110 @@ class EmployeeUpdate(BaseModel):
     can_work_night: bool | None = None
     night_only: bool | None = None
     special_requirements: str | None = None
+    preferred_shift_codes: str | None = None
+    site_id: int | None = None
+    rotation_template_id: int | None = None
+    rotation_offset: int | None = None
+
+
+def _check_site(session: Session, site_id: int | None) -> None:
+    if site_id is not None and not session.get(Site, site_id):
+        raise HTTPException(status_code=400, detail="site_id 不存在")
 
 
-@router.get("")
-def list_employees(session: Session = Depends(get_session)) -> list[Employee]:
-    return session.exec(select(Employee).order_by(Employee.active.desc(), Employee.id)).all()
+def _check_rotation(session: Session, rotation_template_id: int | None, site_id: int | None) -> None:
+    if rotation_template_id is None:
+        return
+    t = session.get(RotationTemplate, rotation_template_id)
+    if not t:
+        raise HTTPException(status_code=400, detail="rotation_template_id 不存在")
+    # 據點專屬樣板的班別代碼是依該據點驗證的，只能套用在同據點的員工；共用樣板（site_id 為空）不限
+    if t.site_id is not None and t.site_id != site_id:
+        raise HTTPException(status_code=400, detail="輪班樣板屬於其他據點，請改用同據點或共用的樣板")
+
+
+EMPLOYEE_FIELDS = tuple(Employee.model_fields)
+
+
+def _encode_cursor(active: bool, employee_id: int) -> str:
+    raw = json.dumps([int(active), employee_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[bool, int]:
+    try:
+        active, employee_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return bool(active), int(employee_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="cursor 格式錯誤")
+
+
+def _parse_fields(fields: str | None) -> list[str]:
+    if not fields:
+        return list(EMPLOYEE_FIELDS)
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in names if f not in EMPLOYEE_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的欄位：{', '.join(unknown)}")
+    # id 一定回傳（分頁與後續 PATCH 都要用）
+    return ["id", *[f for f in names if f != "id"]]
+
+
+@router.get("", response_model=None)
+def list_employees(
+    request: Request,
+    site_id: int | None = Query(None, description="只列出指定據點的員工"),
+    active: bool | None = Query(None, description="只列出啟用中（true）或停用（false）的員工"),
+    night_only: bool | None = Query(None),
+    can_work_night: bool | None = Query(None),
+    fields: str | None = Query(None, description="只回傳這些欄位（逗號分隔，例如 id,name,color）"),
+    limit: int | None = Query(None, ge=1, le=1000, description="每頁筆數（不帶則回傳全部）"),
+    cursor: str | None = Query(None, description="上一頁回應標頭 X-Next-Cursor 的值"),
+    session: Session = Depends(get_session),
+) -> Response:
+    # 排序固定為 active desc, id；分頁用 keyset（從上一頁最後一筆之後接著讀），不用 offset
+    columns = _parse_fields(fields)
+    sort_cols = [c for c in ("active", "id") if c not in columns]
+    q = select(*[getattr(Employee, c) for c in [*columns, *sort_cols]])
+    if site_id is not None:
+        q = q.where(Employee.site_id == site_id)
+    if active is not None:
+        q = q.where(Employee.active == active)
+    if night_only is not None:
+        q = q.where(Employee.night_only == night_only)
+    if can_work_night is not None:
+        q = q.where(Employee.can_work_night == can_work_night)
+    if cursor:
+        last_active, last_id = _decode_cursor(cursor)
+        after = and_(Employee.active == last_active, Employee.id > last_id)  # type: ignore[arg-type]
+        # active desc：啟用中的讀完後接著讀停用的
+        q = q.where(or_(after, Employee.active == False) if last_active else after)  # noqa: E712
+    q = q.order_by(Employee.active.desc(), Employee.id)  # type: ignore[attr-defined]
+    if limit is not None:
+        q = q.limit(limit + 1)
+    rows = [dict(r._mapping) for r in session.execute(q).all()]
+
+    headers: dict[str, str] = {}
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = _encode_cursor(rows[-1]["active"], rows[-1]["id"])
+    body = json.dumps(
+        jsonable_encoder([{c: r[c] for c in columns} for r in rows]), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+    # 條件式 GET：內容沒變就回 304，不重送整份名單
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    headers["ETag"] = etag
+    headers["Cache-Control"] = "no-cache"
+    if etag in [t.strip() for t in request.headers.get("if-none-match", "").split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.post("", status_code=201)
 def create_employee(payload: EmployeeCreate, session: Session = Depends(get_session)) -> Employee:
+    _check_site(session, payload.site_id)
+    _check_rotation(session, payload.rotation_template_id, payload.site_id)
     can_work_night = payload.can_work_night
     if payload.night_only:
         can_work_night = True
@@ -49,15 +156,34 @@ def create_employee(payload: EmployeeCreate, session: Session = Depends(get_sess
         can_work_night=can_work_night,
         night_only=payload.night_only,
         special_requirements=payload.special_requirements,
+        preferred_shift_codes=payload.preferred_shift_codes,
+        site_id=payload.site_id,
+        rotation_template_id=payload.rotation_template_id,
+        rotation_offset=payload.rotation_offset,
     )
     if not e.name:
         raise HTTPException(status_code=400, detail="name 不可為空")
     session.add(e)
     session.commit()
+    refcache.bump()
     session.refresh(e)
     return e
 
 
+def _move_assignments(session: Session, employee_id: int, site_id: int | None) -> None:
+    # 換據點：既有排班一起搬過去，維持依據點切分的查詢一致。
+    # 異動紀錄記成「舊據點移除 + 新據點新增」：兩邊據點與整月的版本都 +1，as_of 也看得到搬移
+    rows = session.exec(select(Assignment).where(Assignment.employee_id == employee_id)).all()
+    changes: list[CellChange] = []
+    for a in rows:
+        changes.append(CellChange(employee_id, a.day, a.shift_type_id, None, a.site_id))
+        changes.append(CellChange(employee_id, a.day, None, a.shift_type_id, site_id))
+        a.site_id = site_id
+        session.add(a)
+    session.flush()
+    record_changes(session, changes, source="employee-site")
+
+
 @router.patch("/{employee_id}")
 def update_employee(
     employee_id: int, payload: EmployeeUpdate, session: Session = Depends(get_session)
@@ -66,6 +192,15 @@ def update_employee(
     if not e:
         raise HTTPException(status_code=404, detail="employee not found")
     data = payload.model_dump(exclude_unset=True)
+    old_site_id = e.site_id
+    if "site_id" in data:
+        _check_site(session, data["site_id"])
+    if "rotation_template_id" in data or "site_id" in data:
+        _check_rotation(
+            session, data.get("rotation_template_id", e.rotation_template_id), data.get("site_id", e.site_id)
+        )
+    if data.get("rotation_offset", 0) is None:
+        data["rotation_offset"] = 0
     for k, v in data.items():
         if k in ["max_work_days_per_month", "max_consecutive_work_days"] and v is not None:
             setattr(e, k, max(0, int(v)))
@@ -77,7 +212,10 @@ def update_employee(
     if e.name is not None:
         e.name = e.name.strip()
     session.add(e)
+    if e.site_id != old_site_id:
+        _move_assignments(session, employee_id, e.site_id)
     session.commit()
+    refcache.bump()
     session.refresh(e)
     return e
 
@@ -89,5 +227,6 @@ def delete_employee(employee_id: int, session: Session = Depends(get_session)) -
         return
     session.delete(e)
     session.commit()
+    refcache.bump()
 
 
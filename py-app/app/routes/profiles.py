@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import FileResponse
+
+from app.admin import is_admin
+
+# app.profiling（cProfile/pstats）在各 handler 內延遲載入，不拖慢 API 冷啟動
+router = APIRouter(prefix="/profiles", tags=["profiles"])
+
+_MEDIA_TYPES = {
+    "report.json": "application/json",
+    "snapshot.json": "application/json",
+    "profile.pstats": "application/octet-stream",
+    "stacks.collapsed": "text/plain; charset=utf-8",
+}
+
+
+def check_admin(token: str | None) -> None:
+    if not is_admin(token):
+        raise HTTPException(status_code=403, detail="需要管理者權杖（X-Admin-Token）")
+
+
+@router.get("")
+def get_profiles(x_admin_token: str | None = Header(None)) -> list[dict]:
+    check_admin(x_admin_token)
+    from app.profiling import list_profiles
+
+    return list_profiles()
+
+
+@router.get("/{profile_id}/{name}")
+def download_profile_file(profile_id: str, name: str, x_admin_token: str | None = Header(None)) -> FileResponse:
+    check_admin(x_admin_token)
+    from app.profiling import profile_path
+
+    path = profile_path(profile_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="profile not found")
+    return FileResponse(path, media_type=_MEDIA_TYPES[name], filename=f"{profile_id}-{name}")
+
+
+@router.delete("/{profile_id}", status_code=204)
+def remove_profile(profile_id: str, x_admin_token: str | None = Header(None)) -> None:
+    # snapshot.json 含員工資料，用完可以直接刪掉（不存在也回 204）
+    check_admin(x_admin_token)
+    from app.profiling import delete_profile
+
+    delete_profile(profile_id)
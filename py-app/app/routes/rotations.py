@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from app.db import get_session
+from app.models import Employee, RotationTemplate, ShiftType, Site
+from app.rotations import MAX_PATTERN_LENGTH, RotationLibrary, parse_pattern
+from app.schedule_service import month_range
+
+router = APIRouter(prefix="/rotations", tags=["rotations"])
+
+
+class RotationCreate(BaseModel):
+    name: str
+    pattern: str
+    anchor_date: date = date(2024, 1, 1)
+    site_id: int | None = None
+
+
+class RotationUpdate(BaseModel):
+    name: str | None = None
+    pattern: str | None = None
+    anchor_date: date | None = None
+    site_id: int | None = None
+    active: bool | None = None
+
+
+def _check_pattern(session: Session, pattern: str, site_id: int | None) -> str:
+    codes = parse_pattern(pattern)
+    if not codes or all(c is None for c in codes):
+        raise HTTPException(status_code=400, detail="pattern 不可為空")
+    if len(codes) > MAX_PATTERN_LENGTH:
+        raise HTTPException(status_code=400, detail=f"pattern 最多 {MAX_PATTERN_LENGTH} 天")
+    q = select(ShiftType.code)
+    if site_id is None:
+        q = q.where(ShiftType.site_id == None)  # noqa: E711
+    else:
+        q = q.where((ShiftType.site_id == None) | (ShiftType.site_id == site_id))  # noqa: E711
+    known = set(session.exec(q).all())
+    unknown = sorted({c for c in codes if c is not None and c not in known})
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的班別代碼：{', '.join(unknown)}")
+    # 存成正規化後的格式
+    return ",".join(c or "" for c in codes)
+
+
+def _check_site(session: Session, site_id: int | None) -> None:
+    if site_id is not None and not session.get(Site, site_id):
+        raise HTTPException(status_code=400, detail="site_id 不存在")
+
+
+@router.get("")
+def list_rotations(
+    site_id: int | None = Query(None, description="只列出指定據點的樣板"),
+    session: Session = Depends(get_session),
+) -> list[RotationTemplate]:
+    q = select(RotationTemplate)
+    if site_id is not None:
+        q = q.where(RotationTemplate.site_id == site_id)
+    return session.exec(q.order_by(RotationTemplate.active.desc(), RotationTemplate.id)).all()
+
+
+@router.post("", status_code=201)
+def create_rotation(payload: RotationCreate, session: Session = Depends(get_session)) -> RotationTemplate:
+    name = payload.name.strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="name 不可為空")
+    _check_site(session, payload.site_id)
+    t = RotationTemplate(
+        name=name,
+        pattern=_check_pattern(session, payload.pattern, payload.site_id),
+        anchor_date=payload.anchor_date,
+        site_id=payload.site_id,
+    )
+    session.add(t)
+    session.commit()
+    session.refresh(t)
+    return t
+
+
+@router.patch("/{rotation_id}")
+def update_rotation(
+    rotation_id: int, payload: RotationUpdate, session: Session = Depends(get_session)
+) -> RotationTemplate:
+    t = session.get(RotationTemplate, rotation_id)
+    if not t:
+        raise HTTPException(status_code=404, detail="rotation not found")
+    data = payload.model_dump(exclude_unset=True)
+    if "site_id" in data:
+        _check_site(session, data["site_id"])
+        if data["site_id"] is not None:
+            other_site = session.exec(
+                select(Employee.id).where(
+                    Employee.rotation_template_id == rotation_id,
+                    (Employee.site_id == None) | (Employee.site_id != data["site_id"]),  # noqa: E711
+                )
+            ).first()
+            if other_site is not None:
+                raise HTTPException(status_code=409, detail="仍有其他據點的員工套用此樣板，無法改成據點專屬樣板")
+    for k, v in data.items():
+        setattr(t, k, v)
+    if t.name is not None:
+        t.name = t.name.strip()
+    if "pattern" in data or "site_id" in data:
+        t.pattern = _check_pattern(session, t.pattern, t.site_id)
+    session.add(t)
+    session.commit()
+    session.refresh(t)
+    return t
+
+
+@router.delete("/{rotation_id}", status_code=204)
+def delete_rotation(rotation_id: int, session: Session = Depends(get_session)) -> None:
+    t = session.get(RotationTemplate, rotation_id)
+    if not t:
+        return
+    in_use = session.exec(select(Employee.id).where(Employee.rotation_template_id == rotation_id)).first()
+    if in_use is not None:
+        raise HTTPException(status_code=409, detail="仍有員工套用此樣板，請先改掉或改為停用樣板")
+    session.delete(t)
+    session.commit()
+
+
+@router.get("/{rotation_id}/preview")
+def preview_rotation(
+    rotation_id: int,
+    month: str = Query(..., description="YYYY-MM"),
+    offset: int = Query(0, description="循環位移天數（同 Employee.rotation_offset）"),
+    session: Session = Depends(get_session),
+) -> dict:
+    # 看某個位移在指定月份展開後每天的班別（空白表示交給自動排班）
+    t = session.get(RotationTemplate, rotation_id)
+    if not t:
+        raise HTTPException(status_code=404, detail="rotation not found")
+    start, end = month_range(month)
+    library = RotationLibrary([t], start, (end - start).days + 1)
+    codes = library.codes_for(Employee(name="", rotation_template_id=t.id, rotation_offset=offset)) or []
+    return {"month": month, "offset": offset, "codes": codes}
@@ -1,16 +1,41 @@
 from __future__ import annotations
 
-from datetime import date
+import json
+import secrets
+from datetime import date, timedelta
+from typing import Callable
 
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from pydantic import BaseModel
-from sqlmodel import Session
+from sqlalchemy import delete
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import Session, select
 
+from app import refcache
+from app.audit import CellChange, VersionConflict, month_version, to_utc, utcnow, version_key
 from app.db import get_session
-from app.schedule_service import GenerateParams, fill_month_off, generate_month_schedule
+from app.locks import LeaseBusy, generation_lock_key, params_hash, run_exclusive
+from app.models import SchedulePreview, Site
+from app.routes.profiles import check_admin
+from app.schedule_warnings import warnings_payload
+from app.scoring import DEFAULT_WEIGHTS_CLUSTERED, DEFAULT_WEIGHTS_SPREAD, SCORE_TERMS
+from app.schedule_service import (
+    ENGINES,
+    GenerateParams,
+    MonthPlan,
+    apply_month_plan,
+    fill_off_range,
+    month_range,
+    params_to_dict,
+    plan_month_schedule,
+    write_cell_changes,
+)
 
 router = APIRouter(prefix="/schedule", tags=["schedule"])
 
+# 預覽結果保留多久（過期需重新預覽）
+PREVIEW_TTL = timedelta(hours=1)
+
 
 class GenerateRequest(BaseModel):
     weekday_morning: int = 1
@@ -29,53 +54,280 @@ class GenerateRequest(BaseModel):
     prefer_same_shift_within_block: bool = True
     max_consecutive_work_days: int = 6
     min_rest_days_per_7: int = 2
+    # 輪班間隔（小時）與工時上限（0 不限制）
+    min_rest_hours: float = 8
+    max_weekly_hours: float = 0
+    max_monthly_hours: float = 0
+    # 評分項目權重覆寫，例如 {"night_fairness": 1000, "weekend_pair": 100}
+    score_weights: dict[str, float] = {}
+    # 依員工的輪班樣板先排入，再補缺口
+    use_rotations: bool = True
+    # 每日補人方式：greedy 或 matching（整天一次配對）；seed 決定 matching 同分時的順序
+    engine: str = "greedy"
+    seed: int = 0
+    # 暖啟動：沿用 4 週前（對齊星期）仍符合規則的班別，只補缺口
+    warm_start: bool = False
+
+
+def _to_params(payload: GenerateRequest) -> GenerateParams:
+    unknown = [k for k in payload.score_weights if k not in SCORE_TERMS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知的評分項目：{', '.join(unknown)}")
+    if payload.engine not in ENGINES:
+        raise HTTPException(status_code=400, detail=f"engine 只能是 {' / '.join(ENGINES)}")
+    return GenerateParams(
+        weekday_morning=payload.weekday_morning,
+        weekday_evening=payload.weekday_evening,
+        weekday_night=payload.weekday_night,
+        holiday_morning=payload.holiday_morning,
+        holiday_evening=payload.holiday_evening,
+        holiday_night=payload.holiday_night,
+        weekend_as_holiday=payload.weekend_as_holiday,
+        holiday_dates=frozenset(payload.holiday_dates),
+        overwrite=payload.overwrite,
+        trim_overstaff_to_off=payload.trim_overstaff_to_off,
+        prefer_clustered_work=payload.prefer_clustered_work,
+        prefer_same_shift_within_block=payload.prefer_same_shift_within_block,
+        max_consecutive_work_days=payload.max_consecutive_work_days,
+        min_rest_days_per_7=payload.min_rest_days_per_7,
+        min_rest_hours=payload.min_rest_hours,
+        max_weekly_hours=payload.max_weekly_hours,
+        max_monthly_hours=payload.max_monthly_hours,
+        score_weights=dict(payload.score_weights),
+        use_rotations=payload.use_rotations,
+        engine=payload.engine,
+        seed=payload.seed,
+        warm_start=payload.warm_start,
+    )
 
 
 @router.post("/generate")
 def generate(
     payload: GenerateRequest,
     month: str = Query(..., description="YYYY-MM"),
+    site_id: int | None = Query(None, description="只排指定據點（不指定則所有啟用員工一起排）"),
+    dry_run: bool = Query(False, description="只預覽：回傳與目前班表的差異與 token，不寫入"),
+    warnings_limit: int | None = Query(
+        None, ge=0, description="回傳幾筆警告文字（不指定則全部；完整數量見 warnings_total / warning_summary）"
+    ),
+    warnings_offset: int = Query(0, ge=0),
+    warnings_detail: bool = Query(False, description="同一頁再附上結構化警告明細（warning_items）"),
+    profile: bool = Query(False, description="管理者：在剖析器下執行，報告可由 /profiles 下載（需 X-Admin-Token）"),
+    x_admin_token: str | None = Header(None),
     session: Session = Depends(get_session),
 ) -> dict:
-    result = generate_month_schedule(
-        session,
-        month=month,
-        params=GenerateParams(
-            weekday_morning=payload.weekday_morning,
-            weekday_evening=payload.weekday_evening,
-            weekday_night=payload.weekday_night,
-            holiday_morning=payload.holiday_morning,
-            holiday_evening=payload.holiday_evening,
-            holiday_night=payload.holiday_night,
-            weekend_as_holiday=payload.weekend_as_holiday,
-            holiday_dates=frozenset(payload.holiday_dates),
-            overwrite=payload.overwrite,
-            trim_overstaff_to_off=payload.trim_overstaff_to_off,
-            prefer_clustered_work=payload.prefer_clustered_work,
-            prefer_same_shift_within_block=payload.prefer_same_shift_within_block,
-            max_consecutive_work_days=payload.max_consecutive_work_days,
-            min_rest_days_per_7=payload.min_rest_days_per_7,
+    params = _to_params(payload)
+    if profile:
+        check_admin(x_admin_token)
+    if dry_run:
+
+        def preview() -> dict:
+            plan = plan_month_schedule(session, month=month, params=params, site_id=site_id)
+            warnings = warnings_payload(
+                plan.warnings, limit=warnings_limit, offset=warnings_offset, detail=warnings_detail
+            )
+            return {**_save_preview(session, plan), **warnings}
+
+        return _profiled(session, month, site_id, params, preview) if profile else preview()
+
+    def run() -> dict:
+        plan = plan_month_schedule(session, month=month, params=params, site_id=site_id)
+        apply_month_plan(session, plan)
+        return {
+            "ok": True,
+            "created": plan.created,
+            "deleted": plan.deleted,
+            **warnings_payload(plan.warnings, limit=warnings_limit, offset=warnings_offset, detail=warnings_detail),
+        }
+
+    # 同月份同時只跑一次；參數完全相同的並行請求共用同一次結果
+    request_hash = params_hash(
+        {
+            "params": payload.model_dump(mode="json"),
+            "site_id": site_id,
+            "warnings": [warnings_limit, warnings_offset, warnings_detail],
+            "profile": profile,
+        }
+    )
+    if profile:
+        return _run_locked(
+            generation_lock_key(month, site_id), request_hash, lambda: _profiled(session, month, site_id, params, run)
+        )
+    return _run_locked(generation_lock_key(month, site_id), request_hash, run)
+
+
+def _profiled(
+    session: Session, month: str, site_id: int | None, params: GenerateParams, fn: Callable[[], dict]
+) -> dict:
+    # 延遲載入：cProfile/pstats 只有剖析時才需要，不拖慢 API 冷啟動
+    from app.profiling import ProfilerBusy, profile_call, take_snapshot
+
+    # 先存下排班當下的輸入（可離線重播），再在剖析器下執行
+    snapshot = take_snapshot(session, month, params_to_dict(params), site_id)
+    try:
+        result, run = profile_call(
+            fn, session.get_bind(), session, snapshot, meta={"month": month, "site_id": site_id}  # type: ignore[arg-type]
+        )
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=f"無法啟動剖析器：{e}")
+    return {**result, "profile": {**run.summary(), "download": f"/profiles/{run.id}/"}}
+
+
+def _run_locked(key: str, request_hash: str, fn: Callable[[], dict]) -> dict:
+    try:
+        return run_exclusive(key, request_hash, fn)
+    except LeaseBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except VersionConflict:
+        raise HTTPException(status_code=409, detail="排班期間此月份班表已被修改，請重新排班")
+
+
+def _save_preview(session: Session, plan: MonthPlan) -> dict:
+    now = utcnow()
+    session.execute(delete(SchedulePreview).where(SchedulePreview.created_at < now - PREVIEW_TTL))
+    changes = plan.changes()
+    preview = SchedulePreview(
+        token=secrets.token_urlsafe(16),
+        month=plan.month,
+        site_id=plan.site_id,
+        # 用排班開始時讀到的版本：排班期間有人寫入，套用時才會被版本檢查擋下
+        base_version=plan.base_version,
+        created_at=now,
+        cells=json.dumps(
+            [[c.employee_id, c.day.day, c.old_shift_type_id, c.new_shift_type_id, c.site_id] for c in changes],
+            separators=(",", ":"),
         ),
     )
+    session.add(preview)
+    session.commit()
+
+    code_by_id = {s.id: s.code for s in refcache.shift_types(session)}
+    return {
+        "ok": True,
+        "dry_run": True,
+        "token": preview.token,
+        "base_version": preview.base_version,
+        "expires_in": int(PREVIEW_TTL.total_seconds()),
+        "diff": plan.diff_counts(),
+        # 只列有變動的格子：[employee_id, day, 舊班別代碼, 新班別代碼]（None 表示空白）
+        "cells": [
+            [c.employee_id, c.day.isoformat(), code_by_id.get(c.old_shift_type_id), code_by_id.get(c.new_shift_type_id)]
+            for c in changes
+        ],
+        "created": plan.created,
+        "deleted": plan.deleted,
+        "metrics": plan.metrics,
+    }
+
+
+@router.post("/apply")
+def apply_preview(
+    token: str = Query(..., description="POST /schedule/generate?dry_run=true 回傳的 token"),
+    session: Session = Depends(get_session),
+) -> dict:
+    preview = session.get(SchedulePreview, token)
+    if not preview or to_utc(preview.created_at) < utcnow() - PREVIEW_TTL:
+        raise HTTPException(status_code=404, detail="預覽不存在或已過期，請重新預覽")
+    month, site_id, base_version = preview.month, preview.site_id, preview.base_version
+    if month_version(session, month, site_id) != base_version:
+        raise HTTPException(status_code=409, detail="預覽後此月份班表已被修改，請重新預覽")
+
+    def run() -> dict:
+        start, _ = month_range(month)
+        changes = [
+            CellChange(emp_id, start.replace(day=d), old, new, emp_site_id)
+            for emp_id, d, old, new, emp_site_id in json.loads(preview.cells)
+        ]
+        try:
+            # 版本比對與寫入在同一個 transaction：預覽後有人改過就整批放棄
+            count = write_cell_changes(
+                session, changes, source="generate", expected_versions={version_key(month, site_id): base_version}
+            )
+        except VersionConflict:
+            session.rollback()
+            raise HTTPException(status_code=409, detail="預覽後此月份班表已被修改，請重新預覽")
+        session.delete(preview)
+        session.commit()
+        return {"ok": True, "changed": count}
+
+    return _run_locked(generation_lock_key(month, site_id), params_hash({"apply": token}), run)
+
+
+@router.post("/generate-sites", status_code=202)
+def generate_sites(
+    payload: GenerateRequest,
+    month: str = Query(..., description="YYYY-MM"),
+    session: Session = Depends(get_session),
+) -> dict:
+    # 每個啟用中的據點各自一個 Celery 任務，平行分散到 worker
+    from celery import group
+
+    from app.tasks import generate_month
+
+    site_ids = list(session.exec(select(Site.id).where(Site.active == True).order_by(Site.id)).all())  # noqa: E712
+    if not site_ids:
+        raise HTTPException(status_code=400, detail="目前沒有任何啟用中的據點")
+    params = params_to_dict(_to_params(payload))
+    result = group(generate_month.s(month, params, site_id) for site_id in site_ids).apply_async()
     return {
         "ok": True,
-        "created": result.created,
-        "deleted": result.deleted,
-        "warnings": result.warnings,
+        "group_id": result.id,
+        "tasks": [{"site_id": site_id, "task_id": r.id} for site_id, r in zip(site_ids, result.results)],
+    }
+
+
+@router.get("/score-terms")
+def list_score_terms() -> dict:
+    # 可用的評分項目與預設權重（集中/分散兩種模式）
+    return {
+        "terms": sorted(SCORE_TERMS),
+        "default_weights_clustered": DEFAULT_WEIGHTS_CLUSTERED,
+        "default_weights_spread": DEFAULT_WEIGHTS_SPREAD,
     }
 
 
+# 一次補休假的日期範圍上限
+FILL_OFF_MAX_DAYS = 366
+
+
 class FillOffRequest(BaseModel):
     active_only: bool = True
+    # 不帶 month 時改用 start/end（含）指定任意日期範圍，例如整季
+    start: date | None = None
+    end: date | None = None
+    # 只補這些員工（不帶表示全部）
+    employee_ids: list[int] | None = None
 
 
 @router.post("/fill-off")
 def fill_off(
     payload: FillOffRequest,
-    month: str = Query(..., description="YYYY-MM"),
+    month: str | None = Query(None, description="YYYY-MM（或改用 body 的 start/end）"),
+    site_id: int | None = Query(None, description="只補指定據點"),
     session: Session = Depends(get_session),
 ) -> dict:
-    result = fill_month_off(session, month=month, active_only=payload.active_only)
+    if month is not None:
+        start, end = month_range(month)
+    elif payload.start is not None and payload.end is not None:
+        start, end = payload.start, payload.end
+    else:
+        raise HTTPException(status_code=400, detail="請指定 month，或 start 與 end")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end 不可早於 start")
+    if (end - start).days + 1 > FILL_OFF_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"日期範圍最多 {FILL_OFF_MAX_DAYS} 天")
+    try:
+        result = fill_off_range(
+            session,
+            start,
+            end,
+            employee_ids=payload.employee_ids,
+            active_only=payload.active_only,
+            site_id=site_id,
+        )
+    except IntegrityError:
+        session.rollback()
+        raise HTTPException(status_code=409, detail="補休假期間此月份班表同時被修改，請重試")
     return {"ok": True, "created": result.created, "warnings": result.warnings}
 
 
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 from datetime import time
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 from sqlmodel import Session, select
 
+from app import refcache
 from app.db import get_session
-from app.models import ShiftType
+from app.models import ShiftType, Site
 
 router = APIRouter(prefix="/shift-types", tags=["shift-types"])
 
@@ -18,6 +19,7 @@ class ShiftTypeCreate(BaseModel):
     start_time: time | None = None
     end_time: time | None = None
     is_work: bool = True
+    site_id: int | None = None
 
 
 class ShiftTypeUpdate(BaseModel):
@@ -28,8 +30,14 @@ class ShiftTypeUpdate(BaseModel):
 
 
 @router.get("")
-def list_shift_types(session: Session = Depends(get_session)) -> list[ShiftType]:
-    return session.exec(select(ShiftType).order_by(ShiftType.id)).all()
+def list_shift_types(
+    site_id: int | None = Query(None, description="指定據點時，回傳共用班別 + 該據點專屬班別"),
+    session: Session = Depends(get_session),
+) -> list[ShiftType]:
+    q = select(ShiftType)
+    if site_id is not None:
+        q = q.where((ShiftType.site_id == None) | (ShiftType.site_id == site_id))  # noqa: E711
+    return session.exec(q.order_by(ShiftType.id)).all()
 
 
 @router.post("", status_code=201)
@@ -38,12 +46,23 @@ def create_shift_type(payload: ShiftTypeCreate, session: Session = Depends(get_s
     name = payload.name.strip()
     if not code or not name:
         raise HTTPException(status_code=400, detail="code/name 不可為空")
-    exists = session.exec(select(ShiftType).where(ShiftType.code == code)).first()
+    if payload.site_id is not None and not session.get(Site, payload.site_id):
+        raise HTTPException(status_code=400, detail="site_id 不存在")
+    # 代碼在同一個範圍內（共用 / 同據點）不可重複；據點專屬班別可覆蓋共用班別的同代碼
+    exists = session.exec(select(ShiftType).where(ShiftType.code == code, ShiftType.site_id == payload.site_id)).first()
     if exists:
         raise HTTPException(status_code=409, detail="code 已存在")
-    s = ShiftType(code=code, name=name, start_time=payload.start_time, end_time=payload.end_time, is_work=payload.is_work)
+    s = ShiftType(
+        code=code,
+        name=name,
+        start_time=payload.start_time,
+        end_time=payload.end_time,
+        is_work=payload.is_work,
+        site_id=payload.site_id,
+    )
     session.add(s)
     session.commit()
+    refcache.bump()
     session.refresh(s)
     return s
 
@@ -60,6 +79,7 @@ def update_shift_type(
         setattr(s, k, v)
     session.add(s)
     session.commit()
+    refcache.bump()
     session.refresh(s)
     return s
 
@@ -71,5 +91,6 @@ def delete_shift_type(shift_type_id: int, session: Session = Depends(get_session
         return
     session.delete(s)
     session.commit()
+    refcache.bump()
 
 
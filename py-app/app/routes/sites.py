@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from sqlmodel import Session, select
+
+from app.db import get_session
+from app.models import Employee, ShiftType, Site
+
+router = APIRouter(prefix="/sites", tags=["sites"])
+
+
+class SiteCreate(BaseModel):
+    name: str
+
+
+class SiteUpdate(BaseModel):
+    name: str | None = None
+    active: bool | None = None
+
+
+@router.get("")
+def list_sites(session: Session = Depends(get_session)) -> list[Site]:
+    return session.exec(select(Site).order_by(Site.active.desc(), Site.id)).all()
+
+
+@router.post("", status_code=201)
+def create_site(payload: SiteCreate, session: Session = Depends(get_session)) -> Site:
+    name = payload.name.strip()
+    if not name:
+        raise HTTPException(status_code=400, detail="name 不可為空")
+    s = Site(name=name)
+    session.add(s)
+    session.commit()
+    session.refresh(s)
+    return s
+
+
+@router.patch("/{site_id}")
+def update_site(site_id: int, payload: SiteUpdate, session: Session = Depends(get_session)) -> Site:
+    s = session.get(Site, site_id)
+    if not s:
+        raise HTTPException(status_code=404, detail="site not found")
+    data = payload.model_dump(exclude_unset=True)
+    for k, v in data.items():
+        setattr(s, k, v)
+    if s.name is not None:
+        s.name = s.name.strip()
+    session.add(s)
+    session.commit()
+    session.refresh(s)
+    return s
+
+
+@router.delete("/{site_id}", status_code=204)
+def delete_site(site_id: int, session: Session = Depends(get_session)) -> None:
+    s = session.get(Site, site_id)
+    if not s:
+        return
+    # 還有員工/專屬班別掛在此據點時不允許刪除（避免員工/排班變成孤兒資料）
+    has_employee = session.exec(select(Employee.id).where(Employee.site_id == site_id)).first()
+    has_shift = session.exec(select(ShiftType.id).where(ShiftType.site_id == site_id)).first()
+    if has_employee is not None or has_shift is not None:
+        raise HTTPException(status_code=409, detail="此據點仍有員工或專屬班別，請先移轉或改為停用據點")
+    session.delete(s)
+    session.commit()
@@ -0,0 +1,196 @@
+"""
+排班結果的參考檢查器（刻意寫成簡單、慢、與排班器互不共用程式碼）。
+
+排班器（PlanState.can_take）為了速度用增量狀態與預先算好的查表；這裡則對整個月的結果
+逐條規則直接重算，兩邊結果不一致就表示排班器（或它的最佳化）有錯。
+只檢查「硬性規則」與需求覆蓋，軟性偏好另外由 schedule_quality 給出統計數字比較。
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from statistics import pstdev
+from typing import Any
+
+from app.models import Employee, ShiftType
+
+# 與 app.schedule_service 相同的代碼，但這裡自己定義，避免引用排班器的任何程式碼
+_MORNING, _EVENING, _NIGHT, _OFF = "早", "晚", "夜", "O"
+_WORK_CODES = (_MORNING, _EVENING, _NIGHT)
+_DEFAULT_HOURS = 8.0
+
+
+@dataclass(frozen=True)
+class Violation:
+    rule: str
+    employee_id: int | None
+    day: date | None
+    detail: str = ""
+
+
+def _days(start: date, end: date) -> list[date]:
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def _is_holiday(params: Any, d: date) -> bool:
+    return d in params.holiday_dates or (params.weekend_as_holiday and d.weekday() >= 5)
+
+
+def _required(params: Any, d: date) -> dict[str, int]:
+    if _is_holiday(params, d):
+        return {_MORNING: params.holiday_morning, _EVENING: params.holiday_evening, _NIGHT: params.holiday_night}
+    return {_MORNING: params.weekday_morning, _EVENING: params.weekday_evening, _NIGHT: params.weekday_night}
+
+
+def _hours(st: ShiftType | None) -> float:
+    if st is None or not st.is_work:
+        return 0.0
+    if st.start_time is None or st.end_time is None:
+        return _DEFAULT_HOURS
+    minutes = (st.end_time.hour * 60 + st.end_time.minute) - (st.start_time.hour * 60 + st.start_time.minute)
+    if minutes <= 0:
+        minutes += 24 * 60
+    return minutes / 60
+
+
+def _rest_hours(prev: ShiftType, nxt: ShiftType) -> float | None:
+    # 昨天 prev 結束到今天 nxt 開始的小時數；任一班沒有起迄時間時回傳 None
+    if None in (prev.start_time, prev.end_time, nxt.start_time):
+        return None
+    prev_start = prev.start_time.hour + prev.start_time.minute / 60  # type: ignore[union-attr]
+    prev_end = prev_start + _hours(prev)
+    nxt_start = 24 + nxt.start_time.hour + nxt.start_time.minute / 60  # type: ignore[union-attr]
+    return nxt_start - prev_end
+
+
+def check_schedule(
+    employees: list[Employee],
+    shifts_by_code: dict[str, ShiftType],
+    params: Any,
+    cells: dict[tuple[int, date], str],
+    start: date,
+    end: date,
+    fixed: dict[tuple[int, date], str] | None = None,
+) -> list[Violation]:
+    """
+    cells：(employee_id, day) -> 班別代碼（整個月、全部啟用員工）。
+    params 為 GenerateParams（只讀屬性，不呼叫任何方法）。
+    fixed：排班器不會動的格子（不覆蓋時的既有排班、輪班樣板）；這些格子本身超過需求不算超排。
+    """
+    fixed = fixed or {}
+    out: list[Violation] = []
+    days = _days(start, end)
+    window = max(0, min(7, 7 - max(0, min(7, params.min_rest_days_per_7))))
+
+    def is_work(code: str | None) -> bool:
+        if code is None:
+            return False
+        st = shifts_by_code.get(code)
+        return bool(st.is_work) if st is not None else code in _WORK_CODES
+
+    for e in employees:
+        if e.id is None:
+            continue
+        seq = [cells.get((e.id, d)) for d in days]
+        for d, code in zip(days, seq):
+            if code is None:
+                out.append(Violation("missing_cell", e.id, d))
+            if e.night_only and code in (_MORNING, _EVENING):
+                out.append(Violation("night_only", e.id, d, code))
+            if code == _NIGHT and not e.can_work_night:
+                out.append(Violation("no_night", e.id, d))
+
+        # 輪班間隔
+        for i in range(1, len(days)):
+            a, b = seq[i - 1], seq[i]
+            if not (is_work(a) and is_work(b)):
+                continue
+            sa, sb = shifts_by_code.get(a or ""), shifts_by_code.get(b or "")
+            gap = _rest_hours(sa, sb) if sa is not None and sb is not None else None
+            if gap is None:
+                bad = (a, b) == (_NIGHT, _MORNING)
+            else:
+                bad = gap < params.min_rest_hours
+            if bad:
+                out.append(Violation("min_rest", e.id, days[i], f"{a}->{b}"))
+
+        # 連續上班天數
+        cap = e.max_consecutive_work_days if e.max_consecutive_work_days > 0 else params.max_consecutive_work_days
+        run = 0
+        for d, code in zip(days, seq):
+            run = run + 1 if is_work(code) else 0
+            if run > cap:
+                out.append(Violation("max_consecutive", e.id, d, f"{run}>{cap}"))
+
+        # 當月上班天數
+        total = sum(1 for c in seq if is_work(c))
+        if e.max_work_days_per_month > 0 and total > e.max_work_days_per_month:
+            out.append(Violation("max_work_days", e.id, None, f"{total}>{e.max_work_days_per_month}"))
+
+        # 任意 7 日（月初不足 7 日時以月初為起點）
+        for i, d in enumerate(days):
+            span = seq[max(0, i - 6) : i + 1]
+            worked = sum(1 for c in span if is_work(c))
+            if window < 7 and worked > window:
+                out.append(Violation("rest_days_per_7", e.id, d, f"{worked}>{window}"))
+            if params.max_weekly_hours > 0:
+                hours = sum(_hours(shifts_by_code.get(c or "")) for c in span)
+                if hours > params.max_weekly_hours + 1e-9:
+                    out.append(Violation("max_weekly_hours", e.id, d, f"{hours:g}>{params.max_weekly_hours:g}"))
+
+        if params.max_monthly_hours > 0:
+            hours = sum(_hours(shifts_by_code.get(c or "")) for c in seq)
+            if hours > params.max_monthly_hours + 1e-9:
+                out.append(Violation("max_monthly_hours", e.id, None, f"{hours:g}>{params.max_monthly_hours:g}"))
+
+    # 需求：排班器不會多排（固定格子本身已超過需求時，以固定格子的人數為上限）
+    for d in days:
+        for code, need in _required(params, d).items():
+            have = sum(1 for e in employees if cells.get((e.id, d)) == code)  # type: ignore[arg-type]
+            pinned = sum(1 for e in employees if fixed.get((e.id, d)) == code)  # type: ignore[arg-type]
+            if have > max(0, need, pinned):
+                out.append(Violation("overstaffed", None, d, f"{code} {have}>{need}"))
+    return out
+
+
+def schedule_quality(
+    employees: list[Employee], params: Any, cells: dict[tuple[int, date], str], start: date, end: date
+) -> dict[str, float]:
+    """排班品質統計（用來比較兩個排班器／兩組參數，數字越小越好，除了 coverage）。"""
+    days = _days(start, end)
+    ids = [e.id for e in employees if e.id is not None]
+    needed = shortfall = 0
+    for d in days:
+        for code, need in _required(params, d).items():
+            have = sum(1 for i in ids if cells.get((i, d)) == code)
+            needed += max(0, need)
+            shortfall += max(0, need - have)
+
+    totals: list[int] = []
+    nights: list[int] = []
+    holidays: list[int] = []
+    isolated = shift_switches = 0
+    for i in ids:
+        seq = [cells.get((i, d)) for d in days]
+        work = [c in _WORK_CODES for c in seq]
+        totals.append(sum(work))
+        nights.append(sum(1 for c in seq if c == _NIGHT))
+        holidays.append(sum(1 for d, w in zip(days, work) if w and _is_holiday(params, d)))
+        for k in range(len(seq)):
+            # 「上一休一」：前後都休、只上這一天
+            if work[k] and (k == 0 or not work[k - 1]) and (k == len(seq) - 1 or not work[k + 1]):
+                isolated += 1
+            if k and work[k] and work[k - 1] and seq[k] != seq[k - 1]:
+                shift_switches += 1
+
+    return {
+        "coverage": 1.0 if needed == 0 else (needed - shortfall) / needed,
+        "shortfall": float(shortfall),
+        "work_days_stdev": pstdev(totals) if totals else 0.0,
+        "work_days_range": float(max(totals) - min(totals)) if totals else 0.0,
+        "night_stdev": pstdev(nights) if nights else 0.0,
+        "holiday_stdev": pstdev(holidays) if holidays else 0.0,
+        "isolated_work_days": float(isolated),
+        "shift_switches": float(shift_switches),
+    }
@@ -1,19 +1,43 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass, field, fields
 from datetime import date, timedelta
-from typing import Iterable
+from typing import Any, Callable, Iterable
 
+from sqlalchemy import Date, cast, column, exists, func, insert, literal, literal_column, null, true, values
 from sqlmodel import Session, select
 
-from app.models import Assignment, Employee, ShiftType
+from app import refcache
+from app.audit import CellChange, month_version, record_changes, record_changes_from_select, version_key
+from app.matching import match_day
+from app.models import Assignment, AssignmentChange, Employee, ShiftType
+from app.phases import mark
+from app.rotations import RotationLibrary
+from app.schedule_warnings import (
+    DEMAND_EXCEEDS_STAFF,
+    FIXED_OVERSTAFF,
+    FORCED_SHIFT_CHANGE,
+    MISSING_SHIFT_TYPES,
+    NO_EMPLOYEES,
+    OVERSTAFF_TRIMMED,
+    ROTATION_RULE_SKIPPED,
+    UNDERSTAFFED,
+    ScheduleWarning,
+)
+from app.scoring import build_scorer
+from app.shift_rules import build_shift_rules
 
 
 MORNING_CODE = "早"
 EVENING_CODE = "晚"
 NIGHT_CODE = "夜"
 OFF_CODE = "O"
+ENGINES = ("greedy", "matching")
+# 暖啟動對齊的週期：4 週（同星期、每週循環的班表也維持同一相位）
+WARM_START_PERIOD = timedelta(days=28)
 WORK_CODES: tuple[str, ...] = (MORNING_CODE, EVENING_CODE, NIGHT_CODE)
+# 班別沒有起迄時間時的舊規則：夜班隔天不可接早班
+LEGACY_FORBIDDEN_FOLLOWS: frozenset[tuple[str, str]] = frozenset({(NIGHT_CODE, MORNING_CODE)})
 
 
 def month_range(month: str) -> tuple[date, date]:
@@ -50,18 +74,58 @@ class GenerateParams:
     max_consecutive_work_days: int = 6
     # 勞基法常見底線（可調參數）：每 7 日至少休 N 日（例假+休息日）
     min_rest_days_per_7: int = 2
+    # 輪班間隔：前一班結束到下一班開始至少休息幾小時（依班別起迄時間計算）。
+    # 預設 8 與舊規則（夜班不接早班）相同；勞基法第 34 條原則上為 11 小時
+    min_rest_hours: float = 8
+    # 任意連續 7 日 / 當月工時上限（0 不限制）
+    max_weekly_hours: float = 0
+    max_monthly_hours: float = 0
+    # 評分項目權重覆寫（名稱見 app.scoring.SCORE_TERMS；0 表示關閉該項）
+    score_weights: dict[str, float] = field(default_factory=dict)
+    # 有設定輪班樣板的員工先依樣板排入（視同固定排班），自動排班只補剩下的缺口
+    use_rotations: bool = True
+    # 每日補人方式：greedy（逐一挑人）或 matching（整天一次配對，見 app.matching）
+    engine: str = "greedy"
+    # matching 同分時的打亂種子（同一個 seed 結果固定）
+    seed: int = 0
+    # 暖啟動：以 4 週前（對齊星期）的班別為提示，仍符合規則與需求的先排入，自動排班只補缺口
+    warm_start: bool = False
+
+
+def params_to_dict(params: GenerateParams) -> dict[str, Any]:
+    # 給 Celery 等需要 JSON 序列化的地方使用
+    data = asdict(params)
+    data["holiday_dates"] = sorted(d.isoformat() for d in params.holiday_dates)
+    return data
+
+
+def params_from_dict(data: dict[str, Any]) -> GenerateParams:
+    known = {f.name for f in fields(GenerateParams)}
+    kwargs = {k: v for k, v in data.items() if k in known}
+    if "holiday_dates" in kwargs:
+        kwargs["holiday_dates"] = frozenset(
+            d if isinstance(d, date) else date.fromisoformat(d) for d in kwargs["holiday_dates"]
+        )
+    return GenerateParams(**kwargs)
 
 
 @dataclass
 class GenerateResult:
     created: int
     deleted: int
-    warnings: list[str]
+    warnings: list[ScheduleWarning]
+
+
+def _get_shift_by_code(session: Session, site_id: int | None = None) -> dict[str, ShiftType]:
+    # 共用班別（site_id 為 None）先放，據點專屬班別同代碼時覆蓋共用班別；結果來自 app.refcache（唯讀）
+    return refcache.shifts_by_code(session, site_id)
 
 
-def _get_shift_by_code(session: Session) -> dict[str, ShiftType]:
-    shifts = session.exec(select(ShiftType)).all()
-    return {s.code: s for s in shifts}
+def _assignment_month_query(start: date, end: date, site_id: int | None):
+    q = select(Assignment).where(Assignment.day >= start, Assignment.day <= end)
+    if site_id is not None:
+        q = q.where(Assignment.site_id == site_id)
+    return q
 
 
 def _iter_days(start: date, end: date) -> Iterable[date]:
@@ -71,189 +135,380 @@ def _iter_days(start: date, end: date) -> Iterable[date]:
         d += timedelta(days=1)
 
 
-def generate_month_schedule(session: Session, month: str, params: GenerateParams) -> GenerateResult:
-    start, end = month_range(month)
-    warnings: list[str] = []
-
-    employees = session.exec(select(Employee).where(Employee.active == True).order_by(Employee.id)).all()  # noqa: E712
-    if not employees:
-        return GenerateResult(created=0, deleted=0, warnings=["目前沒有任何啟用中的員工，無法自動排班。"])
-    active_employee_ids = {e.id for e in employees if e.id is not None}
-
-    shifts_by_code = _get_shift_by_code(session)
-    missing = [c for c in [*WORK_CODES, OFF_CODE] if c not in shifts_by_code]
-    if missing:
-        return GenerateResult(created=0, deleted=0, warnings=[f"缺少班別代碼：{', '.join(missing)}（請先建立班別）"])
-    shift_id_to_code = {s.id: s.code for s in shifts_by_code.values() if s.id is not None}
-    off_shift_id = shifts_by_code[OFF_CODE].id  # type: ignore[assignment]
+class PlanState:
+    """
+    排班過程中每位員工的狀態（上一班、連上天數、各班次數、最近 6 天是否上班…）。
+    硬性限制 can_take 與評分項目（app.scoring）都從這裡讀取。
+    """
 
-    def is_holiday(d: date) -> bool:
-        if d in params.holiday_dates:
+    night_code = NIGHT_CODE
+
+    def __init__(self, params: GenerateParams, employees: list[Employee], shifts_by_code: dict[str, ShiftType]):
+        self.params = params
+        self.shifts_by_code = shifts_by_code
+        self.emp_by_id: dict[int, Employee] = {e.id: e for e in employees if e.id is not None}
+        ids = list(self.emp_by_id)
+        self.last_shift: dict[int, tuple[date | None, str | None]] = {i: (None, None) for i in ids}
+        self.consecutive_work: dict[int, int] = {i: 0 for i in ids}
+        self.total_work: dict[int, int] = {i: 0 for i in ids}
+        self.per_shift_count: dict[int, dict[str, int]] = {
+            i: {MORNING_CODE: 0, EVENING_CODE: 0, NIGHT_CODE: 0} for i in ids
+        }
+        self.last6_work_flags: dict[int, list[bool]] = {i: [] for i in ids}
+        self.holiday_work: dict[int, int] = {i: 0 for i in ids}
+        # 追蹤「同一段連續上班」的班別（休假/請假等非工作班會重置）
+        self.block_shift: dict[int, str | None] = {i: None for i in ids}
+        # 不覆蓋時把既有排班當作固定排班：day -> employee_id -> shift_code
+        self.fixed_by_day: dict[date, dict[int, str]] = {}
+        self.max_work_in_7 = max(0, min(7, 7 - max(0, min(7, params.min_rest_days_per_7))))
+        # 班別工時與「昨天 -> 今天」是否可接的查表（只在這裡算一次）
+        self.rules = build_shift_rules(shifts_by_code.values(), params.min_rest_hours, LEGACY_FORBIDDEN_FOLLOWS)
+        self.month_hours: dict[int, float] = {i: 0.0 for i in ids}
+        self.last6_hours: dict[int, list[float]] = {i: [] for i in ids}
+        # 每指派一格就通知（例如評分項目的增量更新）
+        self.listeners: list[Callable[[int, date, str], None]] = []
+
+    def is_holiday(self, d: date) -> bool:
+        if d in self.params.holiday_dates:
             return True
-        if params.weekend_as_holiday and d.weekday() >= 5:  # 5=Sat,6=Sun
+        if self.params.weekend_as_holiday and d.weekday() >= 5:  # 5=Sat,6=Sun
             return True
         return False
 
-    def required_for_day(d: date) -> dict[str, int]:
-        if is_holiday(d):
-            req = {
-                MORNING_CODE: max(0, params.holiday_morning),
-                EVENING_CODE: max(0, params.holiday_evening),
-                NIGHT_CODE: max(0, params.holiday_night),
-            }
-        else:
-            req = {
-                MORNING_CODE: max(0, params.weekday_morning),
-                EVENING_CODE: max(0, params.weekday_evening),
-                NIGHT_CODE: max(0, params.weekday_night),
+    def required_for_day(self, d: date) -> dict[str, int]:
+        p = self.params
+        if self.is_holiday(d):
+            return {
+                MORNING_CODE: max(0, p.holiday_morning),
+                EVENING_CODE: max(0, p.holiday_evening),
+                NIGHT_CODE: max(0, p.holiday_night),
             }
-        return req
+        return {
+            MORNING_CODE: max(0, p.weekday_morning),
+            EVENING_CODE: max(0, p.weekday_evening),
+            NIGHT_CODE: max(0, p.weekday_night),
+        }
 
-    # 既有排班
-    existing = session.exec(
-        select(Assignment).where(Assignment.day >= start, Assignment.day <= end)
-    ).all()
-
-    deleted = 0
-    if params.overwrite and existing:
-        for a in existing:
-            session.delete(a)
-            deleted += 1
-        session.commit()
-        existing = []
-
-    # 方便查詢：day -> employee_id -> shift_code（不覆蓋時把既有排班當作固定排班）
-    fixed_by_day: dict[date, dict[int, str]] = {}
-    fixed_assignment_by_day: dict[date, dict[int, Assignment]] = {}
-    if not params.overwrite:
-        # 保留既有指派（不覆蓋）
-        for a in existing:
-            # 只處理「啟用員工」的既有排班，避免停用員工造成 KeyError
-            if a.employee_id not in active_employee_ids:
-                continue
-            code = shift_id_to_code.get(a.shift_type_id)
-            if not code:
-                continue
-            fixed_by_day.setdefault(a.day, {})[a.employee_id] = code
-            fixed_assignment_by_day.setdefault(a.day, {})[a.employee_id] = a
-
-    # 狀態追蹤
-    emp_by_id = {e.id: e for e in employees if e.id is not None}
-    last_shift: dict[int, tuple[date | None, str | None]] = {e.id: (None, None) for e in employees if e.id is not None}
-    consecutive_work: dict[int, int] = {e.id: 0 for e in employees if e.id is not None}
-    total_work: dict[int, int] = {e.id: 0 for e in employees if e.id is not None}
-    per_shift_count: dict[int, dict[str, int]] = {
-        e.id: {MORNING_CODE: 0, EVENING_CODE: 0, NIGHT_CODE: 0} for e in employees if e.id is not None
-    }
-    last6_work_flags: dict[int, list[bool]] = {e.id: [] for e in employees if e.id is not None}
-    holiday_work: dict[int, int] = {e.id: 0 for e in employees if e.id is not None}
-    # 追蹤「同一段連續上班」的班別（休假/請假等非工作班會重置）
-    block_shift: dict[int, str | None] = {e.id: None for e in employees if e.id is not None}
-
-    max_work_in_7 = max(0, min(7, 7 - max(0, min(7, params.min_rest_days_per_7))))
-
-    def is_work_code(code: str | None) -> bool:
+    def is_work_code(self, code: str | None) -> bool:
         if not code:
             return False
-        st = shifts_by_code.get(code)
+        st = self.shifts_by_code.get(code)
         if st is None:
             return code in WORK_CODES
         return bool(st.is_work)
 
-    def worked_yesterday(emp_id: int, day: date) -> bool:
-        prev_day, prev_code = last_shift.get(emp_id, (None, None))
-        return prev_day == day - timedelta(days=1) and is_work_code(prev_code)
+    def worked_yesterday(self, emp_id: int, day: date) -> bool:
+        prev_day, prev_code = self.last_shift.get(emp_id, (None, None))
+        return prev_day == day - timedelta(days=1) and self.is_work_code(prev_code)
 
-    def yesterday_work_shift_code(emp_id: int, day: date) -> str | None:
-        prev_day, prev_code = last_shift.get(emp_id, (None, None))
+    def yesterday_work_shift_code(self, emp_id: int, day: date) -> str | None:
+        prev_day, prev_code = self.last_shift.get(emp_id, (None, None))
         if prev_day != day - timedelta(days=1):
             return None
         if prev_code in WORK_CODES:
             return prev_code
         return None
 
-    def block_shift_code(emp_id: int) -> str | None:
-        return block_shift.get(emp_id)
-
-    def block_ok(emp_id: int, target_code: str) -> bool:
-        bs = block_shift_code(emp_id)
+    def block_ok(self, emp_id: int, target_code: str) -> bool:
+        bs = self.block_shift.get(emp_id)
         return (bs is None) or (bs == target_code)
 
-    def mark_assigned(emp_id: int, day: date, code: str) -> None:
+    def mark_assigned(self, emp_id: int, day: date, code: str) -> None:
         # 更新 last_shift / consecutive / block_shift
-        last_shift[emp_id] = (day, code)
-        if is_work_code(code):
-            consecutive_work[emp_id] = consecutive_work.get(emp_id, 0) + 1
-            total_work[emp_id] = total_work.get(emp_id, 0) + 1
-            if is_holiday(day):
-                holiday_work[emp_id] = holiday_work.get(emp_id, 0) + 1
+        self.last_shift[emp_id] = (day, code)
+        if self.is_work_code(code):
+            self.consecutive_work[emp_id] = self.consecutive_work.get(emp_id, 0) + 1
+            self.total_work[emp_id] = self.total_work.get(emp_id, 0) + 1
+            self.month_hours[emp_id] = self.month_hours.get(emp_id, 0.0) + self.rules.hours_of(code)
+            if self.is_holiday(day):
+                self.holiday_work[emp_id] = self.holiday_work.get(emp_id, 0) + 1
+            if code in WORK_CODES:
+                counts = self.per_shift_count.setdefault(emp_id, {})
+                counts[code] = counts.get(code, 0) + 1
             # 若昨天不是工作日，代表新的一段連上開始 -> 設定 block_shift
-            if not worked_yesterday(emp_id, day):
-                block_shift[emp_id] = code if code in WORK_CODES else None
+            if not self.worked_yesterday(emp_id, day):
+                self.block_shift[emp_id] = code if code in WORK_CODES else None
             else:
                 # 仍在同一段連上：若 block_shift 尚未設定，補上；否則維持
-                if block_shift.get(emp_id) is None and code in WORK_CODES:
-                    block_shift[emp_id] = code
+                if self.block_shift.get(emp_id) is None and code in WORK_CODES:
+                    self.block_shift[emp_id] = code
         else:
-            consecutive_work[emp_id] = 0
-            block_shift[emp_id] = None
+            self.consecutive_work[emp_id] = 0
+            self.block_shift[emp_id] = None
+        for listener in self.listeners:
+            listener(emp_id, day, code)
 
-    def can_take(emp_id: int, day: date, code: str, assigned_today: set[int]) -> bool:
+    def can_take(self, emp_id: int, day: date, code: str, assigned_today: set[int]) -> bool:
         if emp_id in assigned_today:
             return False
         # 若保留既有排班，該員工當天已有班就不可再排
-        if day in fixed_by_day and emp_id in fixed_by_day[day]:
+        if day in self.fixed_by_day and emp_id in self.fixed_by_day[day]:
             return False
-        emp = emp_by_id.get(emp_id)
+        return self.rule_violation(emp_id, day, code) is None
+
+    def rule_violation(self, emp_id: int, day: date, code: str) -> str | None:
+        """這一格上班違反的硬性規則（個人限制、輪班間隔、工時、連上…）；可以排則回傳 None。"""
+        emp = self.emp_by_id.get(emp_id)
         if emp is None:
-            return False
+            return "非啟用員工"
         # 個人限制：只排夜班（不排早/晚）
         if bool(getattr(emp, "night_only", False)) and code in (MORNING_CODE, EVENING_CODE):
-            return False
+            return "只排夜班"
         # 個人限制：不可排夜班
         if code == NIGHT_CODE and not bool(emp.can_work_night):
-            return False
-        prev_day, prev_code = last_shift.get(emp_id, (None, None))
-        if prev_day == day - timedelta(days=1) and prev_code == NIGHT_CODE and code == MORNING_CODE:
-            return False
+            return "不可排夜班"
+        # 輪班間隔（預先算好的班別相容表）
+        prev_day, prev_code = self.last_shift.get(emp_id, (None, None))
+        if prev_day == day - timedelta(days=1) and not self.rules.can_follow(prev_code, code):
+            return f"{prev_code} 接 {code} 的休息時間不足"
+        # 工時上限：任意連續 7 日 / 當月（0 不限制）
+        p = self.params
+        if p.max_weekly_hours > 0 or p.max_monthly_hours > 0:
+            hours = self.rules.hours_of(code)
+            if p.max_weekly_hours > 0 and sum(self.last6_hours.get(emp_id, ())) + hours > p.max_weekly_hours:
+                return "超過每 7 日工時上限"
+            if p.max_monthly_hours > 0 and self.month_hours.get(emp_id, 0.0) + hours > p.max_monthly_hours:
+                return "超過當月工時上限"
         # 連上限制（個人優先；若個人設定 0 則使用系統預設）
         emp_max_consec = int(getattr(emp, "max_consecutive_work_days", 0) or 0)
-        cap_consec = emp_max_consec if emp_max_consec > 0 else params.max_consecutive_work_days
-        if consecutive_work.get(emp_id, 0) >= cap_consec:
-            return False
+        cap_consec = emp_max_consec if emp_max_consec > 0 else self.params.max_consecutive_work_days
+        if self.consecutive_work.get(emp_id, 0) >= cap_consec:
+            return "超過連續上班天數上限"
         # 當月最多上班天數（0 不限制）
         emp_max_days = int(getattr(emp, "max_work_days_per_month", 0) or 0)
-        if emp_max_days > 0 and total_work.get(emp_id, 0) >= emp_max_days:
-            return False
+        if emp_max_days > 0 and self.total_work.get(emp_id, 0) >= emp_max_days:
+            return "超過當月上班天數上限"
         # 每 7 日至少休 N 日 -> 任意 7 日內工作天數不得超過 max_work_in_7
-        hist = last6_work_flags.get(emp_id, [])
-        if max_work_in_7 < 7 and (sum(1 for x in hist if x) + 1) > max_work_in_7:
-            return False
-        return True
+        hist = self.last6_work_flags.get(emp_id, [])
+        if self.max_work_in_7 < 7 and (sum(1 for x in hist if x) + 1) > self.max_work_in_7:
+            return "每 7 日休假天數不足"
+        return None
+
+    def close_day(self, today_code: dict[int, str]) -> None:
+        # 更新每人最近 6 天工作旗標（用來檢查「任意 7 日」規則）
+        for emp_id in self.emp_by_id:
+            hist = self.last6_work_flags.setdefault(emp_id, [])
+            hist.append(self.is_work_code(today_code.get(emp_id, OFF_CODE)))
+            while len(hist) > 6:
+                hist.pop(0)
+            hours = self.last6_hours.setdefault(emp_id, [])
+            hours.append(self.rules.hours_of(today_code.get(emp_id, OFF_CODE)))
+            while len(hours) > 6:
+                hours.pop(0)
+
+
+@dataclass
+class MonthPlan:
+    """
+    一次排班的結果（尚未寫入 DB）。
+    cells：(employee_id, day) -> [舊 shift_type_id, 新 shift_type_id, site_id]；None 表示該格沒有排班。
+    覆蓋模式下「刪掉再排回同一個班」的格子會是 old == new（unchanged），寫入時直接略過。
+    """
+
+    month: str
+    site_id: int | None
+    cells: dict[tuple[int, date], list]
+    created: int
+    deleted: int
+    warnings: list[ScheduleWarning]
+    metrics: dict[str, Any] = field(default_factory=dict)
+    # 排班開始時讀到的月份版本；寫入時版本已變表示排班期間有人改過班表
+    base_version: int = 0
+
+    def diff_counts(self) -> dict[str, int]:
+        counts = {"added": 0, "changed": 0, "removed": 0, "unchanged": 0}
+        for old, new, _ in self.cells.values():
+            if old == new:
+                counts["unchanged"] += 1
+            elif old is None:
+                counts["added"] += 1
+            elif new is None:
+                counts["removed"] += 1
+            else:
+                counts["changed"] += 1
+        return counts
+
+    def changes(self) -> list[CellChange]:
+        return [
+            CellChange(emp_id, d, old, new, emp_site_id)
+            for (emp_id, d), (old, new, emp_site_id) in sorted(self.cells.items())
+            if old != new
+        ]
+
+
+def plan_month_schedule(
+    session: Session, month: str, params: GenerateParams, site_id: int | None = None
+) -> MonthPlan:
+    """
+    在記憶體中排出指定月份的班表，只讀 DB、不寫入（寫入交給 apply_month_plan）。
+    - site_id 為 None：所有啟用員工一起排（未分據點的舊行為）
+    - 指定 site_id：只排該據點的員工，也只讀寫該據點的排班
+    """
+    if params.engine not in ENGINES:
+        raise ValueError(f"未知的排班方式：{params.engine}")
+    start, end = month_range(month)
+    warnings: list[ScheduleWarning] = []
+    base_version = month_version(session, month, site_id)
+
+    def early_exit(warning: ScheduleWarning) -> MonthPlan:
+        return MonthPlan(
+            month=month, site_id=site_id, cells={}, created=0, deleted=0, warnings=[warning], base_version=base_version
+        )
+
+    employees = refcache.active_employees(session, site_id)
+    if not employees:
+        return early_exit(ScheduleWarning(NO_EMPLOYEES))
+    active_employee_ids = {e.id for e in employees if e.id is not None}
+
+    shifts_by_code = _get_shift_by_code(session, site_id)
+    missing = [c for c in [*WORK_CODES, OFF_CODE] if c not in shifts_by_code]
+    if missing:
+        return early_exit(ScheduleWarning(MISSING_SHIFT_TYPES, detail=", ".join(missing)))
+    # 既有排班可能是其他據點的專屬班別或被據點覆蓋的共用班別：用全部班別對照，每一格既有排班都算固定排班
+    shift_id_to_code = {shift_id: s.code for shift_id, s in refcache.shift_map(session).items()}
+    off_shift_id = shifts_by_code[OFF_CODE].id  # type: ignore[assignment]
+
+    state = PlanState(params, list(employees), shifts_by_code)
+    scorer = build_scorer(params)
+    state.listeners.append(lambda emp_id, day, code: scorer.on_assign(state, emp_id, day, code))
+
+    # 既有排班
+    existing = session.exec(_assignment_month_query(start, end, site_id)).all()
+
+    # (employee_id, day) -> [舊班別, 新班別, site_id]
+    touched: dict[tuple[int, date], list] = {}
 
+    def touch(emp_id: int, day: date, old: int | None, new: int | None, emp_site_id: int | None) -> None:
+        entry = touched.get((emp_id, day))
+        if entry is None:
+            touched[(emp_id, day)] = [old, new, emp_site_id]
+        else:
+            entry[1] = new
+
+    deleted = 0
+    if params.overwrite and existing:
+        for a in existing:
+            touch(a.employee_id, a.day, a.shift_type_id, None, a.site_id)
+            deleted += 1
+        existing = []
+
+    fixed_by_day = state.fixed_by_day
+    fixed_assignment_by_day: dict[date, dict[int, Assignment]] = {}
+    assigned_by_code: dict[str, int] = {c: 0 for c in WORK_CODES}
+    shortfall = 0
+    if not params.overwrite:
+        # 保留既有指派（不覆蓋）
+        for a in existing:
+            # 只處理「啟用員工」的既有排班，避免停用員工造成 KeyError
+            if a.employee_id not in active_employee_ids:
+                continue
+            code = shift_id_to_code.get(a.shift_type_id)
+            if not code:
+                continue
+            fixed_by_day.setdefault(a.day, {})[a.employee_id] = code
+            fixed_assignment_by_day.setdefault(a.day, {})[a.employee_id] = a
+
+    emp_by_id = state.emp_by_id
     created = 0
+    mark("load")
+
+    # 輪班樣板：整段展開後先當作固定排班（不覆蓋模式下既有排班優先）；
+    # 排到當天時再檢查硬性規則，不符合的格子略過並提示（見每日迴圈）
+    rotation_fixed: set[tuple[int, date]] = set()
+    if params.use_rotations and any(e.rotation_template_id for e in employees):
+        library = RotationLibrary.load(session, start, (end - start).days + 1)
+        unknown_codes: set[str] = set()
+        for e in employees:
+            codes = library.codes_for(e)
+            if codes is None:
+                continue
+            for offset, code in enumerate(codes):
+                if code is None:
+                    continue
+                d = start + timedelta(days=offset)
+                day_fixed = fixed_by_day.setdefault(d, {})
+                if e.id in day_fixed:
+                    continue
+                st = shifts_by_code.get(code)
+                if st is None:
+                    unknown_codes.add(code)
+                    continue
+                day_fixed[e.id] = code  # type: ignore[index]
+                rotation_fixed.add((e.id, d))  # type: ignore[arg-type]
+        if unknown_codes:
+            warnings.append(ScheduleWarning(MISSING_SHIFT_TYPES, detail=", ".join(sorted(unknown_codes))))
+    mark("rotations")
+
+    # 暖啟動：第 d 天的提示 = d-28 天的班別（上個月的已存排班；d-28 落在本月時用本次已排好的結果，
+    # 讓 29~31 日延續同一個 4 週循環）。輪班樣板/固定排班的格子 can_take 會擋掉，不受影響
+    planned: dict[date, dict[int, str]] = {}
+    prev_cells: dict[tuple[int, date], str] = {}
+    hints_kept = 0
+    if params.warm_start:
+        prev_rows = session.exec(
+            select(Assignment.employee_id, Assignment.day, Assignment.shift_type_id).where(
+                Assignment.day >= start - WARM_START_PERIOD,
+                Assignment.day < start,
+                Assignment.employee_id.in_(active_employee_ids),  # type: ignore[attr-defined]
+            )
+        ).all()
+        for emp_id, d, shift_id in prev_rows:
+            code = shift_id_to_code.get(shift_id)
+            if code:
+                prev_cells[(emp_id, d)] = code
+        mark("warm_start")
+
+    def hint_for(emp_id: int, day: date) -> str | None:
+        src = day - WARM_START_PERIOD
+        if src < start:
+            return prev_cells.get((emp_id, src))
+        return planned.get(src, {}).get(emp_id)
 
     for day in _iter_days(start, end):
         assigned_today: set[int] = set()
         today_code: dict[int, str] = {}
 
-        required = required_for_day(day)
+        holiday = state.is_holiday(day)
+        required = state.required_for_day(day)
         total_needed = sum(required.get(c, 0) for c in WORK_CODES)
         if total_needed > len(employees):
-            tag = "假日" if is_holiday(day) else "平日"
             warnings.append(
-                f"{day.isoformat()}（{tag}）每日需求人數（{total_needed}）大於員工數（{len(employees)}），可能排不滿。"
+                ScheduleWarning(DEMAND_EXCEEDS_STAFF, day=day, holiday=holiday, need=total_needed, have=len(employees))
             )
 
         # 把固定排班先算入狀態（不覆蓋模式）
         fixed = fixed_by_day.get(day, {})
         fixed_assignments = fixed_assignment_by_day.get(day, {})
 
+        # 輪班樣板的上班格與自動排班一樣要符合硬性規則（例如「夜,早」休息不足、超過工時或連上上限）：
+        # 不符合就略過該格、交給自動排班，並提示是哪一條規則
+        for emp_id, code in list(fixed.items()):
+            if (emp_id, day) not in rotation_fixed:
+                continue
+            reason = state.rule_violation(emp_id, day, code) if state.is_work_code(code) else None
+            if reason is not None:
+                del fixed[emp_id]
+                rotation_fixed.discard((emp_id, day))
+                warnings.append(
+                    ScheduleWarning(
+                        ROTATION_RULE_SKIPPED,
+                        day=day,
+                        shift=code,
+                        holiday=holiday,
+                        detail=f"{emp_by_id[emp_id].name}：{reason}",
+                    )
+                )
+                continue
+            touch(emp_id, day, None, shifts_by_code[code].id, emp_by_id[emp_id].site_id)
+            created += 1
+
         # 若固定排班超過需求：把多出來的人改排休假（O）
+        # 輪班樣板排入的格子是刻意的安排，不改休（超過需求只提示 FIXED_OVERSTAFF）
         if (not params.overwrite) and params.trim_overstaff_to_off and fixed and off_shift_id is not None:
             for code in WORK_CODES:
-                assigned_emp_ids = [emp_id for emp_id, c in fixed.items() if c == code]
-                surplus = len(assigned_emp_ids) - required.get(code, 0)
+                on_code = [emp_id for emp_id, c in fixed.items() if c == code]
+                assigned_emp_ids = [emp_id for emp_id in on_code if (emp_id, day) not in rotation_fixed]
+                surplus = min(len(assigned_emp_ids), len(on_code) - required.get(code, 0))
                 if surplus <= 0:
                     continue
 
@@ -261,10 +516,10 @@ def generate_month_schedule(session: Session, month: str, params: GenerateParams
                     # 讓「昨天沒上班 / 連上較短 / 上較多」的人優先休假，
                     # 目標：上班集中成段、避免隔天休一天，同時仍維持大致公平
                     return (
-                        0 if worked_yesterday(emp_id, day) else 1,
-                        consecutive_work.get(emp_id, 0),
-                        total_work.get(emp_id, 0),
-                        holiday_work.get(emp_id, 0),
+                        0 if state.worked_yesterday(emp_id, day) else 1,
+                        state.consecutive_work.get(emp_id, 0),
+                        state.total_work.get(emp_id, 0),
+                        state.holiday_work.get(emp_id, 0),
                         emp_id,
                     )
 
@@ -273,14 +528,13 @@ def generate_month_schedule(session: Session, month: str, params: GenerateParams
                 for emp_id in to_trim:
                     a = fixed_assignments.get(emp_id)
                     if a:
-                        a.shift_type_id = off_shift_id
-                        session.add(a)
+                        touch(a.employee_id, a.day, a.shift_type_id, off_shift_id, a.site_id)
                     fixed[emp_id] = OFF_CODE
-                tag = "假日" if is_holiday(day) else "平日"
                 warnings.append(
-                    f"{day.isoformat()}（{tag}）{code} 班超過需求，已將 {len(to_trim)} 人改排休假（{OFF_CODE}）。"
+                    ScheduleWarning(
+                        OVERSTAFF_TRIMMED, day=day, shift=code, holiday=holiday, have=len(to_trim), detail=OFF_CODE
+                    )
                 )
-            session.commit()
 
         fixed_counts = {MORNING_CODE: 0, EVENING_CODE: 0, NIGHT_CODE: 0}
         for emp_id, code in fixed.items():
@@ -289,103 +543,113 @@ def generate_month_schedule(session: Session, month: str, params: GenerateParams
                 continue
             assigned_today.add(emp_id)
             today_code[emp_id] = code
-            if is_work_code(code):
-                mark_assigned(emp_id, day, code)
-                if code in WORK_CODES:
-                    per_shift_count[emp_id][code] = per_shift_count[emp_id].get(code, 0) + 1
-                    fixed_counts[code] = fixed_counts.get(code, 0) + 1
-            else:
-                mark_assigned(emp_id, day, code)
+            state.mark_assigned(emp_id, day, code)
+            if code in WORK_CODES:
+                fixed_counts[code] = fixed_counts.get(code, 0) + 1
+                assigned_by_code[code] += 1
 
         # 若固定排班已經超過需求，提示「多餘人數」
         for code in WORK_CODES:
             if fixed_counts.get(code, 0) > required.get(code, 0):
-                tag = "假日" if is_holiday(day) else "平日"
                 warnings.append(
-                    f"{day.isoformat()}（{tag}）{code} 班固定排班 {fixed_counts[code]} 人，已超過需求 {required[code]} 人。"
+                    ScheduleWarning(
+                        FIXED_OVERSTAFF, day=day, shift=code, holiday=holiday, need=required[code], have=fixed_counts[code]
+                    )
                 )
 
-        for code in WORK_CODES:
-            # 若不覆蓋：需求要扣掉已存在的固定排班人數，避免同班多餘人數
-            need = max(0, required[code] - fixed_counts.get(code, 0))
-            for _ in range(need):
-                candidates: list[int] = []
-                for e in employees:
-                    if e.id is None:
-                        continue
-                    if not can_take(e.id, day, code, assigned_today):
-                        continue
-                    candidates.append(e.id)
-
-                if not candidates:
-                    tag = "假日" if is_holiday(day) else "平日"
-                    warnings.append(f"{day.isoformat()}（{tag}）{code} 班缺人（需求 {need}）。")
-                    break
-
-                # 強力達成「同一段連上盡量同班別」：先嘗試只從 block_ok 的候選人挑
-                candidates_pref = candidates
-                if params.prefer_same_shift_within_block:
-                    pref = [emp_id for emp_id in candidates if block_ok(emp_id, code)]
-                    if pref:
-                        candidates_pref = pref
-                    else:
-                        tag = "假日" if is_holiday(day) else "平日"
-                        warnings.append(f"{day.isoformat()}（{tag}）{code} 班無法維持同班別連上（已被迫換班）。")
-
-                if params.prefer_clustered_work:
-                    # 上班盡量集中：優先派昨天有上班的人、且讓連上延續（在 max_consecutive_work_days 內）
-                    def score(emp_id: int) -> tuple[int, int, int, int, int, int]:
-                        y_code = yesterday_work_shift_code(emp_id, day)
-                        same_shift_penalty = (
-                            0
-                            if (not params.prefer_same_shift_within_block) or (y_code is None) or (y_code == code)
-                            else 1
-                        )
-                        return (
-                            0 if worked_yesterday(emp_id, day) else 1,
-                            same_shift_penalty,
-                            # 同班別優先度提高：放在班別均衡之前，避免「休假~休假」之間一直換班
-                            per_shift_count[emp_id].get(code, 0),
-                            -consecutive_work.get(emp_id, 0),
-                            total_work.get(emp_id, 0),
-                            holiday_work.get(emp_id, 0) if is_holiday(day) else 0,
-                            emp_id,
-                        )
-                else:
-                    # 平均分散：避免一直連上
-                    def score(emp_id: int) -> tuple[int, int, int, int, int, int]:
-                        y_code = yesterday_work_shift_code(emp_id, day)
-                        same_shift_penalty = (
-                            0
-                            if (not params.prefer_same_shift_within_block) or (y_code is None) or (y_code == code)
-                            else 1
-                        )
-                        return (
-                            consecutive_work.get(emp_id, 0),
-                            same_shift_penalty,
-                            per_shift_count[emp_id].get(code, 0),
-                            total_work.get(emp_id, 0),
-                            holiday_work.get(emp_id, 0) if is_holiday(day) else 0,
-                            emp_id,
-                        )
-
-                chosen = sorted(candidates_pref, key=score)[0]
-
-                session.add(
-                    Assignment(
-                        employee_id=chosen,
-                        day=day,
-                        shift_type_id=shifts_by_code[code].id,  # type: ignore[arg-type]
+        def assign(chosen: int, code: str) -> None:
+            nonlocal created
+            touch(chosen, day, None, shifts_by_code[code].id, emp_by_id[chosen].site_id)
+            assigned_by_code[code] += 1
+            created += 1
+            assigned_today.add(chosen)
+            today_code[chosen] = code
+            state.mark_assigned(chosen, day, code)
+
+        # 若不覆蓋：需求要扣掉已存在的固定排班人數，避免同班多餘人數
+        need_by_code = {code: max(0, required[code] - fixed_counts.get(code, 0)) for code in WORK_CODES}
+
+        # 暖啟動：提示的上班格仍可上（can_take）且還有名額就先排入；提示休假的人補缺口時最後才考慮
+        rest_hinted: set[int] = set()
+        if params.warm_start and (prev_cells or planned):
+            hinted: dict[str, list[int]] = {code: [] for code in WORK_CODES}
+            for e in employees:
+                if e.id is None or e.id in assigned_today:
+                    continue
+                hint = hint_for(e.id, day)
+                if hint in hinted:
+                    hinted[hint].append(e.id)  # type: ignore[index]
+                elif hint is not None:
+                    rest_hinted.add(e.id)
+            for code in WORK_CODES:
+                ok = [emp_id for emp_id in hinted[code] if state.can_take(emp_id, day, code, assigned_today)]
+                if not ok or need_by_code[code] <= 0:
+                    rest_hinted.update(hinted[code])
+                    continue
+                ranked = sorted(zip(scorer.totals(state, day, code, ok), ok))
+                for _, emp_id in ranked[: need_by_code[code]]:
+                    assign(emp_id, code)
+                    hints_kept += 1
+                need_by_code[code] = max(0, need_by_code[code] - len(ranked))
+                # 提示上這個班、但名額已滿的人：今天照提示應該不上這個班，視同提示休假
+                rest_hinted.update(emp_id for emp_id in hinted[code] if emp_id not in assigned_today)
+
+        if params.engine == "matching":
+            picks = match_day(
+                state,
+                scorer,
+                day,
+                [e.id for e in employees if e.id is not None and e.id not in assigned_today],
+                need_by_code,
+                assigned_today,
+                seed=params.seed,
+                prefer_same_shift=params.prefer_same_shift_within_block,
+            )
+            for chosen, code in picks:
+                if params.prefer_same_shift_within_block and not state.block_ok(chosen, code):
+                    warnings.append(ScheduleWarning(FORCED_SHIFT_CHANGE, day=day, shift=code, holiday=holiday))
+                assign(chosen, code)
+            for code in WORK_CODES:
+                need = need_by_code[code]
+                filled = sum(1 for _, c in picks if c == code)
+                if filled < need:
+                    warnings.append(
+                        ScheduleWarning(UNDERSTAFFED, day=day, shift=code, holiday=holiday, need=need, have=filled)
                     )
-                )
-                created += 1
-                assigned_today.add(chosen)
-                today_code[chosen] = code
-                mark_assigned(chosen, day, code)
-                per_shift_count[chosen][code] = per_shift_count[chosen].get(code, 0) + 1
+                    shortfall += need - filled
+        else:
+            for code in WORK_CODES:
+                need = need_by_code[code]
+                for filled in range(need):
+                    candidates = [
+                        e.id for e in employees if e.id is not None and state.can_take(e.id, day, code, assigned_today)
+                    ]
+
+                    if not candidates:
+                        warnings.append(
+                            ScheduleWarning(UNDERSTAFFED, day=day, shift=code, holiday=holiday, need=need, have=filled)
+                        )
+                        shortfall += need - filled
+                        break
+
+                    # 強力達成「同一段連上盡量同班別」：先嘗試只從 block_ok 的候選人挑
+                    candidates_pref = candidates
+                    if params.prefer_same_shift_within_block:
+                        pref = [emp_id for emp_id in candidates if state.block_ok(emp_id, code)]
+                        if pref:
+                            candidates_pref = pref
+                        else:
+                            warnings.append(ScheduleWarning(FORCED_SHIFT_CHANGE, day=day, shift=code, holiday=holiday))
+                    # 暖啟動：提示休假的人最後才考慮
+                    if rest_hinted:
+                        keep = [emp_id for emp_id in candidates_pref if emp_id not in rest_hinted]
+                        if keep:
+                            candidates_pref = keep
+
+                    # 軟性偏好（集中/分散、同班別、班別均衡、假日公平…）交給評分項目
+                    assign(scorer.best(state, day, code, candidates_pref), code)
 
         # 未被排到工作班的人，若不是固定班，補上休假（O）讓表格更清楚
-        # 讓表格更清楚：補上休假（O）
         for e in employees:
             if e.id is None:
                 continue
@@ -395,25 +659,99 @@ def generate_month_schedule(session: Session, month: str, params: GenerateParams
                 continue
             if off_shift_id is None:
                 continue
-            session.add(Assignment(employee_id=e.id, day=day, shift_type_id=off_shift_id))
+            touch(e.id, day, None, off_shift_id, e.site_id)
             created += 1
             today_code[e.id] = OFF_CODE
-            mark_assigned(e.id, day, OFF_CODE)
+            state.mark_assigned(e.id, day, OFF_CODE)
+
+        state.close_day(today_code)
+        if params.warm_start:
+            planned[day] = today_code
+    mark("days")
+
+    return MonthPlan(
+        month=month,
+        site_id=site_id,
+        cells=touched,
+        created=created,
+        deleted=deleted,
+        warnings=warnings,
+        metrics={
+            "employees": len(employees),
+            "work_cells": assigned_by_code,
+            "shortfall": shortfall,
+            "rotation_cells": len(rotation_fixed),
+            "engine": params.engine,
+            "warm_start_kept": hints_kept,
+        },
+        base_version=base_version,
+    )
+
+
+def write_cell_changes(
+    session: Session, changes: list[CellChange], source: str, expected_versions: dict[str, int] | None = None
+) -> int:
+    """
+    把一批格子異動寫進 assignment（只動有變的格子）並記錄異動；呼叫端負責 commit。
+    異動紀錄的舊值一律用 DB 裡的實際值；呼叫端以為是空格（old 為 None）但其實已有排班的格子不動，
+    避免把沒看到的既有排班蓋掉。
+    expected_versions 不符時丟 app.audit.VersionConflict。回傳實際變動的格數。
+    """
+    changes = [c for c in changes if c.old_shift_type_id != c.new_shift_type_id]
+    if not changes:
+        return record_changes(session, [], source=source, expected_versions=expected_versions)
+    days = [c.day for c in changes]
+    emp_ids = {c.employee_id for c in changes}
+    rows = session.exec(
+        select(Assignment).where(
+            Assignment.day >= min(days),
+            Assignment.day <= max(days),
+            Assignment.employee_id.in_(emp_ids),  # type: ignore[attr-defined]
+        )
+    ).all()
+    by_cell = {(a.employee_id, a.day): a for a in rows}
+    written: list[CellChange] = []
+    for c in changes:
+        a = by_cell.get((c.employee_id, c.day))
+        if a is not None and c.old_shift_type_id is None:
+            continue
+        actual = a.shift_type_id if a is not None else None
+        if actual == c.new_shift_type_id:
+            continue
+        written.append(CellChange(c.employee_id, c.day, actual, c.new_shift_type_id, c.site_id))
+        if c.new_shift_type_id is None:
+            if a:
+                session.delete(a)
+        elif a:
+            a.shift_type_id = c.new_shift_type_id
+            session.add(a)
+        else:
+            session.add(
+                Assignment(employee_id=c.employee_id, day=c.day, shift_type_id=c.new_shift_type_id, site_id=c.site_id)
+            )
+    return record_changes(session, written, source=source, expected_versions=expected_versions)
 
-        # 更新每人最近 6 天工作旗標（用來檢查「任意 7 日」規則）
-        for e in employees:
-            if e.id is None:
-                continue
-            hist = last6_work_flags.get(e.id)
-            if hist is None:
-                hist = []
-                last6_work_flags[e.id] = hist
-            hist.append(is_work_code(today_code.get(e.id, OFF_CODE)))
-            while len(hist) > 6:
-                hist.pop(0)
 
+def apply_month_plan(session: Session, plan: MonthPlan, source: str = "generate") -> int:
+    expected = {version_key(plan.month, plan.site_id): plan.base_version}
+    try:
+        count = write_cell_changes(session, plan.changes(), source=source, expected_versions=expected)
+    except Exception:
+        session.rollback()
+        raise
+    mark("write")
     session.commit()
-    return GenerateResult(created=created, deleted=deleted, warnings=warnings)
+    mark("commit")
+    return count
+
+
+def generate_month_schedule(
+    session: Session, month: str, params: GenerateParams, site_id: int | None = None
+) -> GenerateResult:
+    # 先在記憶體排好，再一次寫入（只寫有變的格子，整個月份一個 transaction）
+    plan = plan_month_schedule(session, month, params, site_id=site_id)
+    apply_month_plan(session, plan)
+    return GenerateResult(created=plan.created, deleted=plan.deleted, warnings=plan.warnings)
 
 
 @dataclass
@@ -422,40 +760,92 @@ class FillOffResult:
     warnings: list[str]
 
 
-def fill_month_off(session: Session, month: str, active_only: bool = True) -> FillOffResult:
+def fill_month_off(
+    session: Session, month: str, active_only: bool = True, site_id: int | None = None
+) -> FillOffResult:
     """
     把指定月份所有「未排班的格子」補成休假（O）。
     - 不會覆蓋既有排班（早/晚/夜/O/L 等都保留）
     - 適合手動排完後，一鍵補齊空白
     """
     start, end = month_range(month)
-    warnings: list[str] = []
-
-    shifts_by_code = _get_shift_by_code(session)
-    if "O" not in shifts_by_code or not shifts_by_code["O"].id:
+    return fill_off_range(session, start, end, active_only=active_only, site_id=site_id)
+
+
+def _day_series(session: Session, start: date, end: date):
+    # 在 DB 內產生 start..end 的日期序列（欄位 day），不從 Python 逐日送參數
+    dialect = session.get_bind().dialect.name
+    if dialect == "postgresql":
+        series = func.generate_series(
+            cast(literal(start), Date), cast(literal(end), Date), literal_column("interval '1 day'")
+        ).column_valued("day")
+        return select(cast(series, Date).label("day")).subquery("days")
+    if dialect == "sqlite":
+        days = select(literal(start, Date).label("day")).cte("days", recursive=True)
+        days = days.union_all(select(func.date(days.c.day, "+1 day", type_=Date)).where(days.c.day < end))
+        return days
+    # 其他資料庫：退回 VALUES 清單（仍是一個 statement）
+    return values(column("day", Date), name="days").data([(d,) for d in _iter_days(start, end)])
+
+
+def fill_off_range(
+    session: Session,
+    start: date,
+    end: date,
+    employee_ids: Iterable[int] | None = None,
+    active_only: bool = True,
+    site_id: int | None = None,
+) -> FillOffResult:
+    """
+    把 start..end（含）之間所有「未排班的格子」補成休假（O），可限定員工與據點。
+    整批以 INSERT ... SELECT 完成：員工 x 日期序列，排除已有排班的格子（NOT EXISTS），
+    異動紀錄也是同一種寫法；不論範圍多大都不會逐格經過 Python。
+    """
+    shifts_by_code = _get_shift_by_code(session, site_id)
+    if OFF_CODE not in shifts_by_code or not shifts_by_code[OFF_CODE].id:
         return FillOffResult(created=0, warnings=["缺少休假班別 O（請先建立/seed 班別）"])
-    off_shift_id = shifts_by_code["O"].id  # type: ignore[assignment]
+    off_shift_id = shifts_by_code[OFF_CODE].id
 
-    q = select(Employee)
+    q = select(Employee.id, Employee.site_id)
+    if site_id is not None:
+        q = q.where(Employee.site_id == site_id)
     if active_only:
         q = q.where(Employee.active == True)  # noqa: E712
-    employees = session.exec(q.order_by(Employee.id)).all()
-    emp_ids = [e.id for e in employees if e.id is not None]
-    if not emp_ids:
+    if employee_ids is not None:
+        q = q.where(Employee.id.in_(list(employee_ids)))  # type: ignore[union-attr]
+    emps = q.subquery("emps")
+    if session.exec(select(func.count()).select_from(emps)).one() == 0:
         return FillOffResult(created=0, warnings=["目前沒有任何員工可補休假。"])
 
-    existing = session.exec(select(Assignment).where(Assignment.day >= start, Assignment.day <= end)).all()
-    exist_set = {(a.employee_id, a.day) for a in existing}
+    days = _day_series(session, start, end)
+    taken = exists().where(Assignment.employee_id == emps.c.id, Assignment.day == days.c.day)
+    gaps = (
+        select(
+            emps.c.id.label("employee_id"),
+            days.c.day,
+            null().label("old_shift_type_id"),
+            literal(off_shift_id).label("new_shift_type_id"),
+            emps.c.site_id,
+        )
+        .select_from(emps.join(days, true()))
+        .where(~taken)
+    )
+
+    def apply(mine: Any) -> None:
+        session.execute(
+            insert(Assignment).from_select(
+                ["employee_id", "day", "shift_type_id", "site_id"],
+                select(
+                    AssignmentChange.employee_id,
+                    AssignmentChange.day,
+                    AssignmentChange.new_shift_type_id,
+                    AssignmentChange.site_id,
+                ).where(mine),
+            )
+        )
 
-    created = 0
-    for day in _iter_days(start, end):
-        for emp_id in emp_ids:
-            key = (emp_id, day)
-            if key in exist_set:
-                continue
-            session.add(Assignment(employee_id=emp_id, day=day, shift_type_id=off_shift_id))
-            created += 1
+    created = record_changes_from_select(session, gaps, source="fill-off", apply=apply)
     session.commit()
-    return FillOffResult(created=created, warnings=warnings)
+    return FillOffResult(created=created, warnings=[])
 
 
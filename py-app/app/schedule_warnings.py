@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any
+
+# 警告代碼
+NO_EMPLOYEES = "no_employees"
+MISSING_SHIFT_TYPES = "missing_shift_types"
+DEMAND_EXCEEDS_STAFF = "demand_exceeds_staff"
+OVERSTAFF_TRIMMED = "overstaff_trimmed"
+FIXED_OVERSTAFF = "fixed_overstaff"
+UNDERSTAFFED = "understaffed"
+FORCED_SHIFT_CHANGE = "forced_shift_change"
+ROTATION_RULE_SKIPPED = "rotation_rule_skipped"
+
+
+@dataclass(frozen=True)
+class ScheduleWarning:
+    """
+    排班警告（結構化）。排班迴圈只建立這個小物件，文字訊息等到真的要顯示時才組。
+    need/have 依代碼不同代表：需求人數/員工數、超出需求被改休人數、固定排班人數…
+    """
+
+    code: str
+    day: date | None = None
+    shift: str | None = None
+    holiday: bool = False
+    need: int | None = None
+    have: int | None = None
+    detail: str | None = None
+
+    @property
+    def message(self) -> str:
+        tag = f"{self.day.isoformat()}（{'假日' if self.holiday else '平日'}）" if self.day else ""
+        if self.code == NO_EMPLOYEES:
+            return "目前沒有任何啟用中的員工，無法自動排班。"
+        if self.code == MISSING_SHIFT_TYPES:
+            return f"缺少班別代碼：{self.detail}（請先建立班別）"
+        if self.code == DEMAND_EXCEEDS_STAFF:
+            return f"{tag}每日需求人數（{self.need}）大於員工數（{self.have}），可能排不滿。"
+        if self.code == OVERSTAFF_TRIMMED:
+            return f"{tag}{self.shift} 班超過需求，已將 {self.have} 人改排休假（{self.detail}）。"
+        if self.code == FIXED_OVERSTAFF:
+            return f"{tag}{self.shift} 班固定排班 {self.have} 人，已超過需求 {self.need} 人。"
+        if self.code == UNDERSTAFFED:
+            return f"{tag}{self.shift} 班缺人（需求 {self.need}）。"
+        if self.code == FORCED_SHIFT_CHANGE:
+            return f"{tag}{self.shift} 班無法維持同班別連上（已被迫換班）。"
+        if self.code == ROTATION_RULE_SKIPPED:
+            return f"{tag}輪班樣板的 {self.shift} 班不符合規則（{self.detail}），已改由自動排班。"
+        return f"{tag}{self.detail or self.code}"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "code": self.code,
+            "day": self.day.isoformat() if self.day else None,
+            "shift": self.shift,
+            "holiday": self.holiday,
+            "need": self.need,
+            "have": self.have,
+            "message": self.message,
+        }
+
+
+def _date_ranges(days: list[date]) -> list[list[str]]:
+    # 連續的日期合併成 [起, 迄]
+    out: list[list[str]] = []
+    start = prev = None
+    for d in sorted(set(days)):
+        if prev is not None and d - prev == timedelta(days=1):
+            prev = d
+            continue
+        if start is not None:
+            out.append([start.isoformat(), prev.isoformat()])  # type: ignore[union-attr]
+        start = prev = d
+    if start is not None:
+        out.append([start.isoformat(), prev.isoformat()])  # type: ignore[union-attr]
+    return out
+
+
+def summarize_warnings(warnings: list[ScheduleWarning]) -> dict[str, Any]:
+    """依代碼彙總：筆數、涉及班別、影響日期區間。"""
+    by_code: dict[str, list[ScheduleWarning]] = {}
+    for w in warnings:
+        by_code.setdefault(w.code, []).append(w)
+    return {
+        "total": len(warnings),
+        "by_code": {
+            code: {
+                "count": len(items),
+                "shifts": sorted({w.shift for w in items if w.shift}),
+                "date_ranges": _date_ranges([w.day for w in items if w.day]),
+            }
+            for code, items in by_code.items()
+        },
+    }
+
+
+def warnings_payload(
+    warnings: list[ScheduleWarning], limit: int | None = None, offset: int = 0, detail: bool = False
+) -> dict[str, Any]:
+    """
+    API 回應用：彙總 + 一頁文字訊息（相容舊版前端的 warnings: string[]）；
+    limit 為 None 時回傳全部（與舊版相同），detail=True 時同一頁再附上結構化明細。
+    """
+    page = warnings[offset:] if limit is None else warnings[offset : offset + max(0, limit)]
+    out: dict[str, Any] = {
+        "warnings": [w.message for w in page],
+        "warnings_total": len(warnings),
+        "warning_summary": summarize_warnings(warnings),
+    }
+    if detail:
+        out["warning_items"] = [w.to_dict() for w in page]
+    return out
@@ -0,0 +1,228 @@
+"""
+排班的軟性目標（偏好）評分。
+
+- 每個偏好是一個註冊過的 ScoreTerm，一次替「所有候選人」算分（分數越低越優先）
+- 總分 = Σ 權重 × 各項分數；同分時以 employee_id 小者優先（結果可重現）
+- 需要自己累積狀態的項目可實作 on_assign，排班每指派一格就增量更新一次
+- 新增偏好只要寫一個 ScoreTerm 並用 @register_term 註冊，不用改排班主迴圈
+"""
+
+from __future__ import annotations
+
+import inspect
+from abc import ABC, abstractmethod
+from datetime import date
+from typing import TYPE_CHECKING, ClassVar
+
+if TYPE_CHECKING:
+    from app.schedule_service import GenerateParams, PlanState
+
+
+class ScoreTerm(ABC):
+    name: ClassVar[str] = ""
+
+    @abstractmethod
+    def scores(self, state: PlanState, day: date, code: str, candidates: list[int]) -> list[float]:
+        """每位候選人一個分數（與 candidates 同順序；越低越優先）。"""
+
+    def on_assign(self, state: PlanState, emp_id: int, day: date, code: str) -> None:
+        return None
+
+
+SCORE_TERMS: dict[str, type[ScoreTerm]] = {}
+
+
+def register_term(cls: type[ScoreTerm]) -> type[ScoreTerm]:
+    # 註冊時就檢查：沒實作 scores（或沒取名）的項目在定義時就失敗，不會等到排班途中才出錯
+    if inspect.isabstract(cls):
+        raise TypeError(f"{cls.__name__} 沒有實作 {', '.join(sorted(cls.__abstractmethods__))}")
+    if not cls.name:
+        raise TypeError(f"{cls.__name__} 沒有設定 name")
+    SCORE_TERMS[cls.name] = cls
+    return cls
+
+
+@register_term
+class ClusteredTerm(ScoreTerm):
+    # 上班盡量集中：昨天有上班的人優先
+    name = "clustered"
+
+    def scores(self, state, day, code, candidates):
+        return [0.0 if state.worked_yesterday(e, day) else 1.0 for e in candidates]
+
+
+@register_term
+class ContinueStreakTerm(ScoreTerm):
+    # 讓連上延續（連上越久越優先；上限由 can_take 的連上限制把關）
+    name = "continue_streak"
+
+    def scores(self, state, day, code, candidates):
+        return [-float(state.consecutive_work.get(e, 0)) for e in candidates]
+
+
+@register_term
+class SpreadTerm(ScoreTerm):
+    # 平均分散：目前連上越久越不優先
+    name = "spread"
+
+    def scores(self, state, day, code, candidates):
+        return [float(state.consecutive_work.get(e, 0)) for e in candidates]
+
+
+@register_term
+class SameShiftTerm(ScoreTerm):
+    # 同一段連上盡量同班別：昨天上的班別和今天不同就扣分
+    name = "same_shift"
+
+    def scores(self, state, day, code, candidates):
+        out: list[float] = []
+        for e in candidates:
+            y_code = state.yesterday_work_shift_code(e, day)
+            out.append(0.0 if (y_code is None) or (y_code == code) else 1.0)
+        return out
+
+
+@register_term
+class PreferredShiftTerm(ScoreTerm):
+    # 個人偏好班別（Employee.preferred_shift_codes，例如「早,晚」）；未設定者不影響
+    name = "preferred_shift"
+
+    def __init__(self) -> None:
+        self._cache: dict[int, frozenset[str]] = {}
+
+    def _preferred(self, state: PlanState, emp_id: int) -> frozenset[str]:
+        codes = self._cache.get(emp_id)
+        if codes is None:
+            emp = state.emp_by_id.get(emp_id)
+            raw = (getattr(emp, "preferred_shift_codes", None) or "") if emp is not None else ""
+            codes = frozenset(c.strip() for c in raw.replace("，", ",").split(",") if c.strip())
+            self._cache[emp_id] = codes
+        return codes
+
+    def scores(self, state, day, code, candidates):
+        out: list[float] = []
+        for e in candidates:
+            codes = self._preferred(state, e)
+            out.append(0.0 if (not codes) or (code in codes) else 1.0)
+        return out
+
+
+@register_term
+class ShiftBalanceTerm(ScoreTerm):
+    # 各班別次數均衡：這個班別上越多次越不優先
+    name = "shift_balance"
+
+    def scores(self, state, day, code, candidates):
+        return [float(state.per_shift_count.get(e, {}).get(code, 0)) for e in candidates]
+
+
+@register_term
+class TotalBalanceTerm(ScoreTerm):
+    # 總上班天數均衡
+    name = "total_balance"
+
+    def scores(self, state, day, code, candidates):
+        return [float(state.total_work.get(e, 0)) for e in candidates]
+
+
+@register_term
+class HolidayFairnessTerm(ScoreTerm):
+    # 假日上班公平：假日時，假日已上越多次越不優先
+    name = "holiday_fairness"
+
+    def scores(self, state, day, code, candidates):
+        if not state.is_holiday(day):
+            return [0.0] * len(candidates)
+        return [float(state.holiday_work.get(e, 0)) for e in candidates]
+
+
+@register_term
+class NightFairnessTerm(ScoreTerm):
+    # 夜班公平：排夜班時，夜班佔自己上班天數比例越高越不優先
+    name = "night_fairness"
+
+    def scores(self, state, day, code, candidates):
+        if code != state.night_code:
+            return [0.0] * len(candidates)
+        out: list[float] = []
+        for e in candidates:
+            total = state.total_work.get(e, 0)
+            nights = state.per_shift_count.get(e, {}).get(code, 0)
+            out.append(nights / total if total else 0.0)
+        return out
+
+
+@register_term
+class WeekendPairTerm(ScoreTerm):
+    # 週末成對：週六有上班的人週日優先上班（讓週末「一起上」或「一起休」）
+    name = "weekend_pair"
+
+    def __init__(self) -> None:
+        self._saturday: date | None = None
+        self._worked_saturday: set[int] = set()
+
+    def on_assign(self, state, emp_id, day, code):
+        if day.weekday() != 5:
+            return
+        if self._saturday != day:
+            self._saturday = day
+            self._worked_saturday = set()
+        if state.is_work_code(code):
+            self._worked_saturday.add(emp_id)
+        else:
+            self._worked_saturday.discard(emp_id)
+
+    def scores(self, state, day, code, candidates):
+        if day.weekday() != 6 or self._saturday is None or (day - self._saturday).days != 1:
+            return [0.0] * len(candidates)
+        return [0.0 if e in self._worked_saturday else 1.0 for e in candidates]
+
+
+# 預設權重：以「分層」權重重現原本的字典序排序（上一層 1 分 > 下一層所有分數的總和）
+_COMMON_WEIGHTS: dict[str, float] = {
+    "same_shift": 1e8,
+    "preferred_shift": 5e7,
+    "shift_balance": 1e6,
+    "total_balance": 1e2,
+    "holiday_fairness": 1.0,
+    "night_fairness": 0.0,
+    "weekend_pair": 0.0,
+}
+DEFAULT_WEIGHTS_CLUSTERED: dict[str, float] = {"clustered": 1e10, "continue_streak": 1e4, **_COMMON_WEIGHTS}
+DEFAULT_WEIGHTS_SPREAD: dict[str, float] = {"spread": 1e10, **_COMMON_WEIGHTS}
+
+
+class Scorer:
+    def __init__(self, weights: dict[str, float]) -> None:
+        unknown = [k for k in weights if k not in SCORE_TERMS]
+        if unknown:
+            raise ValueError(f"未知的評分項目：{', '.join(unknown)}")
+        self.weights = dict(weights)
+        # 權重為 0 的項目不建立，不佔用每格的計算時間
+        self.terms: list[tuple[ScoreTerm, float]] = [
+            (SCORE_TERMS[name](), w) for name, w in weights.items() if w
+        ]
+
+    def totals(self, state: PlanState, day: date, code: str, candidates: list[int]) -> list[float]:
+        totals = [0.0] * len(candidates)
+        for term, w in self.terms:
+            for i, v in enumerate(term.scores(state, day, code, candidates)):
+                if v:
+                    totals[i] += w * v
+        return totals
+
+    def best(self, state: PlanState, day: date, code: str, candidates: list[int]) -> int:
+        totals = self.totals(state, day, code, candidates)
+        return min(zip(totals, candidates))[1]
+
+    def on_assign(self, state: PlanState, emp_id: int, day: date, code: str) -> None:
+        for term, _ in self.terms:
+            term.on_assign(state, emp_id, day, code)
+
+
+def build_scorer(params: GenerateParams) -> Scorer:
+    weights = dict(DEFAULT_WEIGHTS_CLUSTERED if params.prefer_clustered_work else DEFAULT_WEIGHTS_SPREAD)
+    if not params.prefer_same_shift_within_block:
+        weights["same_shift"] = 0.0
+    weights.update(params.score_weights)
+    return Scorer(weights)
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 from datetime import time
 
 from sqlmodel import Session, select
 
+from app.db import FORCE_INIT, read_meta, write_meta
 from app.models import Assignment, ShiftType
 
 
@@ -19,7 +21,8 @@ DEFAULT_SHIFT_TYPES: list[dict] = [
 def ensure_default_shift_types(session: Session) -> None:
     # 相容舊版：把舊代碼 M/E/N 合併成 早/晚/夜（保留既有 assignment）
     legacy_map = {"M": "早", "E": "晚", "N": "夜"}
-    shifts = session.exec(select(ShiftType)).all()
+    # 只處理共用班別；據點專屬班別（site_id 不為 None）由使用者自行維護
+    shifts = session.exec(select(ShiftType).where(ShiftType.site_id == None)).all()  # noqa: E711
     by_code_list: dict[str, list[ShiftType]] = {}
     for s in shifts:
         by_code_list.setdefault(s.code, []).append(s)
@@ -56,7 +59,7 @@ def ensure_default_shift_types(session: Session) -> None:
         session.commit()
 
     # 重新讀取（避免 by_code_list 與資料不同步）
-    by_code = {s.code: s for s in session.exec(select(ShiftType)).all()}
+    by_code = {s.code: s for s in session.exec(select(ShiftType).where(ShiftType.site_id == None)).all()}  # noqa: E711
     for data in DEFAULT_SHIFT_TYPES:
         code = data["code"]
         existing = by_code.get(code)
@@ -72,3 +75,18 @@ def ensure_default_shift_types(session: Session) -> None:
     session.commit()
 
 
+def seed_fingerprint() -> str:
+    return hashlib.sha1(repr(DEFAULT_SHIFT_TYPES).encode("utf-8")).hexdigest()
+
+
+def ensure_seeded(session: Session) -> None:
+    # 預設班別沒變就不必每次啟動都重跑（刪掉的預設班別要等預設內容變更或 APP_FORCE_INIT=1 才會補回）
+    fingerprint = seed_fingerprint()
+    if not FORCE_INIT and read_meta("seed_fingerprint") == fingerprint:
+        return
+    ensure_default_shift_types(session)
+    write_meta("seed_fingerprint", fingerprint)
+    # 預設班別可能有增補：通知其他行程重新載入參考資料快取
+    from app import refcache
+
+    refcache.bump()
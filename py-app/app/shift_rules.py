@@ -0,0 +1,87 @@
+"""
+班別時數與輪班間隔（由 ShiftType 的 start_time / end_time 預先算好）。
+
+- hours[i]：第 i 個班別的工時；非工作班為 0，未設定起迄時間的工作班視為 DEFAULT_WORK_HOURS
+- rest_ok[i][j]：前一天上 i、今天上 j 時，兩班之間的休息是否達到 min_rest_hours
+- 排班時只做查表（O(1)），任何透過 /shift-types 新增的班別都適用
+- 任一邊沒有起迄時間時無法計算間隔，退回舊規則（fallback_forbidden 內的組合不可接）
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import time
+from typing import Iterable
+
+from app.models import ShiftType
+
+DEFAULT_WORK_HOURS = 8.0
+
+
+def _minutes(t: time) -> int:
+    return t.hour * 60 + t.minute
+
+
+def shift_span(st: ShiftType) -> tuple[int, int] | None:
+    # 以當天 00:00 起算的 (開始, 結束) 分鐘數；跨夜班（結束 <= 開始）的結束時間落在隔天
+    if st.start_time is None or st.end_time is None:
+        return None
+    start = _minutes(st.start_time)
+    end = _minutes(st.end_time)
+    if end <= start:
+        end += 24 * 60
+    return start, end
+
+
+def shift_hours(st: ShiftType) -> float:
+    if not st.is_work:
+        return 0.0
+    span = shift_span(st)
+    if span is None:
+        return DEFAULT_WORK_HOURS
+    return (span[1] - span[0]) / 60
+
+
+@dataclass(frozen=True)
+class ShiftRules:
+    index: dict[str, int]
+    hours: list[float]
+    rest_ok: list[list[bool]]
+
+    def hours_of(self, code: str | None) -> float:
+        i = self.index.get(code) if code else None
+        return 0.0 if i is None else self.hours[i]
+
+    def can_follow(self, prev_code: str | None, code: str) -> bool:
+        # prev_code 為「昨天」的班別；不認得的代碼不限制
+        i = self.index.get(prev_code) if prev_code else None
+        j = self.index.get(code)
+        if i is None or j is None:
+            return True
+        return self.rest_ok[i][j]
+
+
+def build_shift_rules(
+    shifts: Iterable[ShiftType],
+    min_rest_hours: float,
+    fallback_forbidden: frozenset[tuple[str, str]] = frozenset(),
+) -> ShiftRules:
+    items = list(shifts)
+    index = {s.code: i for i, s in enumerate(items)}
+    hours = [shift_hours(s) for s in items]
+    spans = [shift_span(s) for s in items]
+    min_rest = int(round(max(0.0, min_rest_hours) * 60))
+
+    rest_ok: list[list[bool]] = []
+    for a, prev in zip(items, spans):
+        row: list[bool] = []
+        for b, nxt in zip(items, spans):
+            if not (a.is_work and b.is_work):
+                row.append(True)
+            elif prev is None or nxt is None:
+                row.append((a.code, b.code) not in fallback_forbidden)
+            else:
+                # 今天的開始時間換算到「昨天 00:00 起算」再減去昨天那班的結束時間
+                row.append(nxt[0] + 24 * 60 - prev[1] >= min_rest)
+        rest_ok.append(row)
+    return ShiftRules(index=index, hours=hours, rest_ok=rest_ok)
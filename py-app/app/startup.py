@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import logging
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# APP_STARTUP_PROFILE=1：啟動時把各階段耗時（import、建表/補欄位、seed…）寫進 log
+PROFILE_ENABLED = os.environ.get("APP_STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("uvicorn.error")
+
+_timings: list[tuple[str, float]] = []
+_imported_at = time.perf_counter()
+
+
+def elapsed_since_import() -> float:
+    return time.perf_counter() - _imported_at
+
+
+def record(name: str, seconds: float) -> None:
+    if PROFILE_ENABLED:
+        _timings.append((name, seconds))
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - t0)
+
+
+def report() -> None:
+    if not PROFILE_ENABLED or not _timings:
+        return
+    total = sum(s for _, s in _timings)
+    for name, seconds in _timings:
+        logger.info("startup %-28s %8.1f ms", name, seconds * 1000)
+    logger.info("startup %-28s %8.1f ms", "total", total * 1000)
+    _timings.clear()
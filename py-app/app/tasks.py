@@ -1,6 +1,11 @@
 from celery.utils.log import get_task_logger
+from sqlmodel import Session
 
 from app.celery_app import celery_app
+from app.db import engine
+from app.locks import generation_lock_key, params_hash, run_exclusive
+from app.schedule_service import generate_month_schedule, params_from_dict
+from app.schedule_warnings import warnings_payload
 
 logger = get_task_logger(__name__)
 
@@ -11,3 +16,20 @@ def echo(message: str) -> dict:
     return {"echo": message}
 
 
+@celery_app.task(name="tasks.generate_month")
+def generate_month(month: str, params: dict, site_id: int | None = None) -> dict:
+    # 各據點資料互不重疊，可分散到多個 worker 平行排班
+    logger.info("generate month=%s site_id=%s", month, site_id)
+
+    def run() -> dict:
+        with Session(engine) as session:
+            result = generate_month_schedule(session, month=month, params=params_from_dict(params), site_id=site_id)
+        return {
+            "site_id": site_id,
+            "created": result.created,
+            "deleted": result.deleted,
+            **warnings_payload(result.warnings),
+        }
+
+    # 與 API 共用月份租約：同月份同據點同時只跑一次
+    return run_exclusive(generation_lock_key(month, site_id), params_hash({"task": params, "site_id": site_id}), run)
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# app.db 在 import 時就建立 engine（預設放在 /app/data）：測試一律改用暫存目錄，不碰正式 DB
+os.environ.setdefault("APP_DATA_DIR", tempfile.mkdtemp(prefix="app-tests-"))
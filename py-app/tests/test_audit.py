@@ -0,0 +1,45 @@
+"""異動紀錄與 as_of 重建（記憶體 SQLite）。"""
+
+from __future__ import annotations
+
+from datetime import date
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.audit import CellChange, month_cells_as_of, utcnow
+from app.models import Employee, ShiftType, Site
+from app.routes.employees import _move_assignments
+from app.schedule_service import write_cell_changes
+from app.seed import ensure_default_shift_types
+
+
+def test_as_of_site_filter_uses_recorded_site():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Site(name="site1"))
+        session.add(Site(name="site2"))
+        session.flush()
+        ensure_default_shift_types(session)
+        emp = Employee(name="e1", site_id=1)
+        session.add(emp)
+        session.commit()
+        morning = session.exec(select(ShiftType).where(ShiftType.code == "早")).one().id
+        days = [date(2025, 3, 3), date(2025, 3, 4)]
+        write_cell_changes(session, [CellChange(emp.id, d, None, morning, 1) for d in days], source="put")
+        session.commit()
+        before_move = utcnow()
+
+        emp.site_id = 2
+        session.add(emp)
+        _move_assignments(session, emp.id, 2)
+        session.commit()
+        after_move = utcnow()
+
+        expected = {(emp.id, d): morning for d in days}
+        assert month_cells_as_of(session, "2025-03", before_move, 1) == expected
+        assert month_cells_as_of(session, "2025-03", before_move, 2) == {}
+        assert month_cells_as_of(session, "2025-03", after_move, 1) == {}
+        assert month_cells_as_of(session, "2025-03", after_move, 2) == expected
+        assert month_cells_as_of(session, "2025-03", after_move) == expected
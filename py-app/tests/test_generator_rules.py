@@ -0,0 +1,57 @@
+"""
+排班器的隨機案例測試（app.fuzz 的案例 + app.rule_check 的參考檢查器，全部在記憶體 SQLite 上跑）。
+
+每個 seed 用預設（greedy）與 matching 各排一次：兩者都不可違反硬性規則，
+matching 的品質統計以「與 greedy 的平均差」比較。案例數可用環境變數 FUZZ_CASES 調整；
+失敗時用 python -m app.fuzz --seed <seed> --verbose 重現。
+"""
+
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from app.fuzz import Case, CaseResult, random_case, run_case
+from app.schedule_service import params_from_dict, params_to_dict
+
+SEEDS = range(int(os.environ.get("FUZZ_CASES", "40")))
+
+
+@pytest.fixture(scope="module")
+def results() -> dict[int, tuple[Case, CaseResult, CaseResult]]:
+    out = {}
+    for seed in SEEDS:
+        case = random_case(seed)
+        matching = params_from_dict({**params_to_dict(case.params), "engine": "matching"})
+        out[seed] = (case, run_case(case), run_case(case, matching))
+    return out
+
+
+@pytest.mark.parametrize("engine", ["greedy", "matching"])
+@pytest.mark.parametrize("seed", SEEDS)
+def test_no_hard_rule_violations(results, seed: int, engine: str) -> None:
+    case, greedy, matching = results[seed]
+    violations = (greedy if engine == "greedy" else matching).violations
+    assert not violations, f"seed={seed} month={case.month}: {violations[:5]}"
+
+
+def test_matching_quality_vs_greedy(results) -> None:
+    def mean_delta(key: str) -> float:
+        return sum(m.quality[key] - g.quality[key] for _, g, m in results.values()) / len(results)
+
+    # matching 每天先補滿最多名額：平均而言缺額不比 greedy 多
+    assert mean_delta("shortfall") <= 0
+    assert mean_delta("coverage") >= 0
+
+
+def test_cases_cover_changed_paths(results) -> None:
+    # 案例產生器本身的回歸檢查：這些路徑都是排班器後來改過的地方，不能從案例中消失
+    cases = [case for case, _, _ in results.values()]
+    assert any(c.rotations and any("rotation_template_id" in e for e in c.roster) for c in cases)
+    assert any(not c.params.overwrite and c.existing for c in cases)
+    assert any(c.params.overwrite and c.existing for c in cases)
+    assert any(c.per_site for c in cases)
+    assert any(c.sites >= 2 and not c.per_site for c in cases)
+    assert any(c.prior_month and c.params.warm_start for c in cases)
+    assert any(c.params.max_weekly_hours or c.params.max_monthly_hours for c in cases)
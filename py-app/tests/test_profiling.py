@@ -0,0 +1,35 @@
+"""剖析快照的重播：快照要包含排班實際讀到的資料，重播出來的班表與原本相同。"""
+
+from __future__ import annotations
+
+import json
+
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine
+
+from app.models import Employee
+from app.profiling import replay, snapshot_engine, take_snapshot
+from app.schedule_service import GenerateParams, apply_month_plan, params_to_dict, plan_month_schedule
+from app.seed import ensure_default_shift_types
+
+
+def test_warm_start_replay_matches_plan():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    params = GenerateParams(warm_start=True, seed=7)
+    with Session(engine) as session:
+        ensure_default_shift_types(session)
+        for i in range(10):
+            session.add(Employee(name=f"e{i + 1}", can_work_night=i % 3 != 0))
+        session.commit()
+        apply_month_plan(session, plan_month_schedule(session, "2025-02", GenerateParams(seed=3)))
+        plan = plan_month_schedule(session, "2025-03", params)
+        # 與寫檔再讀回一樣經過 JSON
+        snapshot = json.loads(json.dumps(take_snapshot(session, "2025-03", params_to_dict(params), None)))
+    assert plan.metrics["warm_start_kept"] > 0
+
+    replayed_engine = snapshot_engine(snapshot)
+    with Session(replayed_engine) as session:
+        replayed = plan_month_schedule(session, "2025-03", params)
+    assert replayed.cells == plan.cells
+    assert replay(snapshot)["metrics"] == plan.metrics
@@ -0,0 +1,115 @@
+"""
+排班的回歸測試（記憶體 SQLite）：不覆蓋模式下既有排班一律保留，異動紀錄的舊值與 DB 一致；
+matching 與 greedy 的缺額比較。
+"""
+
+from __future__ import annotations
+
+from datetime import date, time
+
+import pytest
+from sqlalchemy.pool import StaticPool
+from sqlmodel import Session, SQLModel, create_engine, select
+
+from app.audit import CellChange
+from app.models import Assignment, AssignmentChange, Employee, ShiftType, Site
+from app.schedule_service import GenerateParams, generate_month_schedule, plan_month_schedule, write_cell_changes
+from app.seed import ensure_default_shift_types
+
+MONTH = "2025-03"
+DAY = date(2025, 3, 10)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Site(name="site1"))
+        session.add(Site(name="site2"))
+        session.flush()
+        ensure_default_shift_types(session)
+        # 第 2 個據點的專屬早班（同代碼覆蓋共用班別）
+        session.add(ShiftType(code="早", name="早班", is_work=True, start_time=time(6, 0), end_time=time(14, 0), site_id=2))
+        for i in range(8):
+            session.add(Employee(name=f"e{i + 1}", site_id=1 if i < 4 else 2))
+        session.commit()
+        yield session
+
+
+def _shift_id(session: Session, code: str, site_id: int | None) -> int:
+    st = session.exec(select(ShiftType).where(ShiftType.code == code, ShiftType.site_id == site_id)).one()
+    return st.id  # type: ignore[return-value]
+
+
+@pytest.mark.parametrize(
+    ("scope", "shift_site"),
+    [
+        (None, 2),  # 整月一起排：據點專屬班別不在共用班別對照裡
+        (2, None),  # 只排據點 2：被據點覆蓋的共用班別不在據點班別對照裡
+    ],
+)
+def test_keeps_existing_cells_outside_scope_shift_map(session: Session, scope: int | None, shift_site: int | None):
+    emp = session.exec(select(Employee).where(Employee.site_id == 2)).first()
+    shift_id = _shift_id(session, "早", shift_site)
+    session.add(Assignment(employee_id=emp.id, day=DAY, shift_type_id=shift_id, site_id=2))
+    session.commit()
+
+    generate_month_schedule(session, MONTH, GenerateParams(overwrite=False), site_id=scope)
+
+    row = session.exec(select(Assignment).where(Assignment.employee_id == emp.id, Assignment.day == DAY)).one()
+    assert row.shift_type_id == shift_id
+    logged = session.exec(
+        select(AssignmentChange).where(AssignmentChange.employee_id == emp.id, AssignmentChange.day == DAY)
+    ).all()
+    assert logged == []
+
+
+def test_write_cell_changes_skips_cells_planned_as_empty(session: Session):
+    emp = session.exec(select(Employee)).first()
+    morning, night, off = (_shift_id(session, code, None) for code in ("早", "夜", "O"))
+    session.add(Assignment(employee_id=emp.id, day=DAY, shift_type_id=morning, site_id=1))
+    session.add(Assignment(employee_id=emp.id, day=date(2025, 3, 11), shift_type_id=morning, site_id=1))
+    session.commit()
+
+    count = write_cell_changes(
+        session,
+        [
+            CellChange(emp.id, DAY, None, off, 1),  # 以為是空格：不動
+            CellChange(emp.id, date(2025, 3, 11), night, off, 1),  # 舊值以 DB 為準
+        ],
+        source="test",
+    )
+    session.commit()
+
+    assert count == 1
+    cells = {a.day: a.shift_type_id for a in session.exec(select(Assignment)).all()}
+    assert cells == {DAY: morning, date(2025, 3, 11): off}
+    logged = session.exec(select(AssignmentChange)).all()
+    assert [(c.day, c.old_shift_type_id, c.new_shift_type_id) for c in logged] == [(date(2025, 3, 11), morning, off)]
+
+
+def test_matching_shortfall_not_above_greedy():
+    # 人力吃緊的固定案例：30 人、一半不可排夜班，每天要 8/8/4 人（greedy 會把夜班能上的人先排去早晚班）
+    shortfall = {}
+    for engine_name in ("greedy", "matching"):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        SQLModel.metadata.create_all(engine)
+        with Session(engine) as session:
+            ensure_default_shift_types(session)
+            for i in range(30):
+                session.add(Employee(name=f"e{i + 1}", can_work_night=i % 2 == 0))
+            session.commit()
+            params = GenerateParams(
+                weekday_morning=8,
+                weekday_evening=8,
+                weekday_night=4,
+                holiday_morning=8,
+                holiday_evening=8,
+                holiday_night=4,
+                engine=engine_name,
+                seed=1,
+            )
+            shortfall[engine_name] = plan_month_schedule(session, "2025-03", params).metrics["shortfall"]
+    assert shortfall["greedy"] > 0
+    assert shortfall["matching"] <= shortfall["greedy"]